@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request  # Flask for web server, jsonify for JSON responses, request to handle HTTP requests
+from flask import Flask, jsonify, request, Response, stream_with_context  # Flask for web server, jsonify for JSON responses, request to handle HTTP requests, Response/stream_with_context for streamed bodies
 import sqlite3  # SQLite database library
 from datetime import datetime  # For timestamp generation
 import json  # For JSON serialization and deserialization
@@ -26,11 +26,20 @@ def get_quizzes():
     """
     Endpoint to retrieve quizzes from the database.
     Optional query parameter 'category' to filter quizzes by category.
+    Optional query parameter 'stream' ('json' or 'ndjson') streams the rows
+    as they are read instead of building the whole list first.
     Returns a JSON array of quiz objects.
     """
     # Get the category parameter from the query string (if provided)
     category = request.args.get('category')
 
+    # Hand off to the streaming variant if requested
+    stream = request.args.get('stream')
+    if stream:
+        if stream not in ('json', 'ndjson'):
+            return jsonify({'error': "stream must be 'json' or 'ndjson'"}), 400
+        return stream_quizzes(category, stream)
+
     # Establish database connection
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -61,6 +70,41 @@ def get_quizzes():
 
 
 
+def stream_quizzes(category, stream_format):
+    """
+    Stream quizzes straight from the cursor as a JSON array or NDJSON.
+    Memory use and time to first byte stay flat however many quizzes exist.
+    """
+    def generate():
+        # Open the connection inside the generator so it lives as long as the stream
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            if category:
+                cursor.execute("SELECT * FROM quiz WHERE category = ?", (category,))
+            else:
+                cursor.execute("SELECT * FROM quiz")
+
+            # Iterate the cursor instead of calling fetchall()
+            first = True
+            if stream_format == 'json':
+                yield '['
+            for quiz in cursor:
+                quiz_json = json.dumps(dict(quiz))
+                if stream_format == 'ndjson':
+                    yield quiz_json + '\n'
+                else:
+                    yield quiz_json if first else ',' + quiz_json
+                first = False
+            if stream_format == 'json':
+                yield ']'
+        finally:
+            # Close the connection once the last row has been sent
+            conn.close()
+
+    mimetype = 'application/json' if stream_format == 'json' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
 @app.route('/quizzes', methods=['POST'])
 def create_quiz():
     """
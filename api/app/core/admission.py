@@ -0,0 +1,270 @@
+"""Admission control and load shedding.
+
+Every request passes two checks before it reaches a route:
+
+* a per-client token bucket, answered with 429 when the client is over
+  its rate;
+* a concurrency gate for its class (reads or writes), each with its own
+  in-flight limit and queue cap. A request that finds the queue full, or
+  waits longer than the queue timeout, is answered with 503.
+
+Both responses carry ``Retry-After`` so clients back off instead of
+piling more work onto the single SQLite writer. A read that turns out to
+need a write takes a write slot as well through ``write_slot``.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import get_settings
+
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+EXEMPT_PATHS = {'/', '/docs', '/redoc', '/openapi.json', '/healthz', '/readyz'}
+
+# Upper bound on tracked clients; least recently seen buckets are dropped
+MAX_TRACKED_CLIENTS = 10000
+
+
+class Rejected(Exception):
+    """Raised when a request is shed"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionBusy(HTTPException):
+    """A Rejected write slot inside a route, as its 503"""
+
+    def __init__(self, rejected: Rejected):
+        super().__init__(
+            status_code=rejected.status_code,
+            detail=rejected.detail,
+            headers={'Retry-After': str(max(1, math.ceil(rejected.retry_after)))}
+        )
+
+
+class ConcurrencyGate:
+    """Limits in-flight requests of one class and caps how many may queue"""
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float,
+                 retry_after: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(limit)
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.queued = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def acquire(self):
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.shed_queue_full += 1
+                raise Rejected(503, f"Too many queued {self.name} requests", self.retry_after)
+
+            self.waiting += 1
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.shed_timeout += 1
+                raise Rejected(503, f"Timed out waiting for a {self.name} slot", self.retry_after)
+            finally:
+                self.waiting -= 1
+                waited = time.perf_counter() - started
+                self.queued += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> Dict:
+        return {
+            'limit': self.limit,
+            'max_queue': self.max_queue,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'shed_queue_full': self.shed_queue_full,
+            'shed_timeout': self.shed_timeout,
+            'queued': self.queued,
+            'avg_queue_wait_ms': round(self.wait_seconds_total / self.queued * 1000, 2)
+            if self.queued else 0.0,
+            'max_queue_wait_ms': round(self.wait_seconds_max * 1000, 2)
+        }
+
+
+class RateLimiter:
+    """Token bucket per client key"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.limited = 0
+
+    def take(self, key: str) -> float:
+        """Consume one token; return 0 if allowed, else seconds until a token is free"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (float(self.burst), now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        if tokens >= 1:
+            retry_after = 0.0
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / self.rate
+            self.limited += 1
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > MAX_TRACKED_CLIENTS:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def snapshot(self) -> Dict:
+        return {
+            'rate_per_second': self.rate,
+            'burst': self.burst,
+            'tracked_clients': len(self._buckets),
+            'limited': self.limited
+        }
+
+
+class AdmissionController:
+    """Holds the gates and the rate limiter shared by every request of a worker"""
+
+    def __init__(self, settings=None):
+        settings = settings or get_settings()
+        self.enabled = settings.ADMISSION_ENABLED
+        self.trust_forwarded = settings.ADMISSION_TRUST_FORWARDED
+        self.reads = ConcurrencyGate(
+            'read',
+            settings.ADMISSION_READ_CONCURRENCY,
+            settings.ADMISSION_READ_QUEUE,
+            settings.ADMISSION_QUEUE_TIMEOUT,
+            settings.ADMISSION_RETRY_AFTER
+        )
+        self.writes = ConcurrencyGate(
+            'write',
+            settings.ADMISSION_WRITE_CONCURRENCY,
+            settings.ADMISSION_WRITE_QUEUE,
+            settings.ADMISSION_QUEUE_TIMEOUT,
+            settings.ADMISSION_RETRY_AFTER
+        )
+        self.rate_limiter: Optional[RateLimiter] = None
+        if settings.ADMISSION_RATE_PER_SECOND > 0:
+            self.rate_limiter = RateLimiter(
+                settings.ADMISSION_RATE_PER_SECOND, settings.ADMISSION_BURST
+            )
+
+    def client_key(self, scope) -> str:
+        if self.trust_forwarded:
+            for name, value in scope.get('headers', []):
+                if name == b'x-forwarded-for':
+                    return value.decode('latin-1').split(',')[0].strip()
+        client = scope.get('client')
+        return client[0] if client else 'unknown'
+
+    def gate_for(self, method: str) -> ConcurrencyGate:
+        return self.writes if method in WRITE_METHODS else self.reads
+
+    @asynccontextmanager
+    async def write_slot(self):
+        """Hold a write slot for the write a GET sometimes has to make"""
+        if not self.enabled:
+            yield
+            return
+        try:
+            await self.writes.acquire()
+        except Rejected as rejected:
+            raise AdmissionBusy(rejected) from None
+        try:
+            yield
+        finally:
+            self.writes.release()
+
+    def snapshot(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'read': self.reads.snapshot(),
+            'write': self.writes.snapshot(),
+            'rate_limit': self.rate_limiter.snapshot() if self.rate_limiter else None
+        }
+
+
+@lru_cache()
+def get_admission_controller() -> AdmissionController:
+    return AdmissionController()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController to HTTP requests"""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or get_admission_controller()
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        if (
+            scope['type'] != 'http'
+            or not controller.enabled
+            or scope['path'] in EXEMPT_PATHS
+            or scope['method'] == 'OPTIONS'
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        gate = controller.gate_for(scope['method'])
+        try:
+            if controller.rate_limiter:
+                retry_after = controller.rate_limiter.take(controller.client_key(scope))
+                if retry_after:
+                    raise Rejected(429, "Rate limit exceeded", retry_after)
+            await gate.acquire()
+        except Rejected as rejected:
+            await self._reject(send, rejected)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+    async def _reject(self, send, rejected: Rejected):
+        body = ('{"detail": "%s"}' % rejected.detail).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': rejected.status_code,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', str(max(1, math.ceil(rejected.retry_after))).encode()),
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,288 @@
+"""Process pool for CPU-bound work.
+
+Decoding thousands of ``answers`` blobs or hashing a large question import
+holds the GIL, so moving it to the threadpool still stalls the event loop
+and every other request on the worker. ``compute_pool`` owns one
+``ProcessPoolExecutor`` per API worker, started and stopped by the app's
+lifespan, and routes and maintenance jobs hand it work as a list of chunks:
+
+    counts = await compute_pool.map(aggregate_chunk, chunks, question_map)
+    counts = compute_pool.map_sync(aggregate_chunk, chunks, question_map)
+
+``fn(chunk, *args)`` runs in a worker process for each chunk, so ``fn`` must
+be a module-level function and its arguments and result picklable. Results
+come back in chunk order.
+
+Each job keeps at most ``2 * COMPUTE_WORKERS`` chunks in the executor and
+submits the next one as one finishes, so a short job started during a long
+one waits behind a few chunks rather than the whole backlog, and chunk
+iterators are consumed lazily. At most ``COMPUTE_MAX_JOBS`` jobs run at once;
+past that, and when a job exceeds its timeout, routes get ``ComputeBusy`` (a
+503 with ``Retry-After``). A timed out or cancelled job cancels its chunks
+still waiting in the executor; chunks already running finish and are
+discarded, which is why work should be cut into chunks of well under a
+second. Async calls default to ``COMPUTE_TIMEOUT``, sync calls (background
+jobs) to no timeout.
+
+With ``COMPUTE_WORKERS=0``, or before ``start`` (scripts, the CLI tools),
+chunks run inline: in the threadpool for async calls, in the caller's
+thread for sync ones, without timeouts.
+"""
+import asyncio
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import get_settings
+
+_DEFAULT = object()
+
+
+class ComputeBusy(HTTPException):
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=detail,
+            headers={'Retry-After': str(max(1, round(retry_after)))}
+        )
+
+
+def chunked(items: Sequence, size: int) -> List[Sequence]:
+    """Split a sequence into consecutive slices of at most ``size`` items"""
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _init_worker():
+    # Ctrl-C reaches the whole process group; let the parent shut the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class ComputePool:
+    def __init__(self, workers: int, max_jobs: int, timeout: float):
+        self.workers = workers
+        self.max_jobs = max(1, max_jobs)
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.active_jobs = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.jobs = 0
+        self.chunks = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    @property
+    def window(self) -> int:
+        return 2 * self.workers
+
+    def start(self, workers: Optional[int] = None):
+        """Create the executor; worker processes are spawned on first use"""
+        if workers is not None:
+            self.workers = workers
+        if self._executor is None and self.workers > 0:
+            self._executor = self._create()
+
+    def _create(self) -> ProcessPoolExecutor:
+        # forkserver: never fork a process that has an event loop and threads running
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(method),
+            initializer=_init_worker
+        )
+
+    def shutdown(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    async def stop(self):
+        await run_in_threadpool(self.shutdown)
+
+    def _admit(self):
+        with self._lock:
+            if self.active_jobs >= self.max_jobs:
+                self.rejected += 1
+                raise ComputeBusy("Compute pool is busy, retry shortly",
+                                  get_settings().ADMISSION_RETRY_AFTER)
+            self.active_jobs += 1
+            self.jobs += 1
+
+    def _finish(self, timed_out: bool = False, cancelled: bool = False, failed: bool = False):
+        with self._lock:
+            self.active_jobs -= 1
+            self.timed_out += timed_out
+            self.cancelled += cancelled
+            self.failed += failed
+
+    def _chunk_done(self, future: Future):
+        with self._lock:
+            self.queued -= 1
+
+    def _submit(self, fn: Callable, args: tuple) -> Future:
+        executor = self._executor
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died (OOM kill, segfault); start over with a fresh pool
+            with self._lock:
+                if self._executor is executor:
+                    self.restarts += 1
+                    self._executor = self._create()
+                    executor.shutdown(wait=False, cancel_futures=True)
+            future = self._executor.submit(fn, *args)
+        with self._lock:
+            self.queued += 1
+            self.chunks += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        future.add_done_callback(self._chunk_done)
+        return future
+
+    @staticmethod
+    def _inline(fn: Callable, chunks: Iterable, args: tuple) -> List:
+        return [fn(chunk, *args) for chunk in chunks]
+
+    async def _map_windowed(self, fn: Callable, chunks: Iterable, args: tuple) -> List:
+        results: Dict[int, Any] = {}
+        pending: Dict[asyncio.Future, int] = {}
+        try:
+            for index, chunk in enumerate(chunks):
+                if len(pending) >= self.window:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        results[pending.pop(future)] = future.result()
+                pending[asyncio.wrap_future(self._submit(fn, (chunk,) + args))] = index
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+        finally:
+            # Cancelling the wrapper cancels the executor future if it has not started
+            for future in pending:
+                future.cancel()
+        return [results[index] for index in range(len(results))]
+
+    async def map(self, fn: Callable, chunks: Iterable, *args, timeout: Any = _DEFAULT) -> List:
+        """``[fn(chunk, *args) for chunk in chunks]`` on the pool, for routes"""
+        timeout = self.timeout if timeout is _DEFAULT else timeout
+        self._admit()
+        if self._executor is None:
+            try:
+                results = await run_in_threadpool(self._inline, fn, chunks, args)
+            except BaseException:
+                self._finish(failed=True)
+                raise
+            self._finish()
+            return results
+
+        try:
+            results = await asyncio.wait_for(self._map_windowed(fn, chunks, args), timeout)
+        except asyncio.TimeoutError:
+            self._finish(timed_out=True)
+            raise ComputeBusy("Compute job timed out", get_settings().ADMISSION_RETRY_AFTER) from None
+        except asyncio.CancelledError:
+            self._finish(cancelled=True)
+            raise
+        except BaseException:
+            self._finish(failed=True)
+            raise
+        self._finish()
+        return results
+
+    async def run(self, fn: Callable, *args, timeout: Any = _DEFAULT) -> Any:
+        """``fn(*args)`` on the pool as a single chunk"""
+        return (await self.map(_apply, [(fn, args)], timeout=timeout))[0]
+
+    def _map_sync_windowed(self, fn: Callable, chunks: Iterable, args: tuple,
+                           deadline: Optional[float]) -> List:
+        results: Dict[int, Any] = {}
+        pending: Dict[Future, int] = {}
+
+        def collect():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError
+            for future in done:
+                results[pending.pop(future)] = future.result()
+
+        try:
+            for index, chunk in enumerate(chunks):
+                if len(pending) >= self.window:
+                    collect()
+                pending[self._submit(fn, (chunk,) + args)] = index
+            while pending:
+                collect()
+        finally:
+            for future in pending:
+                future.cancel()
+        return [results[index] for index in range(len(results))]
+
+    def map_sync(self, fn: Callable, chunks: Iterable, *args,
+                 timeout: Optional[float] = None) -> List:
+        """``map`` for background jobs and other threads off the event loop"""
+        self._admit()
+        try:
+            if self._executor is None:
+                results = self._inline(fn, chunks, args)
+            else:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                results = self._map_sync_windowed(fn, chunks, args, deadline)
+        except TimeoutError:
+            self._finish(timed_out=True)
+            raise ComputeBusy("Compute job timed out", get_settings().ADMISSION_RETRY_AFTER) from None
+        except BaseException:
+            self._finish(failed=True)
+            raise
+        self._finish()
+        return results
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'running': self._executor is not None,
+                'workers': self.workers,
+                'max_jobs': self.max_jobs,
+                'active_jobs': self.active_jobs,
+                'queued_chunks': self.queued,
+                'peak_queued_chunks': self.peak_queued,
+                'jobs': self.jobs,
+                'chunks': self.chunks,
+                'failed': self.failed,
+                'timed_out': self.timed_out,
+                'cancelled': self.cancelled,
+                'rejected': self.rejected,
+                'restarts': self.restarts
+            }
+
+
+def _apply(call):
+    fn, args = call
+    return fn(*args)
+
+
+def _build_pool() -> ComputePool:
+    settings = get_settings()
+    return ComputePool(
+        workers=settings.COMPUTE_WORKERS,
+        max_jobs=settings.COMPUTE_MAX_JOBS,
+        timeout=settings.COMPUTE_TIMEOUT
+    )
+
+
+compute_pool = _build_pool()
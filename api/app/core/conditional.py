@@ -0,0 +1,73 @@
+"""Conditional GET support for catalog routes.
+
+Catalog responses carry a strong ETag built from the catalog version they
+were read at (see ``app.services.catalog``), a Last-Modified from the
+version's timestamp and a Cache-Control of ``CATALOG_MAX_AGE``, or one
+marking the response immutable for content that never changes under its
+URL (a quiz version). Routes check
+``If-None-Match`` / ``If-Modified-Since`` before querying anything, so a
+client holding the current version gets an empty 304.
+"""
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.core.config import get_settings
+
+
+def make_etag(*parts) -> str:
+    return '"' + '-'.join(str(part) for part in parts) + '"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    if header.strip() == '*':
+        return True
+    candidates = (candidate.strip() for candidate in header.split(','))
+    return any(candidate.removeprefix('W/') == etag for candidate in candidates)
+
+
+def _not_modified_since(header: str, updated_at: int) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return since is not None and updated_at <= since.timestamp()
+
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def cache_headers(etag: str, updated_at: Optional[int], immutable: bool = False) -> dict:
+    max_age = get_settings().CATALOG_MAX_AGE
+    headers = {
+        'ETag': etag,
+        'Cache-Control': IMMUTABLE if immutable else f'public, max-age={max_age}, must-revalidate',
+    }
+    if updated_at is not None:
+        headers['Last-Modified'] = formatdate(updated_at, usegmt=True)
+    return headers
+
+
+def conditional(
+    request: Request, response: Response, etag: str, updated_at: Optional[int] = None,
+    immutable: bool = False
+) -> Optional[Response]:
+    """
+    Put the cache headers on ``response``. Returns a 304 to send instead
+    when the request's validators show the client already has this version.
+    """
+    headers = cache_headers(etag, updated_at, immutable)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get('if-modified-since')
+        fresh = (
+            if_modified_since is not None and updated_at is not None
+            and _not_modified_since(if_modified_since, updated_at)
+        )
+    return Response(status_code=304, headers=headers) if fresh else None
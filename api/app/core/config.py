@@ -1,10 +1,80 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 class Settings(BaseSettings):
     APP_NAME: str = "Quiz API"
     DATABASE_URL: str = "sqlite:///trivia.db"
     DEBUG: bool = False
+    ADMIN_TOKEN: Optional[str] = None
+    EXPORT_BATCH_SIZE: int = 5000
+    USER_CACHE_SIZE: int = 100000
+    # Results older than this many whole months are moved to ARCHIVE_DIR
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_AFTER_MONTHS: int = 12
+    # Let the maintenance scheduler run the archive mover daily
+    ARCHIVE_ENABLED: bool = False
+    # Estimated Jaccard similarity at which new questions count as near-duplicates
+    DEDUP_THRESHOLD: float = 0.8
+    # Catalog bundle used to fill the question index at startup
+    CATALOG_BUNDLE: Optional[str] = None
+    # max-age for catalog GETs; they always carry an ETag to revalidate with
+    CATALOG_MAX_AGE: int = 0
+
+    # HMAC key for user tokens; generated into SESSION_SECRET_FILE if unset
+    SESSION_SECRET: Optional[str] = None
+    SESSION_SECRET_FILE: str = ".session_secret"
+    SESSION_TOKEN_TTL_DAYS: int = 365
+
+    # Seconds a connection waits for a lock before SQLite reports busy;
+    # write transactions are then retried as a whole with jittered backoff
+    DB_BUSY_TIMEOUT: float = 5.0
+    WRITE_RETRY_ATTEMPTS: int = 5
+    WRITE_RETRY_BASE_DELAY: float = 0.02
+    WRITE_RETRY_MAX_DELAY: float = 0.5
+
+    # Per-user data split across this many SQLite files by a hash of the
+    # user id (0: everything in trivia.db); change with the reshard tool
+    USER_SHARDS: int = 0
+    SHARD_DIR: str = "shards"
+
+    # Worker processes for CPU-bound chunks (0: run them inline), jobs
+    # admitted at once and the default timeout for jobs started by routes
+    COMPUTE_WORKERS: int = 2
+    COMPUTE_MAX_JOBS: int = 8
+    COMPUTE_TIMEOUT: float = 30.0
+
+    # In-process maintenance scheduler (ANALYZE, checkpoints, rebuilds)
+    MAINTENANCE_ENABLED: bool = True
+    MAINTENANCE_JITTER: float = 0.1
+
+    # Online backups: pages copied per step, the pause between steps and
+    # the restarts caused by concurrent writes before copying in one step
+    BACKUP_ENABLED: bool = True
+    BACKUP_DIR: str = "backups"
+    BACKUP_KEEP: int = 7
+    BACKUP_PAGES_PER_STEP: int = 256
+    BACKUP_STEP_SLEEP: float = 0.005
+    BACKUP_MAX_RESTARTS: int = 3
+
+    # Readiness thresholds for /readyz
+    READY_QUEUE_SATURATION: float = 0.8
+    READY_LOOP_LAG_MS: float = 200.0
+
+    # Admission control: reads and writes get separate in-flight limits and
+    # queue caps. The per-client token bucket is off (rate 0) by default:
+    # behind the Next.js server or a proxy every request shares one peer
+    # address, so only enable it with ADMISSION_TRUST_FORWARDED set
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_READ_CONCURRENCY: int = 32
+    ADMISSION_READ_QUEUE: int = 128
+    ADMISSION_WRITE_CONCURRENCY: int = 4
+    ADMISSION_WRITE_QUEUE: int = 32
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0
+    ADMISSION_RETRY_AFTER: float = 1.0
+    ADMISSION_RATE_PER_SECOND: float = 0.0
+    ADMISSION_BURST: int = 40
+    ADMISSION_TRUST_FORWARDED: bool = False
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,133 @@
+"""Probes behind /healthz and /readyz.
+
+Readiness fails on signals that belong to this worker: its event loop lag,
+its admission queues crossing their READY_* thresholds, a database it can
+not open and caches it has not loaded. A load balancer can then move
+traffic off a worker that is slow or backed up before its requests start
+timing out. The database latency and the WAL size are shared by every
+worker, so they are reported as gauges only; failing on them would take
+all workers out at once.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+from app.core.admission import get_admission_controller
+from app.core.config import get_settings
+from app.database import get_db_connection
+
+DB_PATH = 'trivia.db'
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up from a fixed sleep"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, loop.time() - started - self.interval)
+            # Decay the peak so one slow tick does not fail readiness forever
+            self.max_lag = max(self.last_lag, self.max_lag * 0.5)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict:
+        return {
+            'running': self._task is not None,
+            'last_ms': round(self.last_lag * 1000, 2),
+            'recent_max_ms': round(self.max_lag * 1000, 2)
+        }
+
+
+loop_monitor = LoopLagMonitor()
+started_at = time.time()
+
+
+def probe_database() -> Dict:
+    """Open a connection and time a trivial query"""
+    started = time.perf_counter()
+    try:
+        conn = get_db_connection()
+        try:
+            conn.execute("SELECT 1").fetchone()
+        finally:
+            conn.close()
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+    return {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
+
+
+def wal_size() -> int:
+    try:
+        return os.path.getsize(DB_PATH + '-wal')
+    except OSError:
+        return 0
+
+
+def admission_saturation() -> Dict:
+    snapshot = get_admission_controller().snapshot()
+    gates = {}
+    for name in ('read', 'write'):
+        gate = snapshot[name]
+        gates[name] = {
+            'in_flight': gate['in_flight'],
+            'limit': gate['limit'],
+            'waiting': gate['waiting'],
+            'max_queue': gate['max_queue'],
+            'queue_saturation': round(gate['waiting'] / gate['max_queue'], 3)
+            if gate['max_queue'] else 0.0
+        }
+    return {'enabled': snapshot['enabled'], **gates}
+
+
+def readiness(database: Dict, caches: Dict) -> Dict:
+    """Combine the gauges and the probe result into a readiness verdict"""
+    settings = get_settings()
+    admission = admission_saturation()
+    loop = loop_monitor.snapshot()
+    wal_bytes = wal_size()
+
+    failures = []
+    if not database['ok']:
+        failures.append('database_unavailable')
+    if admission['enabled'] and any(
+        admission[name]['queue_saturation'] >= settings.READY_QUEUE_SATURATION
+        for name in ('read', 'write')
+    ):
+        failures.append('queue_saturated')
+    if loop['recent_max_ms'] > settings.READY_LOOP_LAG_MS:
+        failures.append('event_loop_lag')
+    for name, cache in caches.items():
+        if cache.get('loaded') is False:
+            failures.append(f'{name}_not_loaded')
+
+    return {
+        'status': 'ready' if not failures else 'not_ready',
+        'failures': failures,
+        'database': database,
+        'admission': admission,
+        'event_loop_lag': loop,
+        'wal_bytes': wal_bytes,
+        'caches': caches,
+        'uptime_seconds': round(time.time() - started_at, 1)
+    }
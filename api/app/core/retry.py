@@ -0,0 +1,149 @@
+"""Retry policy for writes that hit SQLITE_BUSY or SQLITE_LOCKED.
+
+Connections already wait up to ``DB_BUSY_TIMEOUT`` for the write lock. A
+busy error after that, or one SQLite raises without waiting (a deferred
+transaction whose WAL snapshot went stale before it wrote), aborts the
+transaction. Rerunning only the failing statement would build on a rolled
+back transaction, so the unit retried here is always the whole transaction:
+a function given a fresh connection (from ``connect``, trivia.db by
+default) and committed when it returns. On a busy or locked error it is
+rolled back, the connection is closed and the function runs again from
+scratch after a bounded, fully jittered exponential backoff. Any other
+error is raised at once.
+
+Keep side effects on in-process caches and indexes out of the function;
+apply them after ``run``/``run_async`` returns, so a retried attempt can
+not apply them twice.
+
+When the attempts run out, ``DatabaseBusy`` (a 503 with ``Retry-After``)
+replaces the 500 a route's blanket ``except Exception`` would produce.
+"""
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import get_settings
+from app.database import get_db_connection
+
+BUSY_CODES = (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+class DatabaseBusy(HTTPException):
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail="Database is busy, retry shortly",
+            headers={'Retry-After': str(max(1, round(retry_after)))}
+        )
+
+
+def is_busy(exc: BaseException) -> bool:
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    code = getattr(exc, 'sqlite_errorcode', None)
+    if code is not None:
+        # Extended codes such as SQLITE_BUSY_SNAPSHOT keep the primary code in the low byte
+        return code & 0xff in BUSY_CODES
+    message = str(exc)
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int, base_delay: float, max_delay: float):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self.transactions = 0
+        self.retried_transactions = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    def delay(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base_delay * 2**attempt)]"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _attempt(self, connect: Callable, fn: Callable, args, kwargs) -> Any:
+        conn = connect()
+        try:
+            result = fn(conn, *args, **kwargs)
+            conn.commit()
+            return result
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _count(self, retries: int, exhausted: bool = False):
+        with self._lock:
+            self.transactions += 1
+            self.retries += retries
+            if retries:
+                self.retried_transactions += 1
+            if exhausted:
+                self.exhausted += 1
+
+    def _give_up(self, retries: int, exc: BaseException):
+        self._count(retries, exhausted=True)
+        raise DatabaseBusy(get_settings().ADMISSION_RETRY_AFTER) from exc
+
+    def run(self, fn: Callable, *args, connect: Callable = get_db_connection, **kwargs) -> Any:
+        """Run ``fn(conn, *args, **kwargs)`` as one transaction, retrying it on busy"""
+        for attempt in range(self.attempts):
+            try:
+                result = self._attempt(connect, fn, args, kwargs)
+            except sqlite3.OperationalError as e:
+                if not is_busy(e):
+                    raise
+                if attempt == self.attempts - 1:
+                    self._give_up(attempt, e)
+                time.sleep(self.delay(attempt))
+                continue
+            self._count(attempt)
+            return result
+
+    async def run_async(
+        self, fn: Callable, *args, connect: Callable = get_db_connection, **kwargs
+    ) -> Any:
+        """``run`` for routes: attempts go to the threadpool, backoff sleeps on the loop"""
+        for attempt in range(self.attempts):
+            try:
+                result = await run_in_threadpool(self._attempt, connect, fn, args, kwargs)
+            except sqlite3.OperationalError as e:
+                if not is_busy(e):
+                    raise
+                if attempt == self.attempts - 1:
+                    self._give_up(attempt, e)
+                await asyncio.sleep(self.delay(attempt))
+                continue
+            self._count(attempt)
+            return result
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'attempts': self.attempts,
+                'transactions': self.transactions,
+                'retried_transactions': self.retried_transactions,
+                'retries': self.retries,
+                'exhausted': self.exhausted
+            }
+
+
+def _build_policy() -> RetryPolicy:
+    settings = get_settings()
+    return RetryPolicy(
+        attempts=settings.WRITE_RETRY_ATTEMPTS,
+        base_delay=settings.WRITE_RETRY_BASE_DELAY,
+        max_delay=settings.WRITE_RETRY_MAX_DELAY
+    )
+
+
+write_retry = _build_policy()
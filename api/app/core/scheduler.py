@@ -0,0 +1,248 @@
+"""In-process scheduler for periodic maintenance jobs.
+
+Every worker runs the same scheduler inside the app lifespan. Jobs are
+claimed through a row in ``maintenance_jobs``, so with several workers a
+job still runs at most once per interval, and only on one worker at a
+time. The claim that starts a run also sets the job's ``next_due`` to
+``interval`` seconds later, stretched by a random jitter drawn once for
+that run, so jobs with the same interval drift apart instead of firing on
+the same tick; the job is due again once ``next_due`` has passed. A job
+seen for the first time is scheduled the same way, one jittered interval
+after that startup, so a fresh environment (a dev run, a test client) does
+not start with a backup and every rebuild at once. A claim
+is a lease: if a worker dies mid-run, the job is free again once the lease
+expires.
+
+Job functions are synchronous and run in a thread, off the event loop.
+Each run is recorded in ``maintenance_runs`` and logged with its duration.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from app.database import get_db_connection
+
+logger = logging.getLogger("uvicorn.error.scheduler")
+
+POLL_SECONDS = 30.0
+HISTORY_DAYS = 30
+
+
+@dataclass
+class Job:
+    name: str
+    interval: float
+    func: Callable[[], Optional[Dict]]
+    lease: float = 3600.0
+    enabled: bool = True
+
+
+def ensure_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_jobs (
+            name TEXT PRIMARY KEY,
+            locked_by TEXT,
+            locked_until REAL,
+            last_started REAL,
+            last_finished REAL,
+            last_status TEXT,
+            next_due REAL
+        )
+    ''')
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(maintenance_jobs)")}
+    if 'next_due' not in columns:
+        conn.execute("ALTER TABLE maintenance_jobs ADD COLUMN next_due REAL")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job TEXT NOT NULL,
+            worker TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            duration_ms REAL NOT NULL,
+            status TEXT NOT NULL,
+            detail TEXT
+        )
+    ''')
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_maintenance_runs_job ON maintenance_runs (job, id)"
+    )
+
+
+class Scheduler:
+    def __init__(self, jitter: float = 0.1, poll_seconds: float = POLL_SECONDS):
+        self.jitter = jitter
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.jobs: Dict[str, Job] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def register(self, name: str, interval: float, func: Callable[[], Optional[Dict]],
+                 lease: float = 3600.0, enabled: bool = True):
+        self.jobs[name] = Job(name, interval, func, lease, enabled)
+
+    # Claiming
+
+    def _next_due(self, job: Job, now: float) -> float:
+        return now + job.interval * (1 + random.uniform(0, self.jitter))
+
+    def _schedule_new(self, conn, now: float):
+        """Give jobs without a row their first due time; the first worker to get here wins"""
+        conn.executemany(
+            "INSERT OR IGNORE INTO maintenance_jobs (name, next_due) VALUES (?, ?)",
+            [(job.name, self._next_due(job, now)) for job in self.jobs.values()]
+        )
+        conn.commit()
+
+    def _due_jobs(self, conn, now: float) -> List[Job]:
+        # Rows from before next_due existed fall back to the bare interval
+        next_due = {
+            row['name']: row['next_due'] if row['next_due'] is not None
+            else (row['last_started'] or 0) + self.jobs[row['name']].interval
+            for row in conn.execute("SELECT name, last_started, next_due FROM maintenance_jobs")
+            if row['name'] in self.jobs
+        }
+        return [
+            job for job in self.jobs.values()
+            if job.enabled and job.name in next_due and next_due[job.name] <= now
+        ]
+
+    def _claim(self, conn, job: Job, now: float, force: bool = False) -> bool:
+        conn.execute(
+            "INSERT OR IGNORE INTO maintenance_jobs (name) VALUES (?)", (job.name,)
+        )
+        next_due = self._next_due(job, now)
+        cursor = conn.execute('''
+            UPDATE maintenance_jobs
+            SET locked_by = ?, locked_until = ?, last_started = ?, next_due = ?
+            WHERE name = ?
+            AND (locked_until IS NULL OR locked_until < ?)
+            AND (? OR COALESCE(next_due, COALESCE(last_started, 0) + ?) <= ?)
+        ''', (
+            self.worker_id, now + job.lease, now, next_due, job.name,
+            now, force, job.interval, now
+        ))
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def _release(self, conn, job: Job, started: float, duration_ms: float,
+                 status: str, detail: Optional[Dict]):
+        conn.execute('''
+            UPDATE maintenance_jobs
+            SET locked_by = NULL, locked_until = NULL, last_finished = ?, last_status = ?
+            WHERE name = ? AND locked_by = ?
+        ''', (time.time(), status, job.name, self.worker_id))
+        conn.execute('''
+            INSERT INTO maintenance_runs (job, worker, started_at, duration_ms, status, detail)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (
+            job.name,
+            self.worker_id,
+            datetime.fromtimestamp(started).strftime('%Y-%m-%d %H:%M:%S'),
+            duration_ms,
+            status,
+            json.dumps(detail, default=str) if detail is not None else None
+        ))
+        conn.execute(
+            "DELETE FROM maintenance_runs WHERE started_at < datetime('now', 'localtime', ?)",
+            (f'-{HISTORY_DAYS} days',)
+        )
+        conn.commit()
+
+    # Running
+
+    def run_job(self, name: str, force: bool = False) -> Optional[Dict]:
+        """
+        Claim and run one job in the calling thread. Returns the run record,
+        or None if the job is not due or another worker holds it.
+        """
+        job = self.jobs[name]
+        conn = get_db_connection()
+        try:
+            started = time.time()
+            if not self._claim(conn, job, started, force):
+                return None
+
+            clock = time.perf_counter()
+            try:
+                detail = job.func()
+                status = 'ok'
+            except Exception as e:
+                detail = {'error': str(e)}
+                status = 'error'
+            duration_ms = round((time.perf_counter() - clock) * 1000, 1)
+
+            self._release(conn, job, started, duration_ms, status, detail)
+        finally:
+            conn.close()
+
+        log = logger.info if status == 'ok' else logger.error
+        log("maintenance job %s %s in %.1f ms: %s", name, status, duration_ms, detail)
+        return {'job': name, 'status': status, 'duration_ms': duration_ms, 'detail': detail}
+
+    def _run_due(self):
+        conn = get_db_connection()
+        try:
+            now = time.time()
+            self._schedule_new(conn, now)
+            due = self._due_jobs(conn, now)
+        finally:
+            conn.close()
+        for job in due:
+            self.run_job(job.name)
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.to_thread(self._run_due)
+            except Exception:
+                logger.exception("maintenance scheduler tick failed")
+            delay = self.poll_seconds * (1 + random.uniform(-self.jitter, self.jitter))
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Stop polling; a job already running is left to finish in its thread"""
+        if self._task is not None:
+            self._stopping.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self, conn, runs: int = 20) -> Dict:
+        jobs = {row['name']: dict(row) for row in conn.execute("SELECT * FROM maintenance_jobs")}
+        return {
+            'worker': self.worker_id,
+            'running': self._task is not None,
+            'jobs': [
+                {
+                    'name': job.name,
+                    'interval_seconds': job.interval,
+                    'enabled': job.enabled,
+                    **{k: v for k, v in jobs.get(job.name, {}).items() if k != 'name'}
+                }
+                for job in self.jobs.values()
+            ],
+            'recent_runs': [
+                dict(row) for row in conn.execute(
+                    "SELECT * FROM maintenance_runs ORDER BY id DESC LIMIT ?", (runs,)
+                )
+            ]
+        }
@@ -0,0 +1,146 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import tempfile
+import time
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException
+
+from app.core.config import get_settings, Settings
+
+TOKEN_VERSION = 'v1'
+
+# Shortest HMAC key accepted; generated keys are twice this in hex
+MIN_SECRET_BYTES = 32
+
+
+def require_admin(
+    x_admin_token: Optional[str] = Header(default=None),
+    settings: Settings = Depends(get_settings)
+):
+    """Dependency guarding admin routes with the ADMIN_TOKEN setting"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def _read_secret(path: str) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _create_secret_file(path: str):
+    """
+    Write a new key to a temporary file and hard-link it into place. The
+    link only succeeds if nothing is there yet, so the file never appears
+    half-written and a worker racing this one keeps whichever key won.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), prefix='.session_secret.'
+    )
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(secrets.token_hex(MIN_SECRET_BYTES).encode())
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.unlink(temp_path)
+
+
+@lru_cache()
+def get_session_secret() -> bytes:
+    """
+    HMAC key for user tokens.
+
+    Uses SESSION_SECRET when set. Otherwise a random key is created once in
+    SESSION_SECRET_FILE, so every worker sharing the directory signs and
+    verifies with the same key. A key shorter than MIN_SECRET_BYTES raises
+    instead of being used, and nothing is cached until a key is accepted.
+    """
+    settings = get_settings()
+    if settings.SESSION_SECRET:
+        secret = settings.SESSION_SECRET.encode()
+        if len(secret) < MIN_SECRET_BYTES:
+            raise RuntimeError(f"SESSION_SECRET must be at least {MIN_SECRET_BYTES} bytes")
+        return secret
+
+    path = settings.SESSION_SECRET_FILE
+    secret = _read_secret(path)
+    if secret is None:
+        _create_secret_file(path)
+        secret = _read_secret(path)
+    if not secret or len(secret) < MIN_SECRET_BYTES:
+        raise RuntimeError(
+            f"{path} holds an empty or short session secret; delete it to generate a new "
+            f"one (this signs out every user) or set SESSION_SECRET"
+        )
+    return secret
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(get_session_secret(), payload.encode(), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def issue_user_token(user_id: int) -> str:
+    """Signed token carrying a user id: <payload>.<signature>"""
+    payload = _b64encode(f"{TOKEN_VERSION}:{user_id}:{int(time.time())}".encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_user_token(token: str) -> Optional[int]:
+    """User id from a token, or None if it is malformed, forged or expired"""
+    try:
+        payload, signature = token.split('.')
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        version, user_id, issued_at = _b64decode(payload).decode().split(':')
+        if version != TOKEN_VERSION:
+            return None
+        max_age = get_settings().SESSION_TOKEN_TTL_DAYS * 86400
+        if time.time() - int(issued_at) > max_age:
+            return None
+        return int(user_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def get_current_user_id(authorization: Optional[str] = Header(default=None)) -> int:
+    """Dependency resolving the user from an 'Authorization: Bearer <token>' header"""
+    scheme, _, token = (authorization or '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        raise HTTPException(
+            status_code=401,
+            detail="Missing bearer token",
+            headers={'WWW-Authenticate': 'Bearer'}
+        )
+
+    user_id = verify_user_token(token.strip())
+    if user_id is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired token",
+            headers={'WWW-Authenticate': 'Bearer'}
+        )
+    return user_id
@@ -0,0 +1,69 @@
+"""Row-by-row JSON encoding for large list endpoints.
+
+The generators here read from an iterating sqlite3 cursor and emit a JSON
+array or NDJSON as they go, so neither the row list nor the encoded body is
+ever held in memory at once. They are synchronous on purpose: Starlette
+drives sync iterators from its threadpool, keeping SQLite reads off the
+event loop.
+"""
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+from app.database import get_db_connection
+
+STREAM_FORMATS = ('json', 'ndjson')
+
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows are grouped into chunks so each write carries a useful amount of
+# data without delaying the first byte
+ROWS_PER_CHUNK = 100
+
+
+def iter_query(query: str, params: Sequence[Any] = ()) -> Iterator[Dict]:
+    """Yield each row of a query as a dict, straight off the cursor"""
+    conn = get_db_connection(check_same_thread=False)
+    try:
+        cursor = conn.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        for row in cursor:
+            yield dict(zip(columns, row))
+    finally:
+        conn.close()
+
+
+def _grouped(rows: Iterable[Dict], encode) -> Iterator[List[str]]:
+    chunk = []
+    for row in rows:
+        chunk.append(encode(row))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def json_array_chunks(rows: Iterable[Dict]) -> Iterator[str]:
+    """Encode rows as a single JSON array"""
+    yield '['
+    separator = ''
+    for chunk in _grouped(rows, json.dumps):
+        yield separator + ','.join(chunk)
+        separator = ','
+    yield ']'
+
+
+def ndjson_chunks(rows: Iterable[Dict]) -> Iterator[str]:
+    """Encode rows as newline-delimited JSON"""
+    for chunk in _grouped(rows, json.dumps):
+        yield '\n'.join(chunk) + '\n'
+
+
+def stream_rows(rows: Iterable[Dict], format: str) -> Iterator[str]:
+    """Encode rows in one of STREAM_FORMATS"""
+    if format == 'ndjson':
+        return ndjson_chunks(rows)
+    return json_array_chunks(rows)
@@ -3,6 +3,7 @@ from databases import Database
 from sqlalchemy import create_engine, MetaData
 from fastapi import Depends
 from typing import AsyncGenerator
+from app.core.config import get_settings
 
 # Database URL
 DATABASE_URL = "sqlite:///trivia.db"
@@ -16,12 +17,58 @@ engine = create_engine(DATABASE_URL)
 metadata.create_all(engine)
 
 # Legacy synchronous connection function
-def get_db_connection():
+def get_db_connection(check_same_thread=True):
     """Create a database connection with row factory enabled"""
-    conn = sqlite3.connect('trivia.db')
+    conn = sqlite3.connect(
+        'trivia.db', timeout=get_settings().DB_BUSY_TIMEOUT, check_same_thread=check_same_thread
+    )
     conn.row_factory = sqlite3.Row
     return conn
 
+def ensure_schema(conn):
+    """
+    Indexes and auxiliary tables used by the API, in trivia.db. Also run by
+    offline tools that must not go through the startup checks of init_db.
+    """
+    from app.core import scheduler
+    from app.services import (
+        answer_stats, archive, catalog, dedup, play_sessions, quiz_snapshots, recommendations,
+        rollups, shards, user_directory
+    )
+
+    # WAL lets readers run alongside the single writer; the setting is
+    # stored in the file, so this only does work the first time
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_quiz_id ON questions (quiz_id)")
+    # Per-user history, newest first; archive partitions carry the same index
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_quiz_results_user ON quiz_results (user_id, completed_at)"
+    )
+    answer_stats.ensure_schema(conn)
+    archive.ensure_schema(conn)
+    catalog.ensure_schema(conn)
+    dedup.ensure_schema(conn)
+    play_sessions.ensure_schema(conn)
+    quiz_snapshots.ensure_schema(conn)
+    recommendations.ensure_schema(conn)
+    rollups.ensure_schema(conn)
+    scheduler.ensure_schema(conn)
+    shards.ensure_schema(conn)
+    user_directory.ensure_schema(conn)
+    conn.commit()
+
+
+def init_db():
+    """Create the schema, then check the user shard layout against USER_SHARDS"""
+    from app.services import shards
+
+    conn = get_db_connection()
+    try:
+        ensure_schema(conn)
+        shards.prepare(conn)
+    finally:
+        conn.close()
+
 # New async database functions
 async def get_database() -> AsyncGenerator[Database, None]:
     """Dependency for getting async database session"""
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, model_validator
+from typing import Annotated, List, Optional, Dict, Union
+from typing_extensions import TypedDict
 from datetime import datetime
 
 class QuestionBase(BaseModel):
@@ -40,9 +41,39 @@ class QuestionBase(BaseModel):
         example="https://example.com/paris.jpg"
     )
 
-class QuestionCreate(QuestionBase):
+def check_answer_index(choices: List[str], index: int):
+    """ValueError unless the answer index picks one of the choices; shared by every question write"""
+    if index >= len(choices):
+        raise ValueError(f"correct_answer_index {index} is out of range for {len(choices)} choices")
+
+class QuestionInput(QuestionBase):
+    """A question as sent to be stored"""
+    @model_validator(mode='after')
+    def _answer_in_choices(self):
+        check_answer_index(self.choices, self.correct_answer_index)
+        return self
+
+class QuestionCreate(QuestionInput):
     quiz_id: int = Field(..., description="ID of the quiz this question belongs to")
 
+class QuestionCreateRow(TypedDict):
+    """QuestionCreate as a plain dict, for bulk uploads validated without models"""
+    quiz_id: int
+    question_text: str
+    choices: List[str]
+    correct_answer_index: Annotated[int, Field(ge=0)]
+    explanation: str
+    category: str
+    difficulty: str
+    image: str
+
+def _row_answer_in_choices(row: QuestionCreateRow) -> QuestionCreateRow:
+    check_answer_index(row['choices'], row['correct_answer_index'])
+    return row
+
+# A TypedDict can not carry validators, so uploads validate rows through this
+CheckedQuestionRow = Annotated[QuestionCreateRow, AfterValidator(_row_answer_in_choices)]
+
 class Question(QuestionBase):
     id: int
     quiz_id: int
@@ -89,6 +120,47 @@ class Quiz(QuizBase):
 
 class QuizWithQuestions(Quiz):
     questions: List[Question]
+    # Immutable id of this exact question set, see app.services.quiz_snapshots
+    version_id: Optional[int] = None
+
+class QuizWithQuestionsCreate(BaseModel):
+    quiz: QuizCreate
+    questions: List[QuestionInput]
+
+class PatchModel(BaseModel):
+    """PATCH body: fields left out keep their value, unknown fields and nulls are rejected"""
+    model_config = ConfigDict(extra='forbid')
+
+    @model_validator(mode='after')
+    def _reject_nulls(self):
+        nulls = sorted(name for name in self.model_fields_set if getattr(self, name) is None)
+        if nulls:
+            raise ValueError(f"{', '.join(nulls)} can not be null")
+        return self
+
+    def changes(self) -> Dict:
+        """The fields sent, by column name"""
+        return self.model_dump(exclude_unset=True, exclude={'id'})
+
+class QuizUpdate(PatchModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    image: Optional[str] = None
+    category: Optional[str] = None
+    difficulty: Optional[str] = None
+
+class QuestionUpdate(PatchModel):
+    quiz_id: Optional[int] = Field(default=None, description="Move the question to another quiz")
+    question_text: Optional[str] = None
+    choices: Optional[List[str]] = Field(default=None, min_length=1)
+    correct_answer_index: Optional[int] = Field(default=None, ge=0)
+    explanation: Optional[str] = None
+    category: Optional[str] = None
+    difficulty: Optional[str] = None
+    image: Optional[str] = None
+
+class QuestionBatchUpdate(QuestionUpdate):
+    id: int = Field(..., description="ID of the question to update")
 
 class UserBase(BaseModel):
     email: str
@@ -107,6 +179,10 @@ class QuizResult(BaseModel):
     quiz_id: int
     score: float
     answers: dict
+    quiz_version_id: Optional[int] = Field(
+        default=None,
+        description="version_id of the quiz payload answered; the quiz's current version if omitted"
+    )
 
 class QuizResultResponse(QuizResult):
     id: int
@@ -114,9 +190,10 @@ class QuizResultResponse(QuizResult):
 
 class UserStats(BaseModel):
     total_quizzes: int
-    average_score: float
-    highest_score: float
-    lowest_score: float
+    # None until the user has a result
+    average_score: Optional[float] = None
+    highest_score: Optional[float] = None
+    lowest_score: Optional[float] = None
     unique_quizzes: int
 
 class CategoryStat(BaseModel):
@@ -125,6 +202,30 @@ class CategoryStat(BaseModel):
     average_score: float
 
 class UserStatsResponse(BaseModel):
-    email: str
+    # One of the two, by route; the other is left out of the response
+    email: Optional[str] = None
+    user_id: Optional[int] = None
     overall_stats: UserStats
-    category_stats: List[CategoryStat]
\ No newline at end of file
+    category_stats: List[CategoryStat]
+
+class ProfileResult(BaseModel):
+    result_id: int
+    score: float
+    # Object keyed by question id, or a list of indices in older rows
+    answers: Union[dict, list]
+    completed_at: str
+    quiz_id: int
+    quiz_name: str
+    category: str
+    difficulty: str
+    quiz_version_id: Optional[int] = None
+
+class UserProfileResponse(UserStatsResponse):
+    results: List[ProfileResult]
+    total_results: int
+    limit: int
+    offset: int
+
+class PlayAnswer(BaseModel):
+    question_id: int
+    selected_answer: int = Field(..., ge=0, description="Index of the chosen answer (0-based)")
\ No newline at end of file
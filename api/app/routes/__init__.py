@@ -1,3 +1,3 @@
-from . import users, quizzes, questions, categories
+from . import users, quizzes, questions, categories, admin, play, stats, health, bootstrap
 
-__all__ = ['users', 'quizzes', 'questions', 'categories']
\ No newline at end of file
+__all__ = ['users', 'quizzes', 'questions', 'categories', 'admin', 'play', 'stats', 'health', 'bootstrap']
\ No newline at end of file
@@ -0,0 +1,123 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.core.admission import get_admission_controller
+from app.core.compute import compute_pool
+from app.core.config import get_settings, Settings
+from app.core.retry import write_retry
+from app.core.security import require_admin
+from app.database import get_db_connection
+from app.services import backup, export
+from app.services.maintenance import scheduler
+from app.services.dedup import dedup_index, signature_backfill
+from app.services.quiz_snapshots import snapshot_cache
+from app.services.user_directory import user_id_cache
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin)],
+)
+
+MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+@router.get("/export/results",
+    summary="Export quiz results",
+    description="Stream quiz results joined with quiz and user details as CSV or Arrow IPC. "
+                "Resume an interrupted export by passing the last result_id as after_id."
+)
+async def export_results(
+    format: str = Query(default='csv', pattern='^(csv|arrow)$'),
+    since: Optional[str] = Query(default=None, description="completed_at lower bound (inclusive)"),
+    until: Optional[str] = Query(default=None, description="completed_at upper bound (exclusive)"),
+    after_id: int = Query(default=0, ge=0, description="Only results with a larger result_id"),
+    batch_size: Optional[int] = Query(default=None, ge=1, le=100000),
+    settings: Settings = Depends(get_settings)
+):
+    try:
+        chunks = export.stream_export(
+            format=format,
+            since=since,
+            until=until,
+            after_id=after_id,
+            batch_size=batch_size or settings.EXPORT_BATCH_SIZE
+        )
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    extension = 'csv' if format == 'csv' else 'arrows'
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="quiz_results.{extension}"'}
+    )
+
+@router.get("/metrics",
+    summary="Runtime metrics",
+    description="Counters and gauges for this worker's admission control, caches and pools"
+)
+async def get_metrics():
+    return {
+        'admission': get_admission_controller().snapshot(),
+        'user_cache': user_id_cache.snapshot(),
+        'dedup_index': dedup_index.stats(),
+        'signature_backfill': signature_backfill.snapshot(),
+        'quiz_snapshots': snapshot_cache.stats(),
+        'write_retry': write_retry.snapshot(),
+        'compute': compute_pool.snapshot()
+    }
+
+@router.get("/maintenance",
+    summary="Maintenance jobs",
+    description="Schedule, lock state and recent runs of the housekeeping jobs"
+)
+async def get_maintenance(runs: int = Query(default=20, ge=1, le=500)):
+    conn = get_db_connection()
+    try:
+        return scheduler.snapshot(conn, runs)
+    finally:
+        conn.close()
+
+@router.post("/maintenance/{job}/run",
+    summary="Run a maintenance job now",
+    description="Runs the job on this worker unless another worker is running it (409)"
+)
+async def run_maintenance_job(job: str):
+    if job not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job}")
+
+    result = await run_in_threadpool(scheduler.run_job, job, True)
+    if result is None:
+        raise HTTPException(status_code=409, detail=f"{job} is running on another worker")
+    return result
+
+@router.get("/backups",
+    summary="List backups",
+    description="Snapshots in BACKUP_DIR, newest first. verify=true also checks each checksum and "
+                "runs integrity_check."
+)
+async def get_backups(verify: bool = False):
+    backups = await run_in_threadpool(backup.list_backups)
+    if verify:
+        settings = get_settings()
+        for entry in backups:
+            path = os.path.join(settings.BACKUP_DIR, entry['file'])
+            entry['verification'] = await run_in_threadpool(backup.verify_backup, path)
+    return {'backups': backups, 'total': len(backups)}
+
+@router.post("/backups",
+    summary="Take a backup now",
+    description="Runs the backup maintenance job on this worker, 409 if one is already running"
+)
+async def create_backup():
+    result = await run_in_threadpool(scheduler.run_job, 'backup', True)
+    if result is None:
+        raise HTTPException(status_code=409, detail="A backup is already running")
+    if result['status'] != 'ok':
+        raise HTTPException(status_code=500, detail=result['detail'])
+    return result
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Query, Request, Response
+from typing import Dict
+from app.core.conditional import conditional, make_etag
+from app.services.home import home_cache
+
+router = APIRouter(prefix="/api", tags=["bootstrap"])
+
+@router.get("/bootstrap",
+    response_model=Dict,
+    summary="Home page data",
+    description="Categories with quiz and question counts, sample quizzes per category and the "
+                "catalog version in one response, served from a per-version cache. Carries the "
+                "same ETag as the other catalog routes."
+)
+async def get_bootstrap(
+    request: Request,
+    response: Response,
+    limit: int = Query(default=3, description="Number of sample quizzes per category")
+):
+    summary = home_cache.get()
+    not_modified = conditional(request, response, make_etag('c', summary.version), summary.updated_at)
+    if not_modified:
+        return not_modified
+
+    return {
+        'catalog_version': summary.version,
+        'categories': summary.categories,
+        'samples': summary.samples(limit),
+        'quizzes_per_category': limit
+    }
@@ -1,19 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from typing import List
-from app.database import get_db_connection
+from app.core.conditional import conditional, make_etag
+from app.services.home import home_cache
 
 router = APIRouter()
 
 @router.get("/api/categories", response_model=List[str])
-async def get_categories():
+async def get_categories(request: Request, response: Response):
     """Get all unique category names"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    summary = home_cache.get()
+    not_modified = conditional(request, response, make_etag('c', summary.version), summary.updated_at)
+    if not_modified:
+        return not_modified
 
-        cursor.execute("SELECT DISTINCT category FROM quiz ORDER BY category")
-        categories = cursor.fetchall()
+    return [category['name'] for category in summary.categories]
 
-        return [category['category'] for category in categories]
-    finally:
-        conn.close()
\ No newline at end of file
@@ -0,0 +1,47 @@
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from app.core.health import probe_database, readiness
+from app.services.dedup import dedup_index
+from app.services.question_index import question_index
+from app.services.user_directory import user_id_cache
+
+router = APIRouter(tags=["health"])
+
+@router.get("/healthz",
+    summary="Liveness",
+    description="Returns 200 while the process can serve requests. Does not touch the database."
+)
+async def healthz():
+    return {'status': 'ok'}
+
+@router.get("/readyz",
+    summary="Readiness",
+    description="Checks this worker's queue saturation, event-loop lag, database access and "
+                "cache state, and reports database latency and WAL size. Returns 503 with the "
+                "failing checks when the worker should not receive traffic."
+)
+async def readyz():
+    # Through the threadpool like the routes themselves, so a saturated
+    # pool shows up as probe latency
+    database = await run_in_threadpool(probe_database)
+
+    user_cache = user_id_cache.snapshot()
+    caches = {
+        'question_index': {
+            'loaded': question_index.loaded_at is not None,
+            **question_index.stats()
+        },
+        'dedup_index': {
+            'loaded': dedup_index.loaded_at is not None,
+            **dedup_index.stats()
+        },
+        'user_cache': {
+            'fill': round(user_cache['size'] / user_cache['maxsize'], 4)
+            if user_cache['maxsize'] else 0.0,
+            **user_cache
+        }
+    }
+
+    report = readiness(database, caches)
+    return JSONResponse(report, status_code=200 if report['status'] == 'ready' else 503)
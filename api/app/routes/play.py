@@ -0,0 +1,174 @@
+from fastapi import APIRouter, HTTPException
+from typing import Dict
+from app.database import get_db_connection
+from app.models.schemas import PlayAnswer
+from app.services import play_sessions
+import json
+
+router = APIRouter(
+    prefix="/api",
+    tags=["play"],
+    responses={404: {"description": "Not found"}},
+)
+
+def _load_session(cursor, session_id: str) -> Dict:
+    session = play_sessions.get_session(cursor, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Play session not found or expired")
+    return session
+
+@router.post("/quizzes/{quiz_id}/play",
+    response_model=Dict,
+    status_code=201,
+    summary="Start playing a quiz",
+    description="Start a play session. Returns the quiz details and the first question "
+                "without its answer; later questions are fetched one position at a time."
+)
+async def start_play(quiz_id: int):
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "SELECT id, name, description, image, category, difficulty FROM quiz WHERE id = ?",
+            (quiz_id,)
+        )
+        quiz = cursor.fetchone()
+
+        if not quiz:
+            raise HTTPException(status_code=404, detail=f"Quiz with ID {quiz_id} not found")
+
+        cursor.execute("SELECT id FROM questions WHERE quiz_id = ? ORDER BY id", (quiz_id,))
+        question_ids = [row['id'] for row in cursor.fetchall()]
+
+        session_id = play_sessions.create_session(cursor, quiz_id, question_ids)
+        conn.commit()
+
+        session = {'id': session_id, 'quiz_id': quiz_id, 'question_ids': question_ids}
+        return {
+            'session_id': session_id,
+            'quiz': dict(quiz),
+            'total_questions': len(question_ids),
+            'question': play_sessions.get_public_question(cursor, session, 0)
+        }
+    finally:
+        if conn:
+            conn.close()
+
+@router.get("/play/{session_id}/questions/{position}",
+    response_model=Dict,
+    summary="Get the question at a position",
+    description="Get one question of a play session (0-based position) without its answer"
+)
+async def get_play_question(session_id: str, position: int):
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        session = _load_session(cursor, session_id)
+        question = play_sessions.get_public_question(cursor, session, position)
+
+        if not question:
+            raise HTTPException(status_code=404, detail=f"No question at position {position}")
+
+        return question
+    finally:
+        if conn:
+            conn.close()
+
+@router.post("/play/{session_id}/answers",
+    response_model=Dict,
+    summary="Answer a question",
+    description="Submit the answer for a question and receive the correct answer and explanation"
+)
+async def submit_play_answer(session_id: str, answer: PlayAnswer):
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        session = _load_session(cursor, session_id)
+
+        if answer.question_id not in session['question_ids']:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Question with ID {answer.question_id} is not part of this session"
+            )
+
+        cursor.execute(
+            "SELECT choices, correct_answer_index, explanation FROM questions WHERE id = ?",
+            (answer.question_id,)
+        )
+        question = cursor.fetchone()
+
+        if not question:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Question with ID {answer.question_id} not found"
+            )
+
+        if answer.selected_answer >= len(json.loads(question['choices'])):
+            raise HTTPException(status_code=400, detail="Selected answer is out of range")
+
+        if not play_sessions.record_answer(
+            cursor, session, answer.question_id, answer.selected_answer
+        ):
+            raise HTTPException(status_code=409, detail="Question was already answered")
+
+        conn.commit()
+
+        return {
+            'question_id': answer.question_id,
+            'selected_answer': answer.selected_answer,
+            'is_correct': answer.selected_answer == question['correct_answer_index'],
+            'correct_answer_index': question['correct_answer_index'],
+            'explanation': question['explanation'],
+            'answered': len(session['answers']),
+            'total_questions': len(session['question_ids'])
+        }
+    finally:
+        if conn:
+            conn.close()
+
+@router.get("/play/{session_id}",
+    response_model=Dict,
+    summary="Get play session progress",
+    description="Answers submitted so far, keyed by question id, and the resulting score"
+)
+async def get_play_session(session_id: str):
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        session = _load_session(cursor, session_id)
+        answers = session['answers']
+        total = len(session['question_ids'])
+
+        correct = 0
+        if answers:
+            placeholders = ','.join('?' * len(answers))
+            cursor.execute(
+                f"SELECT id, correct_answer_index FROM questions WHERE id IN ({placeholders})",
+                [int(question_id) for question_id in answers]
+            )
+            correct = sum(
+                1 for row in cursor.fetchall()
+                if answers.get(str(row['id'])) == row['correct_answer_index']
+            )
+
+        return {
+            'session_id': session_id,
+            'quiz_id': session['quiz_id'],
+            'answers': answers,
+            'answered': len(answers),
+            'total_questions': total,
+            'correct': correct,
+            'score': round(correct / total * 100) if total else 0,
+            'completed': len(answers) == total
+        }
+    finally:
+        if conn:
+            conn.close()
@@ -1,68 +1,112 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from typing import List, Dict, Optional
+from app.core.conditional import conditional, make_etag
+from app.core.retry import is_busy, write_retry
 from app.database import get_db_connection
-from app.models.schemas import Question, QuestionCreate, QuizWithQuestions
+from app.models.schemas import (
+    Question, QuestionBatchUpdate, QuestionCreate, QuestionUpdate, QuizWithQuestions
+)
+from app.services import answer_stats, dedup, edits, ingest, quiz_snapshots
+from app.services.catalog import catalog_versions
+from app.services.dedup import dedup_index
+from app.services.question_index import question_index
+from app.services.quiz_snapshots import snapshot_cache
 import json
 import traceback
 
 router = APIRouter()
 
-@router.post("/api/questions", response_model=Dict)
-async def add_questions(questions: List[QuestionCreate]):
-    """Add multiple questions to quizzes"""
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+def _insert_questions(conn, questions: List[QuestionCreate], signatures):
+    """Insert what can be inserted; one write transaction, run through write_retry"""
+    cursor = conn.cursor()
 
-        results = []
-        errors = []
-
-        for index, question in enumerate(questions):
-            try:
-                # Verify quiz exists
-                cursor.execute("SELECT id FROM quiz WHERE id = ?", (question.quiz_id,))
-                quiz = cursor.fetchone()
-
-                if not quiz:
-                    errors.append({
-                        'index': index,
-                        'error': f'Quiz with ID {question.quiz_id} not found'
-                    })
-                    continue
-
-                choices_json = json.dumps(question.choices)
-
-                cursor.execute('''
-                    INSERT INTO questions (
-                        quiz_id, question_text, choices, correct_answer_index,
-                        explanation, category, difficulty, image
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    question.quiz_id,
-                    question.question_text,
-                    choices_json,
-                    question.correct_answer_index,
-                    question.explanation,
-                    question.category,
-                    question.difficulty,
-                    question.image
-                ))
-
-                new_question_id = cursor.lastrowid
-                cursor.execute("SELECT * FROM questions WHERE id = ?", (new_question_id,))
-                new_question = dict(cursor.fetchone())
-                new_question['choices'] = json.loads(new_question['choices'])
-                results.append(new_question)
-
-            except Exception as e:
+    results = []
+    errors = []
+    stored_signatures = []
+
+    for index, question in enumerate(questions):
+        try:
+            # Verify quiz exists
+            cursor.execute("SELECT id FROM quiz WHERE id = ?", (question.quiz_id,))
+            quiz = cursor.fetchone()
+
+            if not quiz:
                 errors.append({
                     'index': index,
-                    'error': str(e)
+                    'error': f'Quiz with ID {question.quiz_id} not found'
                 })
+                continue
 
-        conn.commit()
+            choices_json = json.dumps(question.choices)
+
+            cursor.execute('''
+                INSERT INTO questions (
+                    quiz_id, question_text, choices, correct_answer_index,
+                    explanation, category, difficulty, image
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                question.quiz_id,
+                question.question_text,
+                choices_json,
+                question.correct_answer_index,
+                question.explanation,
+                question.category,
+                question.difficulty,
+                question.image
+            ))
+
+            new_question_id = cursor.lastrowid
+            dedup.store(cursor, [(new_question_id, signatures[index])])
+            cursor.execute("SELECT * FROM questions WHERE id = ?", (new_question_id,))
+            new_question = dict(cursor.fetchone())
+            new_question['choices'] = json.loads(new_question['choices'])
+            results.append(new_question)
+            stored_signatures.append((new_question_id, signatures[index]))
+
+        except Exception as e:
+            # Busy aborts the whole transaction; let write_retry rerun it
+            if is_busy(e):
+                raise
+            errors.append({
+                'index': index,
+                'error': str(e)
+            })
+
+    quiz_snapshots.store_current(cursor, [question['quiz_id'] for question in results])
+    return results, errors, stored_signatures
+
+@router.post("/api/questions", response_model=Dict)
+async def add_questions(
+    questions: List[QuestionCreate],
+    duplicates: str = Query(
+        default='flag',
+        pattern='^(flag|reject|allow)$',
+        description="What to do with near-duplicates of existing questions or of each other"
+    )
+):
+    """Add multiple questions to quizzes"""
+    signatures, near_duplicates = await ingest.screen(
+        [question.question_text for question in questions], duplicates
+    )
+    if duplicates == 'reject' and near_duplicates:
+        raise HTTPException(
+            status_code=409,
+            detail={'message': 'Near-duplicate questions', 'duplicates': near_duplicates}
+        )
+
+    try:
+        results, errors, stored_signatures = await write_retry.run_async(
+            _insert_questions, questions, signatures
+        )
+        catalog_versions.invalidate()
+
+        for new_question in results:
+            question_index.add(
+                new_question['id'], new_question['category'], new_question['difficulty']
+            )
+        for question_id, signature in stored_signatures:
+            dedup_index.add(question_id, signature)
 
         response = {
             'success': True,
@@ -70,17 +114,140 @@ async def add_questions(questions: List[QuestionCreate]):
             'total_added': len(results)
         }
 
+        if near_duplicates:
+            response['duplicates'] = near_duplicates
+
         if errors:
             response['errors'] = errors
             response['total_errors'] = len(errors)
 
         return response
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/api/questions/bulk",
+    response_model=Dict,
+    summary="Add questions in bulk",
+    description="Same body as POST /api/questions, validated in one pass without per-question "
+                "models. Invalid bodies get a 422 listing errors per question index; the response "
+                "carries the new ids instead of the stored questions.",
+    openapi_extra={
+        'requestBody': {
+            'required': True,
+            'content': {'application/json': {'schema': ingest.BODY_SCHEMA}}
+        }
+    }
+)
+async def add_questions_bulk(
+    request: Request,
+    duplicates: str = Query(
+        default='flag',
+        pattern='^(flag|reject|allow)$',
+        description="What to do with near-duplicates of existing questions or of each other"
+    )
+):
+    try:
+        rows = await ingest.validate(await request.body())
+    except ingest.BatchValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+
+    signatures, near_duplicates = await ingest.screen([row[1] for row in rows], duplicates)
+    if duplicates == 'reject' and near_duplicates:
+        raise HTTPException(
+            status_code=409,
+            detail={'message': 'Near-duplicate questions', 'duplicates': near_duplicates}
+        )
+
+    try:
+        results, errors, stored_signatures = await write_retry.run_async(
+            ingest.insert_rows, rows, signatures
+        )
+        catalog_versions.invalidate()
+
+        for result in results:
+            category, difficulty = rows[result['index']][5:7]
+            question_index.add(result['id'], category, difficulty)
+        for question_id, signature in stored_signatures:
+            dedup_index.add(question_id, signature)
+
+        response = {
+            'success': True,
+            'results': results,
+            'total_added': len(results)
+        }
+
+        if near_duplicates:
+            response['duplicates'] = near_duplicates
+
+        if errors:
+            response['errors'] = errors
+            response['total_errors'] = len(errors)
+
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _patch_questions(patches):
+    """Signatures for new texts, then the edits and their cache updates"""
+    texts = [(index, changes['question_text'])
+             for index, (_, changes) in enumerate(patches) if 'question_text' in changes]
+    signatures, _ = await ingest.screen([text for _, text in texts], 'allow')
+    by_index = {index: signature for (index, _), signature in zip(texts, signatures)}
+
+    result = await write_retry.run_async(edits.patch_questions, patches, by_index)
+    edits.apply_questions(result)
+    return result.edits
+
+@router.patch("/api/questions",
+    response_model=Dict,
+    summary="Update questions in bulk",
+    description="Partial updates to many questions in one transaction, all or nothing. Each item "
+                "carries the question id and only the fields to change. A 404 lists unknown ids, "
+                "a 422 lists invalid edits by index."
+)
+async def update_questions(patches: List[QuestionBatchUpdate]):
+    try:
+        updated = await _patch_questions([(patch.id, patch.changes()) for patch in patches])
+        return {
+            'success': True,
+            'results': [
+                {'id': edit.row['id'], 'changed': list(edit.changed)} for edit in updated
+            ],
+            'total_updated': sum(1 for edit in updated if edit.changed)
+        }
+    except edits.NotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except edits.InvalidEdit as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.patch("/api/questions/{question_id}",
+    response_model=Question,
+    summary="Update a question",
+    description="Change only the fields sent; the question keeps its id, so results and play "
+                "sessions that refer to it stay valid."
+)
+async def update_question(question_id: int, patch: QuestionUpdate):
+    try:
+        (edit,) = await _patch_questions([(question_id, patch.changes())])
+        return edit.row
+    except edits.NotFound:
+        raise HTTPException(status_code=404, detail=f'Question with ID {question_id} not found')
+    except edits.InvalidEdit as e:
+        raise HTTPException(status_code=422, detail='; '.join(error['error'] for error in e.errors))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn:
-            conn.close()
 
 @router.delete("/api/questions/{question_id}")
 async def delete_question(question_id: int):
@@ -89,7 +256,7 @@ async def delete_question(question_id: int):
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.execute("SELECT id FROM questions WHERE id = ?", (question_id,))
+        cursor.execute("SELECT id, quiz_id FROM questions WHERE id = ?", (question_id,))
         question = cursor.fetchone()
 
         if not question:
@@ -99,7 +266,13 @@ async def delete_question(question_id: int):
             )
 
         cursor.execute("DELETE FROM questions WHERE id = ?", (question_id,))
+        dedup.forget(cursor, [question_id])
+        quiz_snapshots.store_current(cursor, [question['quiz_id']])
         conn.commit()
+        catalog_versions.invalidate()
+
+        question_index.remove(question_id)
+        dedup_index.remove_many([question_id])
 
         return {
             'success': True,
@@ -110,39 +283,113 @@ async def delete_question(question_id: int):
         if conn:
             conn.close()
 
-@router.get("/api/quizzes/{quiz_id}/questions", response_model=QuizWithQuestions)
-async def get_questions_by_quiz_id(quiz_id: int):
-    """Get quiz details and all its questions"""
+@router.get("/api/questions/random", response_model=Dict)
+async def get_random_questions(
+    count: int = Query(default=10, ge=1, le=100, description="Number of questions to draw"),
+    category: Optional[List[str]] = Query(default=None, description="Categories to draw from"),
+    difficulty: Optional[List[str]] = Query(default=None, description="Difficulties to draw from")
+):
+    """Draw random questions across quizzes for quick play"""
+    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        question_index.refresh_if_stale()
+        question_ids = question_index.sample(count, category, difficulty)
+
+        questions = []
+        if question_ids:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            placeholders = ','.join('?' * len(question_ids))
+            cursor.execute(
+                f"SELECT * FROM questions WHERE id IN ({placeholders})", question_ids
+            )
+            rows = {row['id']: dict(row) for row in cursor.fetchall()}
+
+            stale_ids = [i for i in question_ids if i not in rows]
+            if stale_ids:
+                # Deleted by another worker since the index was loaded
+                question_index.remove_many(stale_ids)
+
+            for question_id in question_ids:
+                if question_id in rows:
+                    question = rows[question_id]
+                    question['choices'] = json.loads(question['choices'])
+                    questions.append(question)
 
-        cursor.execute("SELECT * FROM quiz WHERE id = ?", (quiz_id,))
-        quiz = cursor.fetchone()
+        return {
+            'questions': questions,
+            'count': len(questions),
+            'requested': count
+        }
+
+    finally:
+        if conn:
+            conn.close()
 
-        if not quiz:
+@router.get("/api/quizzes/{quiz_id}/questions", response_model=QuizWithQuestions)
+async def get_questions_by_quiz_id(
+    quiz_id: int,
+    request: Request,
+    response: Response,
+    version: Optional[int] = Query(
+        default=None,
+        description="A version_id of this quiz; the response never changes and may be cached forever"
+    )
+):
+    """Get quiz details and all its questions, as they are now or at a given version"""
+    if version is not None:
+        not_modified = conditional(
+            request, response, make_etag('qv', quiz_id, version), immutable=True
+        )
+        if not_modified:
+            return not_modified
+
+        snapshot = snapshot_cache.get(version)
+        if snapshot is None or snapshot[0] != quiz_id:
             raise HTTPException(
                 status_code=404,
-                detail=f'Quiz with ID {quiz_id} not found'
+                detail=f'Version {version} of quiz {quiz_id} not found'
             )
+        return {**snapshot[1], 'version_id': version}
 
-        quiz_dict = dict(quiz)
+    catalog_version, updated_at = catalog_versions.quiz(quiz_id)
+    not_modified = conditional(
+        request, response, make_etag('q', quiz_id, catalog_version), updated_at
+    )
+    if not_modified:
+        return not_modified
 
-        cursor.execute("SELECT * FROM questions WHERE quiz_id = ?", (quiz_id,))
-        questions = cursor.fetchall()
+    try:
+        current = await snapshot_cache.current(quiz_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        question_list = []
-        for question in questions:
-            question_dict = dict(question)
-            if 'choices' in question_dict and question_dict['choices']:
-                question_dict['choices'] = json.loads(question_dict['choices'])
-            question_list.append(question_dict)
+    if current is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f'Quiz with ID {quiz_id} not found'
+        )
+    version_id, payload = current
+    return {**payload, 'version_id': version_id}
 
-        quiz_dict['questions'] = question_list
-        return quiz_dict
+@router.get("/api/questions/{question_id}/stats", response_model=Dict)
+async def get_question_stats(question_id: int):
+    """Get how often each choice of a question has been picked"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        stats = answer_stats.get_question_stats(conn.cursor(), question_id)
+
+        if not stats:
+            raise HTTPException(
+                status_code=404,
+                detail=f'Question with ID {question_id} not found'
+            )
+
+        return stats
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
@@ -1,8 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Optional
 from databases import Database
-from app.database import get_db
-from app.models.schemas import Quiz, QuizCreate, Question, QuestionCreate, QuizWithQuestions
+from app.core.conditional import conditional, make_etag
+from app.core.retry import write_retry
+from app.core.streaming import MEDIA_TYPES, iter_query, stream_rows
+from app.database import get_db, get_db_connection
+from app.models.schemas import (
+    Quiz, QuizCreate, QuizUpdate, Question, QuestionCreate, QuizWithQuestions,
+    QuizWithQuestionsCreate
+)
+from app.services import answer_stats, dedup, edits, ingest, quiz_snapshots
+from app.services.catalog import catalog_versions
+from app.services.dedup import dedup_index
+from app.services.home import home_cache
+from app.services.question_index import question_index
 import sqlite3
 from datetime import datetime
 import json
@@ -17,12 +29,30 @@ router = APIRouter(
 @router.get("/quizzes",
     response_model=List[Quiz],
     summary="Get all quizzes",
-    description="Retrieve all quizzes, optionally filtered by category"
+    description="Retrieve all quizzes, optionally filtered by category. "
+                "Pass stream=json or stream=ndjson to stream rows as they are read."
 )
 async def get_quizzes(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
+    stream: Optional[str] = Query(default=None, pattern='^(json|ndjson)$'),
     db: Database = Depends(get_db)
 ):
+    version, updated_at = catalog_versions.current()
+    not_modified = conditional(request, response, make_etag('c', version), updated_at)
+    if not_modified:
+        return not_modified
+
+    if stream:
+        if category:
+            rows = iter_query("SELECT * FROM quiz WHERE category = ?", (category,))
+        else:
+            rows = iter_query("SELECT * FROM quiz")
+        return StreamingResponse(
+            stream_rows(rows, stream), media_type=MEDIA_TYPES[stream], headers=response.headers
+        )
+
     if category:
         query = "SELECT * FROM quiz WHERE category = :category"
         quizzes = await db.fetch_all(query=query, values={"category": category})
@@ -57,16 +87,36 @@ async def create_quiz(
         # Fetch the created quiz
         fetch_query = "SELECT * FROM quiz WHERE id = :id"
         created_quiz = await db.fetch_one(fetch_query, values={"id": quiz_id})
+        catalog_versions.invalidate()
 
         return dict(created_quiz)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.patch("/quizzes/{quiz_id}",
+    response_model=Quiz,
+    summary="Update a quiz",
+    description="Change only the fields sent. Only this quiz's cached payload is rebuilt; the "
+                "question search indexes are left alone."
+)
+async def update_quiz(quiz_id: int, patch: QuizUpdate):
+    try:
+        edit = await write_retry.run_async(edits.patch_quiz, quiz_id, patch.changes())
+        edits.apply_quiz(edit)
+        return edit.row
+    except edits.NotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/quizzes/{quiz_id}", status_code=200)
-async def delete_quiz(quiz_id: int, db: Database = Depends(get_db)):
+async def delete_quiz(quiz_id: int):
     """Delete a quiz and its questions"""
+    conn = None
     try:
-        conn = await db.connection()
+        conn = get_db_connection()
         cursor = conn.cursor()
 
         cursor.execute("SELECT id FROM quiz WHERE id = ?", (quiz_id,))
@@ -75,12 +125,20 @@ async def delete_quiz(quiz_id: int, db: Database = Depends(get_db)):
         if not quiz:
             raise HTTPException(status_code=404, detail=f"Quiz with ID {quiz_id} not found")
 
+        cursor.execute("SELECT id FROM questions WHERE quiz_id = ?", (quiz_id,))
+        question_ids = [row['id'] for row in cursor.fetchall()]
+
         conn.execute("BEGIN TRANSACTION")
         cursor.execute("DELETE FROM questions WHERE quiz_id = ?", (quiz_id,))
         questions_deleted = cursor.rowcount
         cursor.execute("DELETE FROM quiz WHERE id = ?", (quiz_id,))
+        dedup.forget(cursor, question_ids)
 
         conn.commit()
+        catalog_versions.invalidate()
+
+        question_index.remove_many(question_ids)
+        dedup_index.remove_many(question_ids)
 
         return {
             "success": True,
@@ -88,163 +146,162 @@ async def delete_quiz(quiz_id: int, db: Database = Depends(get_db)):
             "questions_deleted": questions_deleted
         }
     except sqlite3.Error as e:
+        if conn:
+            conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
 
-@router.route('/quizzes/with-questions', methods=['POST'])
-def create_quiz_with_questions():
-    """
-    Endpoint to create a new quiz along with its questions in a single request.
-    Accepts JSON with quiz data and an array of questions.
-    """
-    data = request.get_json()
-
-    if 'quiz' not in data:
-        return jsonify({'error': 'Missing quiz data'}), 400
-    if 'questions' not in data or not isinstance(data['questions'], list):
-        return jsonify({'error': 'Missing or invalid questions array'}), 400
-
-    quiz_data = data['quiz']
-    questions_data = data['questions']
+def _insert_quiz_with_questions(conn, payload: QuizWithQuestionsCreate, signatures):
+    """One write transaction, run through write_retry"""
+    cursor = conn.cursor()
+    conn.execute("BEGIN TRANSACTION")
 
-    required_quiz_fields = ['name', 'description', 'image', 'category', 'difficulty']
-    for field in required_quiz_fields:
-        if field not in quiz_data:
-            return jsonify({'error': f'Missing required quiz field: {field}'}), 400
+    current_time = datetime.now().strftime('%Y-%m-%d')
+    quiz_data = payload.quiz
 
-    required_question_fields = ['question_text', 'choices', 'correct_answer_index',
-                              'explanation', 'image', 'difficulty', 'category']
+    cursor.execute('''
+        INSERT INTO quiz (name, description, image, category, difficulty, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (
+        quiz_data.name,
+        quiz_data.description,
+        quiz_data.image,
+        quiz_data.category,
+        quiz_data.difficulty,
+        current_time
+    ))
+
+    new_quiz_id = cursor.lastrowid
+
+    inserted_questions = []
+    for index, question in enumerate(payload.questions):
+        cursor.execute('''
+            INSERT INTO questions (
+                quiz_id, question_text, choices, correct_answer_index,
+                explanation, category, difficulty, image
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            new_quiz_id,
+            question.question_text,
+            json.dumps(question.choices),
+            question.correct_answer_index,
+            question.explanation,
+            question.category,
+            question.difficulty,
+            question.image
+        ))
 
-    for i, question in enumerate(questions_data):
-        missing_fields = [field for field in required_question_fields if field not in question]
-        if missing_fields:
-            return jsonify({
-                'error': f'Question at index {i} is missing required fields: {", ".join(missing_fields)}'
-            }), 400
+        new_question_id = cursor.lastrowid
+        dedup.store(cursor, [(new_question_id, signatures[index])])
+        cursor.execute("SELECT * FROM questions WHERE id = ?", (new_question_id,))
+        question_dict = dict(cursor.fetchone())
+        question_dict['choices'] = json.loads(question_dict['choices'])
+        inserted_questions.append(question_dict)
 
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        conn.execute("BEGIN TRANSACTION")
+    cursor.execute("SELECT * FROM quiz WHERE id = ?", (new_quiz_id,))
+    quiz_result = dict(cursor.fetchone())
 
-        current_time = datetime.now().strftime('%Y-%m-%d')
+    quiz_snapshots.store_current(cursor, [new_quiz_id])
+    return quiz_result, inserted_questions
 
-        # Insert the quiz
-        cursor.execute('''
-            INSERT INTO quiz (name, description, image, category, difficulty, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            quiz_data['name'],
-            quiz_data['description'],
-            quiz_data['image'],
-            quiz_data['category'],
-            quiz_data['difficulty'],
-            current_time
-        ))
+@router.post("/quizzes/with-questions",
+    response_model=Dict,
+    status_code=201,
+    summary="Create a quiz with its questions",
+    description="Create a new quiz along with its questions in a single transaction"
+)
+async def create_quiz_with_questions(
+    payload: QuizWithQuestionsCreate,
+    duplicates: str = Query(default='flag', pattern='^(flag|reject|allow)$')
+):
+    signatures, near_duplicates = await ingest.screen(
+        [question.question_text for question in payload.questions], duplicates
+    )
+    if duplicates == 'reject' and near_duplicates:
+        raise HTTPException(
+            status_code=409,
+            detail={'message': 'Near-duplicate questions', 'duplicates': near_duplicates}
+        )
 
-        new_quiz_id = cursor.lastrowid
-
-        # Insert all questions
-        inserted_questions = []
-        for question in questions_data:
-            choices_json = json.dumps(question['choices'])
-
-            cursor.execute('''
-                INSERT INTO questions (
-                    quiz_id, question_text, choices, correct_answer_index,
-                    explanation, category, difficulty, image
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                new_quiz_id,
-                question['question_text'],
-                choices_json,
-                question['correct_answer_index'],
-                question['explanation'],
-                question['category'],
-                question['difficulty'],
-                question['image']
-            ))
-
-            new_question_id = cursor.lastrowid
-            cursor.execute("SELECT * FROM questions WHERE id = ?", (new_question_id,))
-            new_question = cursor.fetchone()
-
-            question_dict = {}
-            for key in new_question.keys():
-                question_dict[key] = new_question[key]
-            question_dict['choices'] = json.loads(question_dict['choices'])
-            inserted_questions.append(question_dict)
-
-        # Get the created quiz
-        cursor.execute("SELECT * FROM quiz WHERE id = ?", (new_quiz_id,))
-        new_quiz = cursor.fetchone()
-        quiz_result = {}
-        for key in new_quiz.keys():
-            quiz_result[key] = new_quiz[key]
+    try:
+        quiz_result, inserted_questions = await write_retry.run_async(
+            _insert_quiz_with_questions, payload, signatures
+        )
+        catalog_versions.invalidate()
 
-        conn.commit()
+        for question, signature in zip(inserted_questions, signatures):
+            question_index.add(question['id'], question['category'], question['difficulty'])
+            dedup_index.add(question['id'], signature)
 
-        return jsonify({
+        response = {
             'success': True,
             'quiz': quiz_result,
             'questions': inserted_questions,
             'total_questions': len(inserted_questions)
-        }), 201
+        }
+
+        if near_duplicates:
+            response['duplicates'] = near_duplicates
+
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
-        if conn:
-            conn.rollback()
-        error_details = traceback.format_exc()
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'details': error_details
-        }), 500
-    finally:
-        if conn:
-            conn.close()
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/quizzes/category-samples",
     response_model=Dict,
     summary="Get sample quizzes by category",
-    description="Retrieve random quizzes from each category"
+    description="Retrieve random quizzes from each category. The sample is drawn afresh "
+                "for each catalog version, so it is stable between catalog changes."
 )
 async def get_category_samples(
-    limit: int = Query(default=3, description="Number of quizzes per category"),
-    db: Database = Depends(get_db)
+    request: Request,
+    response: Response,
+    limit: int = Query(default=3, description="Number of quizzes per category")
 ):
+    summary = home_cache.get()
+    not_modified = conditional(request, response, make_etag('c', summary.version), summary.updated_at)
+    if not_modified:
+        return not_modified
+
+    return {
+        'success': True,
+        'samples': summary.samples(limit),
+        'total_categories': len(summary.categories),
+        'quizzes_per_category': limit
+    }
+
+@router.get("/quizzes/{quiz_id}/stats",
+    response_model=Dict,
+    summary="Get answer statistics for a quiz",
+    description="Per-question pick distribution and correct rate for every question of a quiz"
+)
+async def get_quiz_stats(quiz_id: int):
+    conn = None
     try:
-        # Get all unique categories
-        categories_query = "SELECT DISTINCT category FROM quiz ORDER BY category"
-        categories = await db.fetch_all(query=categories_query)
-
-        result = {}
-        for category_row in categories:
-            category = category_row['category']
-            # Get random quizzes for this category
-            quizzes_query = """
-                SELECT * FROM quiz
-                WHERE category = :category
-                ORDER BY RANDOM()
-                LIMIT :limit
-            """
-            quizzes = await db.fetch_all(
-                query=quizzes_query,
-                values={"category": category, "limit": limit}
-            )
+        conn = get_db_connection()
+        cursor = conn.cursor()
 
-            result[category] = [dict(quiz) for quiz in quizzes]
+        cursor.execute("SELECT id FROM quiz WHERE id = ?", (quiz_id,))
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail=f"Quiz with ID {quiz_id} not found")
+
+        questions = answer_stats.get_quiz_stats(cursor, quiz_id)
+        attempts = sum(q['attempts'] for q in questions)
+        correct = sum(q['correct'] for q in questions)
 
         return {
-            'success': True,
-            'samples': result,
-            'total_categories': len(categories),
-            'quizzes_per_category': limit
+            'quiz_id': quiz_id,
+            'questions': questions,
+            'total_questions': len(questions),
+            'total_answers': attempts,
+            'correct_rate': round(correct / attempts, 4) if attempts else None
         }
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error fetching category samples: {str(e)}"
-        )
\ No newline at end of file
+    finally:
+        if conn:
+            conn.close()
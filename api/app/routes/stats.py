@@ -0,0 +1,50 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, Optional
+from app.database import get_db_connection
+from app.services import rollups
+from datetime import date
+
+router = APIRouter(
+    prefix="/api/stats",
+    tags=["stats"],
+)
+
+@router.get("/daily",
+    response_model=Dict,
+    summary="Daily completions",
+    description="Completions and average score per day, grouped by quiz or category. "
+                "Served from pre-aggregated rollup tables."
+)
+async def get_daily_stats(
+    group_by: str = Query(default='category', pattern='^(category|quiz)$'),
+    start: Optional[date] = Query(default=None, description="First day (inclusive)"),
+    end: Optional[date] = Query(default=None, description="Last day (inclusive)"),
+    category: Optional[str] = Query(default=None, description="Only this category"),
+    quiz_id: Optional[int] = Query(default=None, description="Only this quiz"),
+):
+    if category is not None and group_by != 'category':
+        raise HTTPException(status_code=400, detail="category filter requires group_by=category")
+    if quiz_id is not None and group_by != 'quiz':
+        raise HTTPException(status_code=400, detail="quiz_id filter requires group_by=quiz")
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        series = rollups.query_daily(
+            conn.cursor(),
+            group_by,
+            start.isoformat() if start else None,
+            end.isoformat() if end else None,
+            category if group_by == 'category' else quiz_id
+        )
+
+        return {
+            'group_by': group_by,
+            'start': start,
+            'end': end,
+            'series': series,
+            'total_completions': sum(row['completions'] for row in series)
+        }
+    finally:
+        if conn:
+            conn.close()
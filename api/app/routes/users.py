@@ -1,79 +1,165 @@
-from fastapi import APIRouter, HTTPException
-from typing import Dict, List
-from app.database import get_db_connection
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query
+from typing import Dict, List, Optional
+from app.core.retry import write_retry
+from app.core.security import get_current_user_id, issue_user_token
+from app.services import answer_stats, profile, recommendations, rollups, shards, user_directory
+from app.services.quiz_snapshots import snapshot_cache
 from app.models.schemas import (
     UserCreate, User, QuizResult, QuizResultResponse,
-    UserStatsResponse
+    UserStatsResponse, UserProfileResponse
 )
 import json
 from datetime import datetime
 
 router = APIRouter()
 
+PROFILE_PAGE_SIZE = 20
+MAX_PROFILE_PAGE_SIZE = 100
+
+async def _quiz_version(result: QuizResult) -> int:
+    """The version the result was answered against: the client's, checked, or the current one"""
+    if result.quiz_version_id is not None:
+        snapshot = snapshot_cache.get(result.quiz_version_id)
+        if snapshot is None or snapshot[0] != result.quiz_id:
+            raise HTTPException(
+                status_code=422,
+                detail=f"{result.quiz_version_id} is not a version of quiz {result.quiz_id}"
+            )
+        return result.quiz_version_id
+
+    current = await snapshot_cache.current(result.quiz_id)
+    if current is None:
+        raise HTTPException(status_code=404, detail=f"Quiz with ID {result.quiz_id} not found")
+    return current[0]
+
+def _save_result(conn, user_id: int, result: QuizResult, quiz_version_id: Optional[int]) -> int:
+    """One write transaction; run through write_retry, which commits it"""
+    cursor = conn.cursor()
+    answers_json = json.dumps(result.answers)
+    completed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    cursor.execute('''
+        INSERT INTO quiz_results (
+            id, user_id, quiz_id, score, answers, completed_at, quiz_version_id
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        shards.next_result_id(cursor, user_id),
+        user_id,
+        result.quiz_id,
+        result.score,
+        answers_json,
+        completed_at,
+        quiz_version_id
+    ))
+    result_id = cursor.lastrowid
+
+    answer_stats.record_result(cursor, result.quiz_id, answers_json)
+    rollups.record_result(cursor, result.quiz_id, result.score, completed_at)
+
+    return result_id
+
+def _fetch_results(cursor, user_id: int) -> List[Dict]:
+    cursor.execute('''
+        SELECT
+            qr.id as result_id,
+            qr.score,
+            qr.answers,
+            qr.completed_at,
+            qr.quiz_version_id,
+            q.id as quiz_id,
+            q.name as quiz_name,
+            q.category,
+            q.difficulty
+        FROM all_quiz_results qr
+        JOIN quiz q ON qr.quiz_id = q.id
+        WHERE qr.user_id = ?
+        ORDER BY qr.completed_at DESC
+    ''', (user_id,))
+
+    results = cursor.fetchall()
+    formatted_results = []
+
+    for result in results:
+        result_dict = dict(result)
+        if 'answers' in result_dict:
+            result_dict['answers'] = json.loads(result_dict['answers'])
+        formatted_results.append(result_dict)
+
+    return formatted_results
+
+def _fetch_stats(cursor, user_id: int) -> Dict:
+    cursor.execute('''
+        SELECT
+            COUNT(*) as total_quizzes,
+            AVG(score) as average_score,
+            MAX(score) as highest_score,
+            MIN(score) as lowest_score,
+            COUNT(DISTINCT quiz_id) as unique_quizzes
+        FROM all_quiz_results
+        WHERE user_id = ?
+    ''', (user_id,))
+
+    stats = dict(cursor.fetchone())
+
+    cursor.execute('''
+        SELECT
+            q.category,
+            COUNT(*) as quizzes_taken,
+            AVG(qr.score) as average_score
+        FROM all_quiz_results qr
+        JOIN quiz q ON qr.quiz_id = q.id
+        WHERE qr.user_id = ?
+        GROUP BY q.category
+    ''', (user_id,))
+
+    category_stats = [dict(cat) for cat in cursor.fetchall()]
+
+    return {
+        'overall_stats': stats,
+        'category_stats': category_stats
+    }
+
 @router.post("/users", response_model=Dict)
 async def create_user(user: UserCreate):
-    """Create a new user or update existing user by email"""
+    """Create a new user or return the existing user for an email"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT id FROM users WHERE email = ?", (user.email,))
-        existing_user = cursor.fetchone()
+        user_id, created = await write_retry.run_async(
+            user_directory.create_user, user.email, connect=shards.email_connector(user.email)
+        )
 
-        if existing_user:
+        if not created:
             return {
                 'success': False,
                 'message': 'User already exists',
-                'user_id': existing_user['id']
+                'user_id': user_id,
+                'token': issue_user_token(user_id)
             }
 
-        cursor.execute('''
-            INSERT INTO users (email, created_at)
-            VALUES (?, ?)
-        ''', (user.email, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-
-        conn.commit()
-        new_user_id = cursor.lastrowid
-
         return {
             'success': True,
             'message': 'User created successfully',
-            'user_id': new_user_id
+            'user_id': user_id,
+            'token': issue_user_token(user_id)
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn:
-            conn.close()
 
 @router.post("/users/{email}/results", response_model=Dict)
-async def save_quiz_result(email: str, result: QuizResult):
+async def save_quiz_result(email: str, result: QuizResult, background_tasks: BackgroundTasks):
     """Save a quiz result for a user"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
-        user = cursor.fetchone()
-
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+    user_id = user_directory.find_user_id(email)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
-        cursor.execute('''
-            INSERT INTO quiz_results (
-                user_id, quiz_id, score, answers, completed_at
-            ) VALUES (?, ?, ?, ?, ?)
-        ''', (
-            user['id'],
-            result.quiz_id,
-            result.score,
-            json.dumps(result.answers),
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        ))
-
-        conn.commit()
-        result_id = cursor.lastrowid
+    try:
+        quiz_version_id = await _quiz_version(result)
+        result_id = await write_retry.run_async(
+            _save_result, user_id, result, quiz_version_id, connect=shards.user_connector(user_id)
+        )
+        background_tasks.add_task(recommendations.refresh_in_background, user_id)
 
         return {
             'success': True,
@@ -81,49 +167,25 @@ async def save_quiz_result(email: str, result: QuizResult):
             'result_id': result_id
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn:
-            conn.close()
 
 @router.get("/users/{email}/results")
 async def get_user_results(email: str):
     """Get all quiz results for a user"""
+    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        user_id = user_directory.find_user_id(email)
 
-        cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
-        user = cursor.fetchone()
-
-        if not user:
+        if user_id is None:
             raise HTTPException(status_code=404, detail="User not found")
 
-        cursor.execute('''
-            SELECT
-                qr.id as result_id,
-                qr.score,
-                qr.answers,
-                qr.completed_at,
-                q.id as quiz_id,
-                q.name as quiz_name,
-                q.category,
-                q.difficulty
-            FROM quiz_results qr
-            JOIN quiz q ON qr.quiz_id = q.id
-            WHERE qr.user_id = ?
-            ORDER BY qr.completed_at DESC
-        ''', (user['id'],))
-
-        results = cursor.fetchall()
-        formatted_results = []
-
-        for result in results:
-            result_dict = dict(result)
-            if 'answers' in result_dict:
-                result_dict['answers'] = json.loads(result_dict['answers'])
-            formatted_results.append(result_dict)
+        conn = shards.user_connection(user_id)
+        cursor = conn.cursor()
+
+        formatted_results = _fetch_results(cursor, user_id)
 
         return {
             'email': email,
@@ -137,53 +199,176 @@ async def get_user_results(email: str):
         if conn:
             conn.close()
 
-@router.get("/users/{email}/stats", response_model=UserStatsResponse)
+@router.get("/users/{email}/stats", response_model=UserStatsResponse, response_model_exclude_unset=True)
 async def get_user_stats(email: str):
     """Get user statistics across all quizzes"""
+    conn = None
     try:
-        conn = get_db_connection()
+        user_id = user_directory.find_user_id(email)
+
+        if user_id is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        conn = shards.user_connection(user_id)
         cursor = conn.cursor()
 
-        cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
-        user = cursor.fetchone()
+        return {
+            'email': email,
+            **_fetch_stats(cursor, user_id)
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
 
-        if not user:
+@router.get("/users/{email}/profile", response_model=UserProfileResponse, response_model_exclude_unset=True)
+async def get_user_profile(
+    email: str,
+    limit: int = Query(default=PROFILE_PAGE_SIZE, ge=1, le=MAX_PROFILE_PAGE_SIZE),
+    offset: int = Query(default=0, ge=0)
+):
+    """Get user statistics and a page of result history from a single scan"""
+    conn = None
+    try:
+        user_id = user_directory.find_user_id(email)
+
+        if user_id is None:
             raise HTTPException(status_code=404, detail="User not found")
 
-        cursor.execute('''
-            SELECT
-                COUNT(*) as total_quizzes,
-                AVG(score) as average_score,
-                MAX(score) as highest_score,
-                MIN(score) as lowest_score,
-                COUNT(DISTINCT quiz_id) as unique_quizzes
-            FROM quiz_results
-            WHERE user_id = ?
-        ''', (user['id'],))
-
-        stats = dict(cursor.fetchone())
-
-        cursor.execute('''
-            SELECT
-                q.category,
-                COUNT(*) as quizzes_taken,
-                AVG(qr.score) as average_score
-            FROM quiz_results qr
-            JOIN quiz q ON qr.quiz_id = q.id
-            WHERE qr.user_id = ?
-            GROUP BY q.category
-        ''', (user['id'],))
-
-        category_stats = [dict(cat) for cat in cursor.fetchall()]
+        conn = shards.user_connection(user_id)
+        cursor = conn.cursor()
 
         return {
             'email': email,
-            'overall_stats': stats,
-            'category_stats': category_stats
+            **profile.build_profile(cursor, user_id, limit, offset)
+        }
+
+    finally:
+        if conn:
+            conn.close()
+
+# Token-authenticated variants: the user id comes from the signed token in
+# the Authorization header, so no email appears in the URL and no user
+# lookup runs before the real query.
+
+@router.post("/me/results", response_model=Dict)
+async def save_my_quiz_result(
+    result: QuizResult,
+    background_tasks: BackgroundTasks,
+    user_id: int = Depends(get_current_user_id)
+):
+    """Save a quiz result for the token's user"""
+    try:
+        quiz_version_id = await _quiz_version(result)
+        result_id = await write_retry.run_async(
+            _save_result, user_id, result, quiz_version_id, connect=shards.user_connector(user_id)
+        )
+        background_tasks.add_task(recommendations.refresh_in_background, user_id)
+
+        return {
+            'success': True,
+            'message': 'Quiz result saved successfully',
+            'result_id': result_id
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/me/results")
+async def get_my_results(user_id: int = Depends(get_current_user_id)):
+    """Get all quiz results for the token's user"""
+    conn = None
+    try:
+        conn = shards.user_connection(user_id)
+        formatted_results = _fetch_results(conn.cursor(), user_id)
+
+        return {
+            'user_id': user_id,
+            'results': formatted_results,
+            'total_results': len(formatted_results)
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
+
+@router.get("/me/stats", response_model=UserStatsResponse, response_model_exclude_unset=True)
+async def get_my_stats(user_id: int = Depends(get_current_user_id)):
+    """Get statistics across all quizzes for the token's user"""
+    conn = None
+    try:
+        conn = shards.user_connection(user_id)
+
+        return {
+            'user_id': user_id,
+            **_fetch_stats(conn.cursor(), user_id)
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
+
+@router.get("/me/profile", response_model=UserProfileResponse, response_model_exclude_unset=True)
+async def get_my_profile(
+    limit: int = Query(default=PROFILE_PAGE_SIZE, ge=1, le=MAX_PROFILE_PAGE_SIZE),
+    offset: int = Query(default=0, ge=0),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Get statistics and a page of result history for the token's user"""
+    conn = None
+    try:
+        conn = shards.user_connection(user_id)
+
+        return {
+            'user_id': user_id,
+            **profile.build_profile(conn.cursor(), user_id, limit, offset)
+        }
+
+    finally:
+        if conn:
+            conn.close()
+
+@router.get("/users/{email}/recommendations", response_model=Dict)
+async def get_user_recommendations(
+    email: str,
+    limit: int = Query(default=recommendations.MAX_RECOMMENDATIONS, ge=1, le=recommendations.MAX_RECOMMENDATIONS)
+):
+    """Get suggested next quizzes for a user"""
+    conn = None
+    try:
+        user_id = user_directory.find_user_id(email)
+
+        if user_id is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        conn = shards.user_connection(user_id)
+
+        return {
+            'email': email,
+            **recommendations.get_recommendations(conn, user_id, limit)
+        }
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+@router.get("/me/recommendations", response_model=Dict)
+async def get_my_recommendations(
+    limit: int = Query(default=recommendations.MAX_RECOMMENDATIONS, ge=1, le=recommendations.MAX_RECOMMENDATIONS),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Get suggested next quizzes for the token's user"""
+    conn = None
+    try:
+        conn = shards.user_connection(user_id)
+        return recommendations.get_recommendations(conn, user_id, limit)
+    finally:
+        if conn:
+            conn.close()
@@ -0,0 +1,313 @@
+"""Per-question answer distribution built from quiz_results.answers.
+
+Pick counts are kept in ``question_choice_stats`` so the stats endpoints
+never have to decode the ``answers`` blobs. The table is updated in the
+same transaction as each new result and can be rebuilt from scratch with
+the backfill job::
+
+    python -m app.services.answer_stats --workers 4
+
+Decoding the blobs is CPU-bound, so the rebuild hands its chunks to
+``app.core.compute.compute_pool``.
+
+With sharded user data (see ``app.services.shards``) every shard keeps the
+counts for its own results and the read functions add them to trivia.db's.
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.compute import compute_pool
+from app.database import get_db_connection
+from app.services import shards
+from app.services.archive import attach_partitions
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def ensure_schema(conn):
+    """Create the pick-count table used by the stats endpoints"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_choice_stats (
+            question_id INTEGER NOT NULL,
+            choice_index INTEGER NOT NULL,
+            picks INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (question_id, choice_index)
+        ) WITHOUT ROWID
+    ''')
+
+
+def decode_answers(answers_json: str, question_ids: Sequence[int]) -> List[Tuple[int, int]]:
+    """
+    Turn a stored answers blob into (question_id, choice_index) pairs.
+
+    Two formats exist in quiz_results: the client sends an object keyed by
+    question id, while older rows hold a plain list of selected indices in
+    question order. Entries for questions outside ``question_ids`` or
+    without a selected answer are dropped.
+    """
+    try:
+        answers = json.loads(answers_json)
+    except (TypeError, ValueError):
+        return []
+
+    known = set(question_ids)
+    pairs = []
+
+    if isinstance(answers, dict):
+        items = answers.items()
+    elif isinstance(answers, list):
+        items = zip(question_ids, answers)
+    else:
+        return []
+
+    for question_id, choice in items:
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            continue
+        if isinstance(choice, bool) or not isinstance(choice, int) or choice < 0:
+            continue
+        if question_id in known:
+            pairs.append((question_id, choice))
+
+    return pairs
+
+
+def get_quiz_question_ids(cursor, quiz_id: int) -> List[int]:
+    """Question ids of a quiz in the order the quiz endpoint returns them"""
+    cursor.execute("SELECT id FROM questions WHERE quiz_id = ? ORDER BY id", (quiz_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _load_question_map(cursor) -> Dict[int, List[int]]:
+    cursor.execute("SELECT quiz_id, id FROM questions ORDER BY quiz_id, id")
+    question_map: Dict[int, List[int]] = {}
+    for quiz_id, question_id in cursor.fetchall():
+        question_map.setdefault(quiz_id, []).append(question_id)
+    return question_map
+
+
+def _write_counts(cursor, counts: Counter):
+    cursor.executemany('''
+        INSERT INTO question_choice_stats (question_id, choice_index, picks)
+        VALUES (?, ?, ?)
+        ON CONFLICT(question_id, choice_index)
+        DO UPDATE SET picks = picks + excluded.picks
+    ''', [(question_id, choice, picks) for (question_id, choice), picks in counts.items()])
+
+
+def record_result(cursor, quiz_id: int, answers_json: str):
+    """
+    Add one result's picks to the aggregate.
+
+    Must be called on the cursor that inserted the result, before commit,
+    so the counts and the result row land in the same transaction.
+    """
+    pairs = decode_answers(answers_json, get_quiz_question_ids(cursor, quiz_id))
+    if pairs:
+        _write_counts(cursor, Counter(pairs))
+
+
+def aggregate_chunk(rows: Iterable[Tuple[int, str]], question_map: Dict[int, List[int]]) -> Counter:
+    """Count picks for a chunk of (quiz_id, answers) rows"""
+    counts: Counter = Counter()
+    for quiz_id, answers_json in rows:
+        counts.update(decode_answers(answers_json, question_map.get(quiz_id, ())))
+    return counts
+
+
+def _iter_chunks(cursor, upper_id: int, chunk_size: int):
+    last_id = 0
+    while last_id < upper_id:
+        cursor.execute('''
+            SELECT id, quiz_id, answers FROM all_quiz_results
+            WHERE id > ? AND id <= ?
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, upper_id, chunk_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        yield [(row[1], row[2]) for row in rows]
+
+
+def rebuild(conn, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """
+    Rebuild the connection's question_choice_stats from the results in its
+    all_quiz_results view.
+
+    Results are read in id-ordered chunks up to the highest id seen at the
+    start and decoded on the compute pool (inline when it is not started).
+    The table is swapped in a single write transaction, which also replays
+    any results saved while the scan was running.
+    """
+    started = time.perf_counter()
+
+    try:
+        cursor = conn.cursor()
+        ensure_schema(conn)
+        question_map = _load_question_map(cursor)
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM all_quiz_results")
+        upper_id = cursor.fetchone()[0]
+
+        counts = compute_pool.map_sync(
+            aggregate_chunk, _iter_chunks(cursor, upper_id, chunk_size), question_map
+        )
+        totals: Counter = Counter()
+        for chunk_counts in counts:
+            totals.update(chunk_counts)
+
+        conn.execute("BEGIN IMMEDIATE")
+        cursor.execute("DELETE FROM question_choice_stats")
+        _write_counts(cursor, totals)
+        cursor.execute(
+            "SELECT quiz_id, answers FROM quiz_results WHERE id > ?", (upper_id,)
+        )
+        late_rows = cursor.fetchall()
+        _write_counts(cursor, aggregate_chunk(late_rows, question_map))
+        conn.commit()
+
+        return {
+            'upper_result_id': upper_id,
+            'chunks': len(counts),
+            'late_results': len(late_rows),
+            'rows_written': len(totals),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def backfill(conn=None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """
+    Rebuild question_choice_stats from every stored result, archived ones
+    included: in trivia.db (or ``conn``), then in each user data shard.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        attach_partitions(conn)
+        summary = rebuild(conn, chunk_size)
+    finally:
+        if own_conn:
+            conn.close()
+
+    if own_conn and shards.enabled():
+        summary['shards'] = [rebuild(shard, chunk_size) for shard in shards.each_shard()]
+    return summary
+
+
+def _add_shard_picks(picks: Dict[int, Dict[int, int]], query: str, params: tuple):
+    for shard in shards.each_shard():
+        for question_id, choice, count in shard.execute(query, params).fetchall():
+            by_choice = picks.setdefault(question_id, {})
+            by_choice[choice] = by_choice.get(choice, 0) + count
+
+
+def _choice_stats(choices: List[str], correct_index: int, picks: Dict[int, int]) -> Dict:
+    attempts = sum(picks.values())
+    correct = picks.get(correct_index, 0)
+    choice_list = []
+    for index, text in enumerate(choices):
+        count = picks.get(index, 0)
+        choice_list.append({
+            'index': index,
+            'text': text,
+            'picks': count,
+            'pick_rate': round(count / attempts, 4) if attempts else 0.0,
+            'is_correct': index == correct_index
+        })
+
+    distractors = [c for c in choice_list if not c['is_correct'] and c['picks']]
+    top_distractor = max(distractors, key=lambda c: c['picks'])['index'] if distractors else None
+
+    return {
+        'attempts': attempts,
+        'correct': correct,
+        'correct_rate': round(correct / attempts, 4) if attempts else None,
+        'top_distractor_index': top_distractor,
+        'choices': choice_list
+    }
+
+
+def get_question_stats(cursor, question_id: int) -> Optional[Dict]:
+    """Pick distribution for one question, or None if it does not exist"""
+    cursor.execute('''
+        SELECT id, quiz_id, question_text, choices, correct_answer_index
+        FROM questions WHERE id = ?
+    ''', (question_id,))
+    question = cursor.fetchone()
+    if not question:
+        return None
+
+    query = "SELECT question_id, choice_index, picks FROM question_choice_stats WHERE question_id = ?"
+    cursor.execute(query, (question_id,))
+    by_question = {question_id: {row[1]: row[2] for row in cursor.fetchall()}}
+    if shards.enabled():
+        _add_shard_picks(by_question, query, (question_id,))
+    picks = by_question[question_id]
+
+    return {
+        'question_id': question['id'],
+        'quiz_id': question['quiz_id'],
+        'question_text': question['question_text'],
+        **_choice_stats(
+            json.loads(question['choices']), question['correct_answer_index'], picks
+        )
+    }
+
+
+def get_quiz_stats(cursor, quiz_id: int) -> List[Dict]:
+    """Pick distribution for every question of a quiz"""
+    cursor.execute('''
+        SELECT id, question_text, choices, correct_answer_index
+        FROM questions WHERE quiz_id = ? ORDER BY id
+    ''', (quiz_id,))
+    questions = cursor.fetchall()
+
+    query = '''
+        SELECT s.question_id, s.choice_index, s.picks
+        FROM question_choice_stats s
+        JOIN questions q ON q.id = s.question_id
+        WHERE q.quiz_id = ?
+    '''
+    cursor.execute(query, (quiz_id,))
+    picks: Dict[int, Dict[int, int]] = {}
+    for question_id, choice, count in cursor.fetchall():
+        picks.setdefault(question_id, {})[choice] = count
+    if shards.enabled():
+        _add_shard_picks(picks, query, (quiz_id,))
+
+    return [
+        {
+            'question_id': question['id'],
+            'question_text': question['question_text'],
+            **_choice_stats(
+                json.loads(question['choices']),
+                question['correct_answer_index'],
+                picks.get(question['id'], {})
+            )
+        }
+        for question in questions
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild per-question answer statistics")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=0,
+                        help="decode chunks in a process pool of this size")
+    args = parser.parse_args()
+
+    compute_pool.start(workers=args.workers)
+    try:
+        print("Rebuilding answer statistics...")
+        print(backfill(chunk_size=args.chunk_size))
+    finally:
+        compute_pool.shutdown()
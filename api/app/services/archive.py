@@ -0,0 +1,333 @@
+"""Monthly archive partitions for quiz_results.
+
+Results older than ARCHIVE_AFTER_MONTHS are moved out of the hot
+``quiz_results`` table into one SQLite file per month under ARCHIVE_DIR
+(``quiz_results_2024_03.db``), listed in the ``result_partitions`` table.
+Code that needs the full history opens its connection through
+``get_results_connection`` (or calls ``attach_partitions``) and reads the
+``all_quiz_results`` view, a UNION ALL of the hot table and every attached
+partition. New results are always written to ``main.quiz_results``.
+
+A connection can only attach a limited number of databases
+(SQLITE_LIMIT_ATTACHED, 10 by default), so once a year is complete its
+months can be merged into one yearly file::
+
+    python -m app.services.archive              # move old months
+    python -m app.services.archive --compact 2024
+    python -m app.services.archive --list
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from app.core.config import get_settings
+from app.database import get_db_connection
+
+RESULT_COLUMNS = ('id', 'user_id', 'quiz_id', 'score', 'answers', 'completed_at', 'quiz_version_id')
+VIEW_NAME = 'all_quiz_results'
+# Attach slots kept free for other databases on the same connection
+RESERVED_ATTACHMENTS = 2
+
+PARTITION_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {schema}.quiz_results (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        quiz_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        answers TEXT NOT NULL,
+        completed_at TEXT NOT NULL,
+        quiz_version_id INTEGER
+    )
+'''
+PARTITION_INDEX = '''
+    CREATE INDEX IF NOT EXISTS {schema}.idx_quiz_results_user
+    ON quiz_results (user_id, completed_at)
+'''
+
+
+def add_version_column(conn, schema: str = 'main'):
+    """Add quiz_version_id to a quiz_results table written before it existed"""
+    columns = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info(quiz_results)")}
+    if columns and 'quiz_version_id' not in columns:
+        conn.execute(f"ALTER TABLE {schema}.quiz_results ADD COLUMN quiz_version_id INTEGER")
+
+
+def ensure_schema(conn):
+    add_version_column(conn)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS result_partitions (
+            label TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            start_day TEXT NOT NULL,
+            end_day TEXT NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+
+
+def _alias(label: str) -> str:
+    return 'part_' + label.replace('-', '_')
+
+
+def _path(filename: str) -> str:
+    return os.path.join(get_settings().ARCHIVE_DIR, filename)
+
+
+def max_partitions(conn) -> int:
+    return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - RESERVED_ATTACHMENTS
+
+
+def list_partitions(cursor) -> List[Dict]:
+    cursor.execute("SELECT * FROM result_partitions ORDER BY start_day")
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def attach_partitions(conn) -> int:
+    """
+    Attach every partition and (re)create the temporary all_quiz_results
+    view over them. Returns the number of partitions attached.
+    """
+    partitions = list_partitions(conn.cursor())
+    if len(partitions) > max_partitions(conn):
+        raise RuntimeError(
+            f"{len(partitions)} result partitions exceed the attach limit; "
+            "compact complete years with python -m app.services.archive --compact YEAR"
+        )
+
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    columns = ', '.join(RESULT_COLUMNS)
+    selects = [f"SELECT {columns} FROM main.quiz_results"]
+    for partition in partitions:
+        alias = _alias(partition['label'])
+        if alias not in attached:
+            conn.execute("ATTACH DATABASE ? AS " + alias, (_path(partition['filename']),))
+            add_version_column(conn, alias)
+        selects.append(f"SELECT {columns} FROM {alias}.quiz_results")
+
+    conn.execute(f"DROP VIEW IF EXISTS temp.{VIEW_NAME}")
+    conn.execute(f"CREATE TEMP VIEW {VIEW_NAME} AS {' UNION ALL '.join(selects)}")
+    return len(partitions)
+
+
+def get_results_connection(check_same_thread=True):
+    """A get_db_connection() with the all_quiz_results view available"""
+    conn = get_db_connection(check_same_thread=check_same_thread)
+    try:
+        attach_partitions(conn)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def _month_bounds(month: str):
+    year, number = map(int, month.split('-'))
+    start = date(year, number, 1)
+    end = date(year + number // 12, number % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+def archive_cutoff(months: int, today: Optional[date] = None) -> str:
+    """First day of the month ``months`` months before today's month"""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1).isoformat()
+
+
+def _move_range(conn, label: str, filename: str, alias: str, start_day: str, end_day: str) -> int:
+    """
+    Copy a completed_at range from main into an attached partition, then
+    delete from main only the rows that are now in the partition.
+
+    The delete and the result_partitions entry commit together in main, so
+    readers see each row exactly once. The copy ignores ids already
+    present, so if a crash leaves the two files out of step (commits across
+    attached WAL databases are atomic per file only), running the mover
+    again finishes the job.
+    """
+    columns = ', '.join(RESULT_COLUMNS)
+    cursor = conn.cursor()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {alias}.quiz_results ({columns})
+            SELECT {columns} FROM main.quiz_results
+            WHERE completed_at >= ? AND completed_at < ?
+        ''', (start_day, end_day))
+        cursor.execute(f'''
+            DELETE FROM main.quiz_results
+            WHERE completed_at >= ? AND completed_at < ?
+            AND id IN (SELECT id FROM {alias}.quiz_results)
+        ''', (start_day, end_day))
+        moved = cursor.rowcount
+        _register(cursor, label, filename, start_day, end_day, alias)
+        conn.commit()
+        return moved
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _register(cursor, label: str, filename: str, start_day: str, end_day: str, alias: str):
+    cursor.execute(f"SELECT COUNT(*) FROM {alias}.quiz_results")
+    row_count = cursor.fetchone()[0]
+    cursor.execute('''
+        INSERT INTO result_partitions (label, filename, start_day, end_day, row_count, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(label) DO UPDATE SET
+            row_count = excluded.row_count,
+            updated_at = excluded.updated_at
+    ''', (label, filename, start_day, end_day, row_count,
+          datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+
+def _open_partition(conn, label: str, filename: str) -> str:
+    os.makedirs(get_settings().ARCHIVE_DIR, exist_ok=True)
+    alias = _alias(label)
+    conn.execute("ATTACH DATABASE ? AS " + alias, (_path(filename),))
+    conn.execute(PARTITION_SCHEMA.format(schema=alias))
+    add_version_column(conn, alias)
+    conn.execute(PARTITION_INDEX.format(schema=alias))
+    return alias
+
+
+def archive_old_results(conn=None, months: Optional[int] = None) -> Dict:
+    """Move every whole month older than ``months`` months into its partition"""
+    if get_settings().USER_SHARDS:
+        raise RuntimeError(
+            "Results are stored in user shards (USER_SHARDS is set) and archiving only moves "
+            "results stored in trivia.db"
+        )
+    if months is None:
+        months = get_settings().ARCHIVE_AFTER_MONTHS
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    started = time.perf_counter()
+
+    try:
+        ensure_schema(conn)
+        cutoff = archive_cutoff(months)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT DISTINCT substr(completed_at, 1, 7) FROM quiz_results
+            WHERE completed_at < ?
+            ORDER BY 1
+        ''', (cutoff,))
+        pending = [row[0] for row in cursor.fetchall()]
+
+        existing = {p['label'] for p in list_partitions(cursor)}
+        new_labels = [month for month in pending if month not in existing]
+        if len(existing) + len(new_labels) > max_partitions(conn):
+            raise RuntimeError(
+                f"Archiving would create {len(existing) + len(new_labels)} partitions, over the "
+                f"limit of {max_partitions(conn)}; compact complete years first"
+            )
+
+        moved = {}
+        for month in pending:
+            start_day, end_day = _month_bounds(month)
+            filename = f"quiz_results_{month.replace('-', '_')}.db"
+            alias = _open_partition(conn, month, filename)
+            try:
+                moved[month] = _move_range(conn, month, filename, alias, start_day, end_day)
+            finally:
+                conn.execute("DETACH DATABASE " + alias)
+
+        return {
+            'cutoff': cutoff,
+            'moved': moved,
+            'rows_moved': sum(moved.values()),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def compact_year(conn=None, year: int = None) -> Dict:
+    """Merge the monthly partitions of a year into one yearly partition"""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        ensure_schema(conn)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM result_partitions WHERE label LIKE ? ORDER BY start_day",
+            (f"{year}-%",)
+        )
+        months = [dict(row) for row in cursor.fetchall()]
+        if not months:
+            return {'year': year, 'months': 0, 'rows': 0}
+
+        label = str(year)
+        filename = f"quiz_results_{year}.db"
+        alias = _open_partition(conn, label, filename)
+        columns = ', '.join(RESULT_COLUMNS)
+        try:
+            for month in months:
+                source = _alias(month['label'])
+                conn.execute("ATTACH DATABASE ? AS " + source, (_path(month['filename']),))
+                try:
+                    add_version_column(conn, source)
+                    conn.execute(f'''
+                        INSERT OR IGNORE INTO {alias}.quiz_results ({columns})
+                        SELECT {columns} FROM {source}.quiz_results
+                    ''')
+                    conn.commit()
+                finally:
+                    conn.execute("DETACH DATABASE " + source)
+
+            # Register the yearly file and drop the months in one transaction,
+            # so readers never see a row twice or not at all
+            conn.execute("BEGIN IMMEDIATE")
+            _register(cursor, label, filename, f"{year}-01-01", f"{year + 1}-01-01", alias)
+            cursor.execute("DELETE FROM result_partitions WHERE label LIKE ?", (f"{year}-%",))
+            conn.commit()
+        finally:
+            conn.execute("DETACH DATABASE " + alias)
+
+        for month in months:
+            try:
+                os.remove(_path(month['filename']))
+            except FileNotFoundError:
+                pass
+
+        cursor.execute("SELECT row_count FROM result_partitions WHERE label = ?", (label,))
+        return {'year': year, 'months': len(months), 'rows': cursor.fetchone()[0]}
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old quiz results into monthly partitions")
+    parser.add_argument('--months', type=int, default=None,
+                        help="Keep this many months in the hot table (default: ARCHIVE_AFTER_MONTHS)")
+    parser.add_argument('--compact', type=int, metavar='YEAR',
+                        help="Merge a year's monthly partitions into one file")
+    parser.add_argument('--list', action='store_true', help="List partitions")
+    args = parser.parse_args()
+
+    if args.list:
+        conn = get_db_connection()
+        try:
+            ensure_schema(conn)
+            for partition in list_partitions(conn.cursor()):
+                print(f"{partition['label']:>8}  {partition['row_count']:>10} rows  "
+                      f"{partition['filename']}")
+        finally:
+            conn.close()
+    elif args.compact:
+        print(compact_year(year=args.compact))
+    else:
+        print(archive_old_results(months=args.months))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""Online backups of trivia.db through the SQLite backup API.
+
+The live database is copied BACKUP_PAGES_PER_STEP pages at a time with a
+BACKUP_STEP_SLEEP pause between steps, so writers get the lock between
+steps instead of waiting for the whole copy. If another connection writes
+to the database mid-copy, SQLite restarts the copy. Under steady writes
+that could go on indefinitely, so after BACKUP_MAX_RESTARTS restarts the
+copy is redone in a single step, which holds one read transaction for the
+whole copy; in WAL mode writers are not blocked by it. Restarts and the
+fallback are reported in the result.
+
+Each snapshot is named after the time to the microsecond, written under a
+temporary name created exclusively, checked with ``PRAGMA
+integrity_check``, given a ``.sha256`` sidecar (sha256sum format) and only
+then linked into place, which fails rather than overwrite a snapshot of the
+same name; the newest BACKUP_KEEP are kept.
+Archive partitions (``app.services.archive``) are not part of the snapshot.
+
+    python -m app.services.backup                  # take a backup
+    python -m app.services.backup --list
+    python -m app.services.backup --verify FILE
+    python -m app.services.backup --restore FILE   # stop the API first
+"""
+import argparse
+import glob
+import hashlib
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from app.core.config import get_settings
+from app.database import get_db_connection
+
+DB_PATH = 'trivia.db'
+PREFIX = 'trivia-'
+SUFFIX = '.db'
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _integrity(path: str) -> str:
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _rotate(directory: str, keep: int) -> List[str]:
+    snapshots = sorted(glob.glob(os.path.join(directory, f'{PREFIX}*{SUFFIX}')))
+    removed = []
+    for path in snapshots[:-keep] if keep > 0 else []:
+        for doomed in (path, path + '.sha256'):
+            try:
+                os.remove(doomed)
+            except FileNotFoundError:
+                pass
+        removed.append(os.path.basename(path))
+    return removed
+
+
+def create_backup() -> Dict:
+    """Copy the live database into a new verified snapshot and rotate old ones"""
+    settings = get_settings()
+    os.makedirs(settings.BACKUP_DIR, exist_ok=True)
+    name = f"{PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{SUFFIX}"
+    path = os.path.join(settings.BACKUP_DIR, name)
+    partial = path + '.partial'
+    # A backup started in the same microsecond fails here instead of sharing the file
+    os.close(os.open(partial, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+
+    progress = {'steps': 0, 'restarts': 0, 'remaining': None, 'total': 0}
+
+    def on_progress(status, remaining, total):
+        if progress['remaining'] is not None and remaining > progress['remaining']:
+            progress['restarts'] += 1
+            # Raising from the callback aborts the stepped copy
+            if progress['restarts'] > settings.BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts
+        progress['steps'] += 1
+        progress['remaining'] = remaining
+        progress['total'] = total
+
+    started = time.perf_counter()
+    source = get_db_connection()
+    target = sqlite3.connect(partial)
+    single_step = False
+    try:
+        try:
+            source.backup(
+                target,
+                pages=settings.BACKUP_PAGES_PER_STEP,
+                progress=on_progress,
+                sleep=settings.BACKUP_STEP_SLEEP
+            )
+        except _TooManyRestarts:
+            single_step = True
+            source.backup(target, pages=-1)
+            progress['total'] = target.execute("PRAGMA page_count").fetchone()[0]
+        # A snapshot of a WAL database would otherwise carry the WAL flag
+        target.execute("PRAGMA journal_mode=DELETE")
+    except Exception:
+        target.close()
+        os.remove(partial)
+        raise
+    finally:
+        source.close()
+    target.close()
+    copy_seconds = time.perf_counter() - started
+
+    integrity = _integrity(partial)
+    if integrity != 'ok':
+        os.remove(partial)
+        raise RuntimeError(f"Backup failed integrity check: {integrity}")
+
+    checksum = _checksum(partial)
+    try:
+        os.link(partial, path)
+    finally:
+        os.remove(partial)
+    with open(path + '.sha256', 'w') as f:
+        f.write(f"{checksum}  {name}\n")
+
+    removed = _rotate(settings.BACKUP_DIR, settings.BACKUP_KEEP)
+    pages = progress['total']
+    return {
+        'file': name,
+        'bytes': os.path.getsize(path),
+        'sha256': checksum,
+        'pages': pages,
+        'steps': progress['steps'],
+        'restarts': progress['restarts'],
+        'single_step': single_step,
+        'copy_ms': round(copy_seconds * 1000, 1),
+        'pages_per_second': round(pages / copy_seconds) if copy_seconds else None,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+        'rotated_out': removed
+    }
+
+
+def verify_backup(path: str) -> Dict:
+    """Check a snapshot against its sidecar checksum and run integrity_check"""
+    sidecar = path + '.sha256'
+    try:
+        with open(sidecar) as f:
+            expected = f.read().split()[0]
+    except (FileNotFoundError, IndexError):
+        return {'file': os.path.basename(path), 'ok': False, 'error': 'missing checksum'}
+
+    actual = _checksum(path)
+    if actual != expected:
+        return {'file': os.path.basename(path), 'ok': False, 'error': 'checksum mismatch'}
+
+    integrity = _integrity(path)
+    return {
+        'file': os.path.basename(path),
+        'ok': integrity == 'ok',
+        'sha256': actual,
+        'integrity': integrity
+    }
+
+
+def list_backups() -> List[Dict]:
+    directory = get_settings().BACKUP_DIR
+    backups = []
+    for path in sorted(glob.glob(os.path.join(directory, f'{PREFIX}*{SUFFIX}')), reverse=True):
+        stat = os.stat(path)
+        backups.append({
+            'file': os.path.basename(path),
+            'bytes': stat.st_size,
+            'created_at': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+            'has_checksum': os.path.exists(path + '.sha256')
+        })
+    return backups
+
+
+def resolve(name: str) -> str:
+    """Path of a snapshot given its file name or a path to it"""
+    if os.path.exists(name):
+        return name
+    path = os.path.join(get_settings().BACKUP_DIR, os.path.basename(name))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No backup named {name}")
+    return path
+
+
+def restore_backup(path: str, target_path: str = DB_PATH) -> Dict:
+    """
+    Verify a snapshot and copy it over the target database through the
+    backup API, which takes the target's locks rather than replacing the
+    file under open connections. Stop the API before restoring.
+    """
+    verification = verify_backup(path)
+    if not verification['ok']:
+        reason = verification.get('error') or verification['integrity']
+        raise RuntimeError(f"Refusing to restore {path}: {reason}")
+
+    started = time.perf_counter()
+    source = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+    return {
+        'restored': os.path.basename(path),
+        'target': target_path,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online backups of trivia.db")
+    parser.add_argument('--list', action='store_true', help="List snapshots")
+    parser.add_argument('--verify', metavar='FILE', help="Verify a snapshot")
+    parser.add_argument('--restore', metavar='FILE', help="Restore a snapshot over trivia.db")
+    args = parser.parse_args()
+
+    if args.list:
+        for backup in list_backups():
+            print(f"{backup['file']}  {backup['bytes']:>12} bytes  {backup['created_at']}")
+    elif args.verify:
+        print(verify_backup(resolve(args.verify)))
+    elif args.restore:
+        print(restore_backup(resolve(args.restore)))
+    else:
+        print(create_backup())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,402 @@
+"""Single-file catalog bundles for seeding and preloading.
+
+A bundle holds the quiz and questions tables column by column:
+
+    b'VQCB' | u16 format version | u32 header length | JSON header | blocks
+
+The header lists every table's row count and, per column, its kind and
+the position of its zlib-compressed blocks relative to the end of the
+header, so a reader can inflate just the columns it needs:
+
+- ``int``: one ``q`` array
+- ``str``: a ``Q`` array of n + 1 character offsets and the UTF-8 text
+- ``dict``: the distinct values in the header and an ``I`` array of codes
+- ``fixed``: fixed-width byte strings (MinHash signatures)
+
+Questions are stored sorted by (quiz_id, id), so ``question_range`` finds
+a quiz's questions by bisection. Rows keep their ids, so a loaded
+database matches the exported one.
+
+    python -m app.services.bundle export catalog.vqcb [--no-signatures]
+    python -m app.services.bundle load catalog.vqcb [--replace]
+    python -m app.services.bundle info catalog.vqcb
+
+With CATALOG_BUNDLE set, startup fills the question index from the bundle
+via mmap instead of scanning the questions table, as long as the database
+is still at the bundle's catalog version. Loading a bundle sets the version
+to the bundle's when that is ahead of the database, which is the case for
+a bundle exported from a live database and loaded into a fresh one.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from app.database import get_db_connection
+from app.services import catalog, dedup
+from app.services.question_index import question_index
+
+MAGIC = b'VQCB'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<4sHI')
+
+TABLES = {
+    'quiz': (
+        ('id', 'int'),
+        ('name', 'str'),
+        ('description', 'str'),
+        ('image', 'str'),
+        ('category', 'dict'),
+        ('difficulty', 'dict'),
+        ('created_at', 'str'),
+    ),
+    'questions': (
+        ('id', 'int'),
+        ('quiz_id', 'int'),
+        ('question_text', 'str'),
+        ('choices', 'str'),
+        ('correct_answer_index', 'int'),
+        ('explanation', 'str'),
+        ('category', 'dict'),
+        ('difficulty', 'dict'),
+        ('image', 'str'),
+    ),
+}
+ORDER_BY = {'quiz': 'id', 'questions': 'quiz_id, id'}
+SIGNATURE_WIDTH = dedup.NUM_PERM * 4
+COMPRESSION_LEVEL = 6
+
+
+# Encoding
+
+def _encode(kind: str, values) -> Tuple[Dict[str, bytes], Dict]:
+    if kind == 'int':
+        return {'data': array('q', values).tobytes()}, {}
+    if kind == 'str':
+        offsets = array('Q', [0])
+        offsets.extend(accumulate(map(len, values)))
+        return {'offsets': offsets.tobytes(), 'data': ''.join(values).encode('utf-8')}, {}
+    if kind == 'dict':
+        distinct = sorted(set(values))
+        codes = {value: code for code, value in enumerate(distinct)}
+        return {'codes': array('I', (codes[value] for value in values)).tobytes()}, {'values': distinct}
+    if kind == 'fixed':
+        return {'data': b''.join(values)}, {'width': SIGNATURE_WIDTH}
+    raise ValueError(f"Unknown column kind {kind}")
+
+
+def export_bundle(path: str, conn=None, signatures: bool = True) -> Dict:
+    """
+    Write the catalog to a bundle file (atomically, via a temporary name).
+    With ``signatures``, questions without a stored MinHash are hashed and
+    stored first, so a database loaded from the bundle starts with every
+    signature in place.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    started = time.perf_counter()
+
+    try:
+        if signatures:
+            dedup.hash_missing(conn)
+        cursor = conn.cursor()
+        # Plain tuples; sqlite3.Row costs more than the encoding itself here
+        cursor.row_factory = None
+        header = {
+            'format_version': FORMAT_VERSION,
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'catalog_version': catalog.get_version(cursor),
+            'byteorder': sys.byteorder,
+            'tables': {}
+        }
+        blocks: List[bytes] = []
+        position = 0
+
+        for table, columns in TABLES.items():
+            names = [name for name, _ in columns]
+            cursor.execute(f"SELECT {', '.join(names)} FROM {table} ORDER BY {ORDER_BY[table]}")
+            rows = cursor.fetchall()
+            column_kinds = list(columns)
+            column_values = [[row[i] for row in rows] for i in range(len(names))]
+
+            if table == 'questions' and signatures:
+                cursor.execute("SELECT question_id, signature FROM question_minhash")
+                stored = dict(cursor.fetchall())
+                ids = column_values[0]
+                missing = [question_id for question_id in ids if question_id not in stored]
+                if missing:
+                    raise ValueError(
+                        f"{len(missing)} questions were added during the export; run it again"
+                    )
+                column_kinds.append(('signature', 'fixed'))
+                column_values.append([stored[question_id] for question_id in ids])
+            del rows
+
+            table_meta = {'rows': len(column_values[0]), 'columns': []}
+            for (name, kind), values in zip(column_kinds, column_values):
+                parts, extra = _encode(kind, values)
+                entry = {'name': name, 'kind': kind, 'blocks': {}, **extra}
+                for part, raw in parts.items():
+                    compressed = zlib.compress(raw, COMPRESSION_LEVEL)
+                    entry['blocks'][part] = {
+                        'offset': position,
+                        'length': len(compressed),
+                        'raw_length': len(raw)
+                    }
+                    blocks.append(compressed)
+                    position += len(compressed)
+                table_meta['columns'].append(entry)
+            header['tables'][table] = table_meta
+    finally:
+        if own_conn:
+            conn.close()
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    partial = path + '.partial'
+    with open(partial, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for block in blocks:
+            f.write(block)
+    os.replace(partial, path)
+
+    return {
+        'file': path,
+        'bytes': os.path.getsize(path),
+        'quizzes': header['tables']['quiz']['rows'],
+        'questions': header['tables']['questions']['rows'],
+        'catalog_version': header['catalog_version'],
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+# Reading
+
+class BundleReader:
+    """Memory-mapped bundle; columns are inflated on demand"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, header_length = PREAMBLE.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a catalog bundle")
+            if version > FORMAT_VERSION:
+                raise ValueError(
+                    f"{path} uses bundle format {version}; this version reads up to {FORMAT_VERSION}"
+                )
+            start = PREAMBLE.size
+            self.header = json.loads(self._map[start:start + header_length])
+            self._data_start = start + header_length
+        except Exception:
+            self.close()
+            raise
+        self._swap = self.header['byteorder'] != sys.byteorder
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def rows(self, table: str) -> int:
+        return self.header['tables'][table]['rows']
+
+    def has_column(self, table: str, name: str) -> bool:
+        return any(column['name'] == name for column in self.header['tables'][table]['columns'])
+
+    def _column_meta(self, table: str, name: str) -> Dict:
+        for column in self.header['tables'][table]['columns']:
+            if column['name'] == name:
+                return column
+        raise KeyError(f"{table}.{name} is not in this bundle")
+
+    def _block(self, block: Dict) -> bytes:
+        start = self._data_start + block['offset']
+        raw = zlib.decompress(self._map[start:start + block['length']])
+        if len(raw) != block['raw_length']:
+            raise ValueError("Corrupt bundle block")
+        return raw
+
+    def _array(self, typecode: str, block: Dict) -> array:
+        values = array(typecode)
+        values.frombytes(self._block(block))
+        if self._swap:
+            values.byteswap()
+        return values
+
+    def column(self, table: str, name: str):
+        """A column as a sequence: array for ints, list otherwise"""
+        meta = self._column_meta(table, name)
+        kind = meta['kind']
+        if kind == 'int':
+            return self._array('q', meta['blocks']['data'])
+        if kind == 'str':
+            offsets = self._array('Q', meta['blocks']['offsets'])
+            text = self._block(meta['blocks']['data']).decode('utf-8')
+            return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+        if kind == 'dict':
+            values = meta['values']
+            return [values[code] for code in self._array('I', meta['blocks']['codes'])]
+        if kind == 'fixed':
+            data = self._block(meta['blocks']['data'])
+            width = meta['width']
+            return [data[i:i + width] for i in range(0, len(data), width)]
+        raise ValueError(f"Unknown column kind {kind}")
+
+    def question_range(self, quiz_id: int, quiz_ids=None) -> Tuple[int, int]:
+        """[start, end) row range of a quiz's questions"""
+        if quiz_ids is None:
+            quiz_ids = self.column('questions', 'quiz_id')
+        return bisect_left(quiz_ids, quiz_id), bisect_right(quiz_ids, quiz_id)
+
+
+# Loading
+
+def load_bundle(path: str, conn=None, replace: bool = False) -> Dict:
+    """
+    Insert a bundle's quizzes and questions in one transaction.
+
+    Refuses to load into a non-empty catalog unless ``replace`` is set,
+    in which case existing quizzes and questions are deleted first (results
+    and sessions that reference them are left alone). The catalog version
+    triggers are suspended during the load and the version is bumped once,
+    to at least the bundle's version so the bundle can be preloaded.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    started = time.perf_counter()
+
+    try:
+        with BundleReader(path) as reader:
+            cursor = conn.cursor()
+            cursor.execute("SELECT (SELECT COUNT(*) FROM quiz) + (SELECT COUNT(*) FROM questions)")
+            if cursor.fetchone()[0] and not replace:
+                raise ValueError("Catalog is not empty; pass replace=True (--replace) to overwrite it")
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                catalog.drop_triggers(conn)
+                if replace:
+                    cursor.execute("DELETE FROM questions")
+                    cursor.execute("DELETE FROM quiz")
+                    cursor.execute("DELETE FROM question_minhash")
+
+                counts = {}
+                for table, columns in TABLES.items():
+                    names = [name for name, _ in columns]
+                    values = [reader.column(table, name) for name in names]
+                    cursor.executemany(
+                        f"INSERT INTO {table} ({', '.join(names)}) "
+                        f"VALUES ({', '.join('?' * len(names))})",
+                        zip(*values)
+                    )
+                    counts[table] = reader.rows(table)
+                    if table == 'questions' and reader.has_column(table, 'signature'):
+                        cursor.executemany(
+                            "INSERT INTO question_minhash (question_id, signature) VALUES (?, ?)",
+                            zip(values[0], reader.column(table, 'signature'))
+                        )
+                    del values
+
+                catalog.ensure_schema(conn)
+                version = max(catalog.get_version(cursor) + 1, reader.header['catalog_version'])
+                catalog.set_version(cursor, version)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        if own_conn:
+            conn.close()
+
+    return {
+        'quizzes': counts['quiz'],
+        'questions': counts['questions'],
+        'catalog_version': version,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def preload_question_index(path: str) -> Dict:
+    """
+    Fill the question index from the bundle's id, category and difficulty
+    columns. Only the catalog version is read from the database; a bundle
+    from another version is not used.
+    """
+    started = time.perf_counter()
+    with BundleReader(path) as reader:
+        conn = get_db_connection()
+        try:
+            version = catalog.get_version(conn.cursor())
+        finally:
+            conn.close()
+        if reader.header['catalog_version'] != version:
+            return {
+                'loaded': False,
+                'reason': f"bundle is catalog version {reader.header['catalog_version']}, "
+                          f"database is {version}"
+            }
+
+        question_index.load_columns(
+            reader.column('questions', 'id'),
+            reader.column('questions', 'category'),
+            reader.column('questions', 'difficulty')
+        )
+        return {
+            'loaded': True,
+            'questions': reader.rows('questions'),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog bundle tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help="Write the catalog to a bundle")
+    export_parser.add_argument('path')
+    export_parser.add_argument('--no-signatures', dest='signatures', action='store_false',
+                               help="Leave out MinHash signatures; loaded databases then "
+                                    "hash every question after startup")
+    load_parser = commands.add_parser('load', help="Load a bundle into trivia.db")
+    load_parser.add_argument('path')
+    load_parser.add_argument('--replace', action='store_true',
+                             help="Delete the existing catalog first")
+    info_parser = commands.add_parser('info', help="Show a bundle's header")
+    info_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        print(export_bundle(args.path, signatures=args.signatures))
+    elif args.command == 'load':
+        print(load_bundle(args.path, replace=args.replace))
+    else:
+        with BundleReader(args.path) as reader:
+            header = reader.header
+            print(f"format {header['format_version']}, catalog version {header['catalog_version']}, "
+                  f"created {header['created_at']}")
+            for table, meta in header['tables'].items():
+                columns = ', '.join(f"{c['name']}:{c['kind']}" for c in meta['columns'])
+                print(f"  {table}: {meta['rows']} rows ({columns})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""Catalog version counters.
+
+``catalog_meta.catalog_version`` is bumped by triggers on every insert,
+update or delete in ``quiz`` and ``questions``, whichever code path makes
+the change, and ``catalog_updated_at`` records when (unix seconds). The same
+triggers stamp each affected quiz in ``quiz_versions`` with the new global
+version, so a quiz's version only moves when that quiz or its questions
+change. A quiz without a row has not changed since the triggers were added
+and is at version 0.
+
+Anything derived from the catalog can store the version it was built from
+and rebuild when it no longer matches. ``catalog_versions`` caches the
+current versions for conditional GETs. When the global version moves it
+only drops the quizzes stamped since the version it last saw. After a bulk
+load (``set_version`` records ``catalog_reset_version``) it drops them all.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.database import get_db_connection
+
+CATALOG_TABLES = ('quiz', 'questions')
+EVENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+# How long a worker trusts its cached versions; writes made through this
+# worker invalidate them immediately, writes from elsewhere show up within this
+VERSION_TTL_SECONDS = 1.0
+
+Version = Tuple[int, Optional[int]]
+
+
+def _trigger_name(table: str, event: str) -> str:
+    return f"trg_{table}_{event.lower()}_catalog_version"
+
+
+def _stamp(quiz_id_expr: str) -> str:
+    return f'''
+        INSERT INTO quiz_versions (quiz_id, version, updated_at)
+        VALUES (
+            {quiz_id_expr},
+            (SELECT value FROM catalog_meta WHERE key = 'catalog_version'),
+            CAST(strftime('%s', 'now') AS INTEGER)
+        )
+        ON CONFLICT (quiz_id) DO UPDATE SET
+            version = excluded.version, updated_at = excluded.updated_at;
+    '''
+
+
+def _trigger_body(table: str, event: str) -> str:
+    rows = {'INSERT': ('NEW',), 'UPDATE': ('OLD', 'NEW'), 'DELETE': ('OLD',)}[event]
+    column = 'id' if table == 'quiz' else 'quiz_id'
+    stamps = ''.join(_stamp(f"{row}.{column}") for row in rows)
+    return f'''
+        UPDATE catalog_meta SET value = value + 1 WHERE key = 'catalog_version';
+        UPDATE catalog_meta SET value = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE key = 'catalog_updated_at';
+        {stamps}
+    '''
+
+
+def ensure_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quiz_versions (
+            quiz_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute(
+        "INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('catalog_version', 1)"
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO catalog_meta (key, value) "
+        "VALUES ('catalog_updated_at', CAST(strftime('%s', 'now') AS INTEGER))"
+    )
+    # Recreated every time so databases with older trigger bodies pick up
+    # the current ones
+    drop_triggers(conn)
+    for table in CATALOG_TABLES:
+        for event in EVENTS:
+            conn.execute(f'''
+                CREATE TRIGGER {_trigger_name(table, event)}
+                AFTER {event} ON {table}
+                BEGIN
+                    {_trigger_body(table, event)}
+                END
+            ''')
+
+
+def drop_triggers(conn):
+    """
+    For bulk loads, which would otherwise bump the version once per row.
+    Call inside the load transaction and restore with ensure_schema.
+    """
+    for table in CATALOG_TABLES:
+        for event in EVENTS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {_trigger_name(table, event)}")
+
+
+def get_version(cursor) -> int:
+    cursor.execute("SELECT value FROM catalog_meta WHERE key = 'catalog_version'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def set_version(cursor, version: int):
+    """
+    Set the version by hand after a bulk load and stamp every quiz with it,
+    including quizzes that have a stamp but no longer exist
+    """
+    cursor.execute(
+        "UPDATE catalog_meta SET value = ? WHERE key = 'catalog_version'", (version,)
+    )
+    # Readers can not tell which cached quizzes a load touched; this tells
+    # them to drop them all
+    cursor.execute(
+        "INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('catalog_reset_version', ?)",
+        (version,)
+    )
+    cursor.execute(
+        "UPDATE catalog_meta SET value = CAST(strftime('%s', 'now') AS INTEGER) "
+        "WHERE key = 'catalog_updated_at'"
+    )
+    # Quizzes the load removed are stamped too, so nothing keyed on their
+    # old version (snapshots, ETags) is served for them again
+    cursor.execute('''
+        INSERT OR REPLACE INTO quiz_versions (quiz_id, version, updated_at)
+        SELECT id, ?1, CAST(strftime('%s', 'now') AS INTEGER) FROM quiz
+        UNION
+        SELECT quiz_id, ?1, CAST(strftime('%s', 'now') AS INTEGER) FROM quiz_versions
+    ''', (version,))
+
+
+class CatalogVersions:
+    """Per-worker cache of the global and per-quiz versions"""
+
+    def __init__(self, ttl: float = VERSION_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._current: Optional[Version] = None
+        self._checked_at = 0.0
+        self._quizzes: Dict[int, Version] = {}
+
+    def invalidate(self):
+        """
+        Call after committing a catalog write. The next read fetches the
+        new version and drops only the quizzes that changed since.
+        """
+        with self._lock:
+            self._checked_at = float('-inf')
+
+    def _read(
+        self, quiz_id: Optional[int] = None, since: Optional[int] = None
+    ) -> Tuple[Version, Optional[Version], Optional[List[int]]]:
+        """
+        The current version, the quiz's version if asked for, and the quizzes
+        stamped after ``since`` (None if they can not be told apart)
+        """
+        conn = get_db_connection()
+        try:
+            rows = dict(conn.execute(
+                "SELECT key, value FROM catalog_meta WHERE key IN "
+                "('catalog_version', 'catalog_updated_at', 'catalog_reset_version')"
+            ).fetchall())
+            current = (rows.get('catalog_version', 0), rows.get('catalog_updated_at'))
+            quiz = None
+            if quiz_id is not None:
+                row = conn.execute(
+                    "SELECT version, updated_at FROM quiz_versions WHERE quiz_id = ?", (quiz_id,)
+                ).fetchone()
+                quiz = tuple(row) if row else (0, None)
+            changed = None
+            if since is not None and since < current[0] and rows.get('catalog_reset_version', 0) <= since:
+                changed = [row[0] for row in conn.execute(
+                    "SELECT quiz_id FROM quiz_versions WHERE version > ?", (since,)
+                )]
+            return current, quiz, changed
+        finally:
+            conn.close()
+
+    def _since(self) -> Optional[int]:
+        return self._current[0] if self._current is not None else None
+
+    def _store(self, current: Version, since: Optional[int], changed: Optional[List[int]]):
+        # Per-quiz versions only move with the global one
+        if current != self._current:
+            if changed is not None and self._since() == since:
+                for quiz_id in changed:
+                    self._quizzes.pop(quiz_id, None)
+            else:
+                self._quizzes = {}
+        self._current = current
+        self._checked_at = time.monotonic()
+
+    def _fresh(self) -> bool:
+        return self._current is not None and time.monotonic() - self._checked_at < self.ttl
+
+    def current(self) -> Version:
+        """(catalog version, updated_at unix seconds)"""
+        with self._lock:
+            if self._fresh():
+                return self._current
+            since = self._since()
+        current, _, changed = self._read(since=since)
+        with self._lock:
+            self._store(current, since, changed)
+        return current
+
+    def quiz(self, quiz_id: int) -> Version:
+        """(quiz version, updated_at unix seconds or None)"""
+        with self._lock:
+            if self._fresh() and quiz_id in self._quizzes:
+                return self._quizzes[quiz_id]
+            since = self._since()
+        current, quiz, changed = self._read(quiz_id, since)
+        with self._lock:
+            self._store(current, since, changed)
+            self._quizzes[quiz_id] = quiz
+        return quiz
+
+
+catalog_versions = CatalogVersions()
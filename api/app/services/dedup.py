@@ -0,0 +1,551 @@
+"""Near-duplicate detection for question text.
+
+Questions are normalized (case, punctuation, whitespace), cut into
+character shingles and reduced to a MinHash signature of NUM_PERM values.
+Signatures are split into BANDS bands; questions sharing any band hash land
+in the same LSH bucket and become candidates, and only candidates have
+their signature similarity computed. A lookup is therefore a handful of
+dict probes instead of a scan over the whole catalog.
+
+Signatures are persisted in ``question_minhash`` so startup only rebuilds
+the bucket dicts. Questions without a stored signature (inserted by other
+tools, or loaded from a bundle exported without signatures) are hashed by
+``signature_backfill`` after startup, in batches on the compute pool; until
+then they are not matched as near-duplicates. Audit the existing catalog
+with::
+
+    python -m app.services.dedup --audit
+
+Every worker holds its own index. Before screening, ``refresh_if_stale``
+adds the signatures other workers stored since the last read (rows past the
+highest question id seen), and rebuilds the whole index once it is
+REFRESH_SECONDS old, which also picks up their edits and deletes.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.compute import ComputeBusy, chunked, compute_pool
+from app.core.config import get_settings
+from app.core.retry import write_retry
+from app.database import get_db_connection
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+SEED = 20250301
+
+REFRESH_SECONDS = 300
+
+# Questions read per backfill step, and texts per compute pool chunk
+BACKFILL_BATCH = 1000
+HASH_CHUNK = 100
+
+logger = logging.getLogger("uvicorn.error.dedup")
+
+_MASK = (1 << 64) - 1
+_rng = random.Random(SEED)
+_PERMUTATIONS = [
+    (_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(NUM_PERM)
+]
+_NON_WORD = re.compile(r'[^\w\s]+')
+_SPACES = re.compile(r'\s+')
+
+Signature = Tuple[int, ...]
+
+
+def normalize(text: str) -> str:
+    text = _NON_WORD.sub(' ', text.lower())
+    return _SPACES.sub(' ', text).strip()
+
+
+def _shingle_hashes(text: str) -> set:
+    normalized = normalize(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        return {zlib.crc32(normalized.encode())}
+    encoded = normalized.encode()
+    return {
+        zlib.crc32(encoded[i:i + SHINGLE_SIZE])
+        for i in range(len(encoded) - SHINGLE_SIZE + 1)
+    }
+
+
+def signature(text: str) -> Signature:
+    """MinHash signature of a question text"""
+    hashes = list(_shingle_hashes(text))
+    # min() over a built list is markedly faster than over a generator, and
+    # shifting after the min keeps the order, so only 64 shifts run
+    return tuple(
+        min([(a * h + b) & _MASK for h in hashes]) >> 32
+        for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(left: Signature, right: Signature) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures"""
+    return sum(1 for x, y in zip(left, right) if x == y) / NUM_PERM
+
+
+def _band_keys(sig: Signature) -> List[Tuple[int, Signature]]:
+    return [(band, sig[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+def _pack(sig: Signature) -> bytes:
+    return array('I', sig).tobytes()
+
+
+def _unpack(blob: bytes) -> Optional[Signature]:
+    values = array('I')
+    values.frombytes(blob)
+    return tuple(values) if len(values) == NUM_PERM else None
+
+
+class MinHashIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signatures: Dict[int, Signature] = {}
+        self._buckets: Dict[Tuple[int, Signature], set] = {}
+        self.loaded_at: Optional[float] = None
+        # Highest question id read from question_minhash
+        self.last_seen = 0
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _insert(self, key: int, sig: Signature):
+        self._signatures[key] = sig
+        for band_key in _band_keys(sig):
+            self._buckets.setdefault(band_key, set()).add(key)
+
+    def _delete(self, key: int):
+        sig = self._signatures.pop(key, None)
+        if sig is None:
+            return
+        for band_key in _band_keys(sig):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def load(self, conn=None):
+        """Rebuild from question_minhash; see signature_backfill for questions missing from it"""
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        try:
+            ensure_schema(conn)
+            signatures: Dict[int, Signature] = {}
+            for question_id, blob in conn.execute(
+                "SELECT question_id, signature FROM question_minhash"
+            ):
+                sig = _unpack(blob)
+                if sig is not None:
+                    signatures[question_id] = sig
+        finally:
+            if own_conn:
+                conn.close()
+
+        index = MinHashIndex()
+        for question_id, sig in signatures.items():
+            index._insert(question_id, sig)
+        with self._lock:
+            self._signatures = index._signatures
+            self._buckets = index._buckets
+            self.loaded_at = time.monotonic()
+            self.last_seen = max(signatures, default=0)
+
+    def load_since(self, conn=None):
+        """Add the signatures stored past ``last_seen``, by any worker"""
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        try:
+            rows = conn.execute(
+                "SELECT question_id, signature FROM question_minhash "
+                "WHERE question_id > ? ORDER BY question_id",
+                (self.last_seen,)
+            ).fetchall()
+        finally:
+            if own_conn:
+                conn.close()
+        self.add_many((question_id, _unpack(blob)) for question_id, blob in rows)
+        if rows:
+            with self._lock:
+                self.last_seen = max(self.last_seen, rows[-1][0])
+
+    def refresh_if_stale(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > REFRESH_SECONDS:
+            self.load()
+        else:
+            self.load_since()
+
+    def add(self, key: int, sig: Signature):
+        self.add_many([(key, sig)])
+
+    def add_many(self, signatures: Iterable[Tuple[int, Optional[Signature]]]):
+        """Add or replace entries; None signatures (unreadable rows) are skipped"""
+        with self._lock:
+            for key, sig in signatures:
+                if sig is not None:
+                    self._delete(key)
+                    self._insert(key, sig)
+
+    def remove_many(self, keys: Iterable[int]):
+        with self._lock:
+            for key in keys:
+                self._delete(key)
+
+    def query(self, sig: Signature, threshold: float) -> List[Tuple[int, float]]:
+        """Indexed keys whose similarity to sig is at least threshold, best first"""
+        with self._lock:
+            candidates = set()
+            for band_key in _band_keys(sig):
+                bucket = self._buckets.get(band_key)
+                if bucket:
+                    candidates.update(bucket)
+            matches = []
+            for key in candidates:
+                score = similarity(sig, self._signatures[key])
+                if score >= threshold:
+                    matches.append((key, score))
+        matches.sort(key=lambda match: -match[1])
+        return matches
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'questions': len(self._signatures),
+                'buckets': len(self._buckets),
+                'num_perm': NUM_PERM,
+                'bands': BANDS
+            }
+
+
+dedup_index = MinHashIndex()
+
+
+def ensure_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_minhash (
+            question_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL
+        )
+    ''')
+
+
+def store(cursor, signatures: Iterable[Tuple[int, Signature]]):
+    """Persist signatures. Call inside the transaction inserting the questions."""
+    cursor.executemany(
+        "INSERT OR REPLACE INTO question_minhash (question_id, signature) VALUES (?, ?)",
+        [(question_id, _pack(sig)) for question_id, sig in signatures]
+    )
+
+
+def forget(cursor, question_ids: Sequence[int]):
+    cursor.executemany(
+        "DELETE FROM question_minhash WHERE question_id = ?",
+        [(question_id,) for question_id in question_ids]
+    )
+
+
+def _missing(conn, after_id: int, limit: int) -> List[Tuple[int, str]]:
+    """Questions after ``after_id`` without a stored signature, in id order"""
+    return [tuple(row) for row in conn.execute('''
+        SELECT q.id, q.question_text FROM questions q
+        LEFT JOIN question_minhash m ON m.question_id = q.id
+        WHERE m.question_id IS NULL AND q.id > ?
+        ORDER BY q.id
+        LIMIT ?
+    ''', (after_id, limit))]
+
+
+def _store_new(conn, signatures: Sequence[Tuple[int, Signature]]) -> List[Tuple[int, Signature]]:
+    """
+    Store the signatures of questions that still exist and still have
+    none; an insert or edit since they were read has stored a newer one.
+    One write transaction, run through write_retry.
+    """
+    cursor = conn.cursor()
+    stored = []
+    for question_id, sig in signatures:
+        cursor.execute('''
+            INSERT OR IGNORE INTO question_minhash (question_id, signature)
+            SELECT ?, ? WHERE EXISTS (SELECT 1 FROM questions WHERE id = ?)
+        ''', (question_id, _pack(sig), question_id))
+        if cursor.rowcount:
+            stored.append((question_id, sig))
+    return stored
+
+
+def hash_missing(conn) -> int:
+    """Hash and store every question without a signature, in the caller's thread; for scripts"""
+    ensure_schema(conn)
+    hashed = 0
+    after_id = 0
+    while True:
+        rows = _missing(conn, after_id, BACKFILL_BATCH)
+        if not rows:
+            return hashed
+        after_id = rows[-1][0]
+        chunks = compute_pool.map_sync(
+            batch_signatures, chunked([text or '' for _, text in rows], HASH_CHUNK)
+        )
+        signatures = [sig for chunk in chunks for sig in chunk]
+        hashed += len(_store_new(conn, [(row[0], sig) for row, sig in zip(rows, signatures)]))
+        conn.commit()
+
+
+class SignatureBackfill:
+    """
+    Hashes questions without a stored signature after startup, a batch at
+    a time on the compute pool. Started and stopped by the app lifespan;
+    every worker runs one. After storing a batch it reads back every
+    signature in the id range the batch covers, and once nothing is missing
+    it reads the rest of the table if ``dedup_index`` is still short of the
+    question count, so the rows another worker stored first reach this
+    worker's index as well.
+    """
+
+    def __init__(self):
+        self.hashed = 0
+        self.finished = False
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _read(after_id: int) -> List[Tuple[int, str]]:
+        conn = get_db_connection()
+        try:
+            return _missing(conn, after_id, BACKFILL_BATCH)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _read_stored(after_id: int, last_id: Optional[int]) -> List[Tuple[int, Optional[Signature]]]:
+        """Stored signatures after ``after_id`` up to ``last_id`` (None: the end)"""
+        conn = get_db_connection()
+        try:
+            return [(question_id, _unpack(blob)) for question_id, blob in conn.execute(
+                "SELECT question_id, signature FROM question_minhash "
+                "WHERE question_id > ? AND (?2 IS NULL OR question_id <= ?2)",
+                (after_id, last_id)
+            )]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _question_count() -> int:
+        conn = get_db_connection()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+        finally:
+            conn.close()
+
+    async def _step(self, after_id: int) -> Optional[int]:
+        """Hash one batch; the last id read, or None when nothing is missing"""
+        rows = await run_in_threadpool(self._read, after_id)
+        if not rows:
+            if await run_in_threadpool(self._question_count) > len(dedup_index):
+                dedup_index.add_many(await run_in_threadpool(self._read_stored, after_id, None))
+            return None
+
+        chunks = await compute_pool.map(
+            batch_signatures, chunked([text or '' for _, text in rows], HASH_CHUNK), timeout=None
+        )
+        signatures = [sig for chunk in chunks for sig in chunk]
+        stored = await write_retry.run_async(
+            _store_new, [(row[0], sig) for row, sig in zip(rows, signatures)]
+        )
+        self.hashed += len(stored)
+        dedup_index.add_many(await run_in_threadpool(self._read_stored, after_id, rows[-1][0]))
+        return rows[-1][0]
+
+    async def _run(self):
+        after_id = 0
+        try:
+            while True:
+                try:
+                    last_id = await self._step(after_id)
+                except ComputeBusy:
+                    # Requests come first; try the same batch again shortly
+                    await asyncio.sleep(get_settings().ADMISSION_RETRY_AFTER)
+                    continue
+                if last_id is None:
+                    break
+                after_id = last_id
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("signature backfill failed after %d questions", self.hashed)
+            return
+        self.finished = True
+        if self.hashed:
+            logger.info("signature backfill hashed %d questions", self.hashed)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict:
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'finished': self.finished,
+            'hashed': self.hashed
+        }
+
+
+signature_backfill = SignatureBackfill()
+
+
+def check_batch(texts: Sequence[str], threshold: Optional[float] = None):
+    """
+    Signatures for a batch of question texts plus the near-duplicates found.
+
+    Each text is compared against the catalog and against the texts before
+    it in the same batch. Returns (signatures, duplicates) where duplicates
+    is a list of ``{'index', 'matches'}`` entries; a match carries either a
+    ``question_id`` or the ``batch_index`` of an earlier text in the batch.
+    """
+    signatures = batch_signatures(texts)
+    return signatures, find_duplicates(signatures, threshold)
+
+
+def batch_signatures(texts: Sequence[str]) -> List[Signature]:
+    """Signatures for a list of texts; the unit of work sent to the compute pool"""
+    return [signature(text) for text in texts]
+
+
+def find_duplicates(signatures: Sequence[Signature], threshold: Optional[float] = None) -> List[Dict]:
+    """The comparison half of check_batch, for signatures computed elsewhere"""
+    if threshold is None:
+        threshold = get_settings().DEDUP_THRESHOLD
+
+    batch = MinHashIndex()
+    duplicates = []
+
+    for index, sig in enumerate(signatures):
+        matches = [
+            {'question_id': question_id, 'similarity': round(score, 3)}
+            for question_id, score in dedup_index.query(sig, threshold)
+        ]
+        matches.extend(
+            {'batch_index': batch_index, 'similarity': round(score, 3)}
+            for batch_index, score in batch.query(sig, threshold)
+        )
+        if matches:
+            duplicates.append({'index': index, 'matches': matches})
+        batch._insert(index, sig)
+
+    return duplicates
+
+
+def screen_batch(texts: Sequence[str], mode: str):
+    """check_batch for an ingest request; mode 'allow' skips the comparison"""
+    if mode == 'allow':
+        return batch_signatures(texts), []
+    return check_batch(texts)
+
+
+def audit(conn=None, threshold: Optional[float] = None) -> List[Dict]:
+    """Groups of near-duplicate questions in the current catalog"""
+    if threshold is None:
+        threshold = get_settings().DEDUP_THRESHOLD
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        rows = {
+            row['id']: row
+            for row in conn.execute("SELECT id, quiz_id, question_text FROM questions")
+        }
+    finally:
+        if own_conn:
+            conn.close()
+
+    index = MinHashIndex()
+    parent = {}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for question_id, row in rows.items():
+        sig = signature(row['question_text'] or '')
+        parent[question_id] = question_id
+        for other_id, _ in index.query(sig, threshold):
+            parent[find(other_id)] = find(question_id)
+        index._insert(question_id, sig)
+
+    groups: Dict[int, List[int]] = {}
+    for question_id in rows:
+        groups.setdefault(find(question_id), []).append(question_id)
+
+    return [
+        {
+            'question_ids': sorted(members),
+            'questions': [
+                {
+                    'id': question_id,
+                    'quiz_id': rows[question_id]['quiz_id'],
+                    'question_text': rows[question_id]['question_text']
+                }
+                for question_id in sorted(members)
+            ]
+        }
+        for members in groups.values() if len(members) > 1
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate question tools")
+    parser.add_argument('--audit', action='store_true', help="List near-duplicate groups")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute stored signatures")
+    parser.add_argument('--threshold', type=float, default=None)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        conn = get_db_connection()
+        try:
+            ensure_schema(conn)
+            conn.execute("DELETE FROM question_minhash")
+            conn.commit()
+            started = time.perf_counter()
+            stored = hash_missing(conn)
+            print(f"Stored {stored} signatures in "
+                  f"{(time.perf_counter() - started) * 1000:.1f} ms")
+        finally:
+            conn.close()
+
+    if args.audit or not args.rebuild:
+        groups = audit(threshold=args.threshold)
+        for group in groups:
+            print("-" * 60)
+            for question in group['questions']:
+                print(f"  #{question['id']} (quiz {question['quiz_id']}): {question['question_text']}")
+        print(f"{len(groups)} near-duplicate groups, "
+              f"{sum(len(group['question_ids']) for group in groups)} questions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""Partial updates to quizzes and questions.
+
+``PATCH /api/quizzes/{id}``, ``PATCH /api/questions/{id}`` and the batch
+``PATCH /api/questions`` send only the fields to change. Each row is read in
+the write transaction and updated with one UPDATE setting just the columns
+whose value differs, so an edit that changes nothing leaves the row, and
+with it every catalog version, alone.
+
+The catalog triggers (``app.services.catalog``) then stamp exactly the
+quizzes touched, so what is keyed on per-quiz versions, the quiz payloads
+with their answer keys in ``quiz_snapshots`` and the per-quiz ETags, moves
+for those quizzes only and ``catalog_versions`` drops only their entries.
+``apply_questions`` patches the in-process indexes rather than reloading
+them:
+
+- ``question_index`` rebuckets a question only if its category or
+  difficulty changed
+- ``dedup_index`` takes the new signature only if the text changed
+- ``home_cache`` keeps its summary across question edits that moved no
+  question between quizzes, since its counts are per quiz category
+"""
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.models.schemas import check_answer_index
+from app.services import dedup, quiz_snapshots
+from app.services.catalog import Version, catalog_versions
+from app.services.dedup import dedup_index
+from app.services.home import home_cache
+from app.services.ingest import QUIZ_LOOKUP_CHUNK, existing_quiz_ids
+from app.services.question_index import question_index
+
+# Fields whose change moves a question to another question_index bucket
+INDEXED_FIELDS = ('category', 'difficulty')
+
+
+class NotFound(LookupError):
+    pass
+
+
+class InvalidEdit(ValueError):
+    def __init__(self, errors: List[Dict]):
+        super().__init__(f"{len(errors)} invalid edits")
+        self.errors = errors
+
+
+class Edit:
+    """A row after an edit and the columns the edit actually changed"""
+
+    def __init__(self, row: Dict, changed: Dict):
+        self.row = row
+        self.changed = changed
+        self.signature: Optional[dedup.Signature] = None
+
+
+class QuestionEdits:
+    """The edits of one transaction with the catalog version before and after it"""
+
+    def __init__(self, edits: List[Edit], before: int, after: Version):
+        self.edits = edits
+        self.before = before
+        self.after = after
+
+
+def _versions(cursor) -> Version:
+    cursor.execute(
+        "SELECT key, value FROM catalog_meta "
+        "WHERE key IN ('catalog_version', 'catalog_updated_at')"
+    )
+    rows = dict(cursor.fetchall())
+    return rows.get('catalog_version', 0), rows.get('catalog_updated_at')
+
+
+def _update(cursor, table: str, row: Dict, values: Dict) -> Edit:
+    """Write the values that differ from row in one UPDATE"""
+    changed = {column: value for column, value in values.items() if row[column] != value}
+    if changed:
+        assignments = ', '.join(f"{column} = ?" for column in changed)
+        cursor.execute(
+            f"UPDATE {table} SET {assignments} WHERE id = ?", (*changed.values(), row['id'])
+        )
+    return Edit({**row, **changed}, changed)
+
+
+def patch_quiz(conn, quiz_id: int, changes: Dict) -> Edit:
+    """One write transaction, run through write_retry"""
+    cursor = conn.cursor()
+    conn.execute("BEGIN IMMEDIATE")
+    cursor.execute("SELECT * FROM quiz WHERE id = ?", (quiz_id,))
+    row = cursor.fetchone()
+    if not row:
+        raise NotFound(f"Quiz with ID {quiz_id} not found")
+    edit = _update(cursor, 'quiz', dict(row), changes)
+    if edit.changed:
+        quiz_snapshots.store_current(cursor, [quiz_id])
+    return edit
+
+
+def _fetch_questions(cursor, question_ids: Sequence[int]) -> Dict[int, Dict]:
+    wanted = list(set(question_ids))
+    rows = {}
+    for start in range(0, len(wanted), QUIZ_LOOKUP_CHUNK):
+        chunk = wanted[start:start + QUIZ_LOOKUP_CHUNK]
+        cursor.execute(
+            f"SELECT * FROM questions WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+        )
+        rows.update((row['id'], dict(row)) for row in cursor.fetchall())
+    return rows
+
+
+def _check(patches: Sequence[Tuple[int, Dict]], rows: Dict[int, Dict], known_quizzes) -> List[Dict]:
+    errors = []
+    for index, (question_id, changes) in enumerate(patches):
+        row = rows[question_id]
+        if 'quiz_id' in changes and changes['quiz_id'] not in known_quizzes:
+            errors.append({
+                'index': index,
+                'id': question_id,
+                'error': f"Quiz with ID {changes['quiz_id']} not found"
+            })
+        choices = changes.get('choices', json.loads(row['choices']))
+        answer = changes.get('correct_answer_index', row['correct_answer_index'])
+        try:
+            check_answer_index(choices, answer)
+        except ValueError as e:
+            errors.append({'index': index, 'id': question_id, 'error': str(e)})
+        # Later patches of the same question build on this one
+        rows[question_id] = {**row, **changes, 'choices': json.dumps(choices)}
+    return errors
+
+
+def patch_questions(
+    conn,
+    patches: Sequence[Tuple[int, Dict]],
+    signatures: Dict[int, dedup.Signature]
+) -> QuestionEdits:
+    """
+    Apply (question id, changes) pairs, all or nothing, in one write
+    transaction run through write_retry. ``signatures`` maps the index of
+    each patch that sets question_text to the new text's signature.
+    """
+    cursor = conn.cursor()
+    conn.execute("BEGIN IMMEDIATE")
+    before = _versions(cursor)[0]
+
+    rows = _fetch_questions(cursor, [question_id for question_id, _ in patches])
+    missing = sorted({question_id for question_id, _ in patches if question_id not in rows})
+    if missing:
+        raise NotFound(f"Questions not found: {', '.join(map(str, missing))}")
+
+    known_quizzes = existing_quiz_ids(
+        cursor, [changes['quiz_id'] for _, changes in patches if 'quiz_id' in changes]
+    )
+    errors = _check(patches, dict(rows), known_quizzes)
+    if errors:
+        raise InvalidEdit(errors)
+
+    edits = []
+    touched_quizzes = set()
+    for index, (question_id, changes) in enumerate(patches):
+        values = dict(changes)
+        if 'choices' in values:
+            values['choices'] = json.dumps(values['choices'])
+        edit = _update(cursor, 'questions', rows[question_id], values)
+        if edit.changed:
+            touched_quizzes.update((rows[question_id]['quiz_id'], edit.row['quiz_id']))
+        rows[question_id] = edit.row
+        if 'question_text' in edit.changed:
+            edit.signature = signatures[index]
+            dedup.store(cursor, [(question_id, edit.signature)])
+        edit.row = {**edit.row, 'choices': json.loads(edit.row['choices'])}
+        edits.append(edit)
+
+    quiz_snapshots.store_current(cursor, touched_quizzes)
+    return QuestionEdits(edits, before, _versions(cursor))
+
+
+def apply_quiz(edit: Edit):
+    """Bring this worker's caches up to date after patch_quiz commits"""
+    if edit.changed:
+        catalog_versions.invalidate()
+
+
+def apply_questions(result: QuestionEdits):
+    """Bring this worker's caches up to date after patch_questions commits"""
+    if not any(edit.changed for edit in result.edits):
+        return
+    if not any('quiz_id' in edit.changed for edit in result.edits):
+        home_cache.carry_forward(result.before, result.after)
+    catalog_versions.invalidate()
+
+    for edit in result.edits:
+        question_id = edit.row['id']
+        if any(field in edit.changed for field in INDEXED_FIELDS):
+            question_index.move(question_id, edit.row['category'], edit.row['difficulty'])
+        if edit.signature is not None:
+            dedup_index.add(question_id, edit.signature)
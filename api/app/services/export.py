@@ -0,0 +1,270 @@
+"""Streaming export of quiz_results joined with quiz and users.
+
+Rows are read in keyset-paginated batches (``qr.id > last_id``), so memory
+stays constant however many results there are, and an interrupted export
+can be resumed by passing the last exported ``result_id`` as ``after_id``.
+With sharded user data (see ``app.services.shards``) trivia.db and every
+shard are read side by side and their rows merged in id order::
+
+    python -m app.services.export --format csv --out results.csv --since 2025-01-01
+"""
+import argparse
+import csv
+import heapq
+import io
+import sys
+from typing import Dict, Iterator, List, Optional
+
+from app.services import shards
+from app.services.archive import get_results_connection
+
+FORMATS = ('csv', 'arrow')
+
+COLUMNS = [
+    'result_id', 'user_id', 'email', 'quiz_id', 'quiz_name', 'category',
+    'difficulty', 'score', 'answers', 'completed_at'
+]
+
+EXPORT_QUERY = '''
+    SELECT
+        qr.id as result_id,
+        qr.user_id,
+        u.email,
+        qr.quiz_id,
+        q.name as quiz_name,
+        q.category,
+        q.difficulty,
+        qr.score,
+        qr.answers,
+        qr.completed_at
+    FROM all_quiz_results qr
+    LEFT JOIN quiz q ON qr.quiz_id = q.id
+    LEFT JOIN users u ON qr.user_id = u.id
+    WHERE {where}
+    ORDER BY qr.id
+    LIMIT ?
+'''
+
+
+def iter_batches(
+    conn,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    after_id: int = 0,
+    batch_size: int = 5000
+) -> Iterator[List[tuple]]:
+    """
+    Yield lists of result rows in id order.
+
+    ``since`` is inclusive and ``until`` exclusive; both compare against
+    completed_at, so a date ('2025-03-01') or a full timestamp works.
+    """
+    conditions = ["qr.id > ?"]
+    filters = []
+    if since:
+        conditions.append("qr.completed_at >= ?")
+        filters.append(since)
+    if until:
+        conditions.append("qr.completed_at < ?")
+        filters.append(until)
+    query = EXPORT_QUERY.format(where=' AND '.join(conditions))
+
+    last_id = after_id
+    while True:
+        rows = conn.execute(query, (last_id, *filters, batch_size)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [tuple(row) for row in rows]
+        if len(rows) < batch_size:
+            return
+
+
+def merge_batches(sources: List[Iterator[List[tuple]]], batch_size: int) -> Iterator[List[tuple]]:
+    """Merge id-ordered batch streams into one, re-batched to ``batch_size``"""
+    if len(sources) == 1:
+        yield from sources[0]
+        return
+
+    rows = heapq.merge(
+        *((row for batch in source for row in batch) for source in sources),
+        key=lambda row: row[0]
+    )
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def open_connections(check_same_thread=True) -> List:
+    """trivia.db with its archive partitions, then one connection per shard"""
+    conns = [get_results_connection(check_same_thread=check_same_thread)]
+    try:
+        for index in range(shards.shard_count()):
+            conns.append(shards.connect(index, check_same_thread))
+    except Exception:
+        for conn in conns:
+            conn.close()
+        raise
+    return conns
+
+
+def iter_all_batches(conns: List, **filters) -> Iterator[List[tuple]]:
+    batch_size = filters.get('batch_size', 5000)
+    return merge_batches([iter_batches(conn, **filters) for conn in conns], batch_size)
+
+
+def stream_csv(batches: Iterator[List[tuple]]) -> Iterator[str]:
+    """Encode batches as CSV, one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError("pyarrow is required for Arrow export")
+    return pa
+
+
+def stream_arrow(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """Encode batches as an Arrow IPC stream, one record batch per batch"""
+    pa = _require_pyarrow()
+
+    schema = pa.schema([
+        ('result_id', pa.int64()),
+        ('user_id', pa.int64()),
+        ('email', pa.string()),
+        ('quiz_id', pa.int64()),
+        ('quiz_name', pa.string()),
+        ('category', pa.string()),
+        ('difficulty', pa.string()),
+        ('score', pa.float64()),
+        ('answers', pa.string()),
+        ('completed_at', pa.string()),
+    ])
+
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    for batch in batches:
+        columns = list(zip(*batch))
+        writer.write_batch(pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema
+        ))
+        yield drain()
+
+    writer.close()
+    yield drain()
+
+
+def stream_export(
+    format: str = 'csv',
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    after_id: int = 0,
+    batch_size: int = 5000
+) -> Iterator:
+    """
+    Return a generator producing the encoded export.
+
+    Arguments are checked up front so errors surface before streaming
+    starts. The connection is opened lazily on the first chunk and may be
+    used from whichever worker thread pulls the next chunk.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported export format: {format}")
+    if format == 'arrow':
+        _require_pyarrow()
+
+    def generate():
+        conns = open_connections(check_same_thread=False)
+        try:
+            batches = iter_all_batches(
+                conns, since=since, until=until, after_id=after_id, batch_size=batch_size
+            )
+            encoder = stream_csv if format == 'csv' else stream_arrow
+            yield from encoder(batches)
+        finally:
+            for conn in conns:
+                conn.close()
+
+    return generate()
+
+
+def export_to_file(out, format: str = 'csv', **filters) -> Dict:
+    """Write an export to an open file and return the resume cursor"""
+    rows = 0
+    last_id = filters.get('after_id', 0)
+
+    def counting(batches):
+        nonlocal rows, last_id
+        for batch in batches:
+            rows += len(batch)
+            last_id = batch[-1][0]
+            yield batch
+
+    conns = open_connections()
+    try:
+        batches = counting(iter_all_batches(conns, **filters))
+        if format == 'csv':
+            for chunk in stream_csv(batches):
+                out.write(chunk.encode('utf-8'))
+        else:
+            for chunk in stream_arrow(batches):
+                out.write(chunk)
+    finally:
+        for conn in conns:
+            conn.close()
+
+    return {'rows': rows, 'last_result_id': last_id}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export quiz results")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--out', help="output file (default: stdout)")
+    parser.add_argument('--since', help="only results completed at or after this time")
+    parser.add_argument('--until', help="only results completed before this time")
+    parser.add_argument('--after-id', type=int, default=0,
+                        help="resume after this result_id")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    filters = {
+        'since': args.since,
+        'until': args.until,
+        'after_id': args.after_id,
+        'batch_size': args.batch_size
+    }
+
+    if args.out:
+        with open(args.out, 'wb') as out:
+            summary = export_to_file(out, args.format, **filters)
+    else:
+        summary = export_to_file(sys.stdout.buffer, args.format, **filters)
+
+    print(f"Exported {summary['rows']} rows, resume with --after-id {summary['last_result_id']}",
+          file=sys.stderr)
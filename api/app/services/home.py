@@ -0,0 +1,124 @@
+"""Cached catalog summary behind the home page.
+
+Categories with their quiz and question counts and the per-category quiz
+samples are built from two queries once per catalog version and shared by
+``/api/bootstrap``, ``/api/categories`` and ``/api/quizzes/category-samples``.
+The version check goes through ``catalog_versions``, so in the steady state
+none of these routes touches the database. Question edits that leave the
+quiz rows and question counts alone carry the summary forward to the new
+version instead of rebuilding it (see ``app.services.edits``).
+"""
+import copy
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.database import get_db_connection
+from app.services.catalog import catalog_versions
+
+# Distinct sample sizes kept per catalog version
+MAX_CACHED_SAMPLES = 8
+
+
+class CatalogSummary:
+    def __init__(
+        self,
+        version: int,
+        updated_at: Optional[int],
+        quizzes: List[Dict],
+        question_counts: Dict[str, int]
+    ):
+        self.version = version
+        self.updated_at = updated_at
+        self.by_category: Dict[str, List[Dict]] = {}
+        for quiz in quizzes:
+            self.by_category.setdefault(quiz['category'], []).append(quiz)
+        self.categories = [
+            {
+                'name': category,
+                'quiz_count': len(category_quizzes),
+                'question_count': question_counts.get(category, 0)
+            }
+            for category, category_quizzes in sorted(self.by_category.items())
+        ]
+        self._samples: Dict[int, Dict[str, List[Dict]]] = {}
+        self._lock = threading.Lock()
+
+    def samples(self, limit: int) -> Dict[str, List[Dict]]:
+        """
+        Up to ``limit`` quizzes per category (all of them for a negative
+        limit), drawn with the version as seed so one version always gives
+        the same sample.
+        """
+        with self._lock:
+            cached = self._samples.get(limit)
+        if cached is not None:
+            return cached
+
+        rng = random.Random(self.version)
+        samples = {
+            category: rng.sample(quizzes, min(limit, len(quizzes)) if limit >= 0 else len(quizzes))
+            for category, quizzes in sorted(self.by_category.items())
+        }
+        with self._lock:
+            if len(self._samples) < MAX_CACHED_SAMPLES:
+                self._samples[limit] = samples
+        return samples
+
+    def restamped(self, version: int, updated_at: Optional[int]) -> 'CatalogSummary':
+        """The same summary at another version; samples are redrawn for its seed"""
+        summary = copy.copy(self)
+        summary.version = version
+        summary.updated_at = updated_at
+        summary._samples = {}
+        summary._lock = threading.Lock()
+        return summary
+
+
+class HomeCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._summary: Optional[CatalogSummary] = None
+
+    def _build(self, version: int, updated_at: Optional[int]) -> CatalogSummary:
+        conn = get_db_connection()
+        try:
+            quizzes = [
+                dict(row) for row in conn.execute("SELECT * FROM quiz ORDER BY category, id")
+            ]
+            question_counts = dict(conn.execute('''
+                SELECT quiz.category, COUNT(*)
+                FROM questions JOIN quiz ON quiz.id = questions.quiz_id
+                GROUP BY quiz.category
+            ''').fetchall())
+        finally:
+            conn.close()
+        return CatalogSummary(version, updated_at, quizzes, question_counts)
+
+    def get(self) -> CatalogSummary:
+        version, updated_at = catalog_versions.current()
+        summary = self._summary
+        if summary is not None and summary.version == version:
+            return summary
+        with self._lock:
+            # Another request may have rebuilt it while this one waited
+            summary = self._summary
+            if summary is None or summary.version != version:
+                summary = self._build(version, updated_at)
+                self._summary = summary
+        return summary
+
+    def carry_forward(self, before: int, after: Tuple[int, Optional[int]]):
+        """
+        Move a summary built at version ``before`` to ``after`` without a
+        rebuild. Only for writes that changed no quiz row and moved no
+        question between quizzes, with both versions read inside the write
+        transaction so nothing else can have changed in between.
+        """
+        with self._lock:
+            summary = self._summary
+            if summary is not None and summary.version == before:
+                self._summary = summary.restamped(*after)
+
+
+home_cache = HomeCache()
@@ -0,0 +1,160 @@
+"""Batch validation for large question uploads.
+
+``POST /api/questions`` validates its body into one ``QuestionCreate`` model
+per question and then ``json.dumps`` every ``choices`` list again on insert.
+For big batches that dominates the request. Here the raw body goes through
+a single ``TypeAdapter`` over ``List[QuestionCreateRow]`` (a TypedDict, so
+no model instances) straight from JSON, and each row becomes an insert-ready
+tuple whose ``choices`` is already encoded.
+
+Validation is all-or-nothing like the model path, but failures are grouped
+by the index of the offending question. ``validate`` and ``screen`` are the
+route entry points: past a size where it outweighs the pickling, they run
+validation and the MinHash signatures on the compute pool so a large import
+does not stall the event loop.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter, ValidationError
+from pydantic_core import to_json
+
+from app.core.compute import chunked, compute_pool
+from app.models.schemas import CheckedQuestionRow
+from app.services import dedup, quiz_snapshots
+
+INSERT_COLUMNS = (
+    'quiz_id', 'question_text', 'choices', 'correct_answer_index',
+    'explanation', 'category', 'difficulty', 'image'
+)
+INSERT_SQL = (
+    f"INSERT INTO questions ({', '.join(INSERT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(INSERT_COLUMNS))})"
+)
+
+# SQLite's default limit on host parameters in one statement is higher,
+# but chunks this size keep each IN list cheap to build
+QUIZ_LOOKUP_CHUNK = 500
+
+# Bodies and batches below these sizes are handled on the event loop
+OFFLOAD_MIN_BYTES = 256 * 1024
+OFFLOAD_MIN_TEXTS = 20
+# A signature costs about a millisecond; keep a chunk around 100 ms
+SIGNATURE_CHUNK = 100
+
+question_rows = TypeAdapter(List[CheckedQuestionRow])
+# Inlined for the OpenAPI request body, where the adapter's $defs would not resolve
+BODY_SCHEMA = {'type': 'array', 'items': TypeAdapter(CheckedQuestionRow).json_schema()}
+
+
+class BatchValidationError(ValueError):
+    def __init__(self, errors: List[Dict]):
+        super().__init__(f"{len(errors)} invalid questions")
+        self.errors = errors
+
+    def __reduce__(self):
+        # Raised in compute pool workers; the default pickling would pass the message as errors
+        return BatchValidationError, (self.errors,)
+
+
+def _errors_by_index(error: ValidationError) -> List[Dict]:
+    grouped = defaultdict(list)
+    for detail in error.errors(include_url=False, include_input=False):
+        loc = detail['loc']
+        index = loc[0] if loc and isinstance(loc[0], int) else None
+        grouped[index].append({
+            'field': '.'.join(str(part) for part in loc[1:]) or None,
+            'message': detail['msg']
+        })
+    return [{'index': index, 'errors': errors} for index, errors in grouped.items()]
+
+
+def validate_batch(body: bytes) -> List[Tuple]:
+    """
+    Validate a JSON array of questions into tuples in INSERT_COLUMNS order.
+    Raises BatchValidationError listing the invalid indexes.
+    """
+    try:
+        rows = question_rows.validate_json(body)
+    except ValidationError as e:
+        raise BatchValidationError(_errors_by_index(e)) from None
+
+    return [
+        (
+            row['quiz_id'],
+            row['question_text'],
+            to_json(row['choices']).decode(),
+            row['correct_answer_index'],
+            row['explanation'],
+            row['category'],
+            row['difficulty'],
+            row['image']
+        )
+        for row in rows
+    ]
+
+
+async def validate(body: bytes) -> List[Tuple]:
+    """validate_batch, on the compute pool for large bodies"""
+    if len(body) < OFFLOAD_MIN_BYTES:
+        return validate_batch(body)
+    return await compute_pool.run(validate_batch, body)
+
+
+async def screen(texts: List[str], mode: str):
+    """
+    dedup.screen_batch with the signatures computed on the compute pool,
+    against an index brought up to date with other workers' questions
+    """
+    if mode != 'allow':
+        await run_in_threadpool(dedup.dedup_index.refresh_if_stale)
+    if len(texts) < OFFLOAD_MIN_TEXTS:
+        return dedup.screen_batch(texts, mode)
+    chunks = await compute_pool.map(dedup.batch_signatures, chunked(texts, SIGNATURE_CHUNK))
+    signatures = [signature for chunk in chunks for signature in chunk]
+    if mode == 'allow':
+        return signatures, []
+    return signatures, dedup.find_duplicates(signatures)
+
+
+def existing_quiz_ids(cursor, quiz_ids: Iterable[int]) -> Set[int]:
+    """The subset of quiz_ids present in quiz, in a few IN queries"""
+    wanted = list(set(quiz_ids))
+    found = set()
+    for start in range(0, len(wanted), QUIZ_LOOKUP_CHUNK):
+        chunk = wanted[start:start + QUIZ_LOOKUP_CHUNK]
+        cursor.execute(
+            f"SELECT id FROM quiz WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+        )
+        found.update(row[0] for row in cursor.fetchall())
+    return found
+
+
+def insert_rows(conn, rows: List[Tuple], signatures) -> Tuple[List[Dict], List[Dict], List[Tuple]]:
+    """
+    Insert validated rows whose quiz exists, with their MinHash signatures.
+    One write transaction: the caller commits (see ``app.core.retry``).
+    Returns (results, errors, stored signatures).
+    """
+    cursor = conn.cursor()
+    known_quizzes = existing_quiz_ids(cursor, [row[0] for row in rows])
+
+    results = []
+    errors = []
+    stored_signatures = []
+
+    for index, row in enumerate(rows):
+        if row[0] not in known_quizzes:
+            errors.append({
+                'index': index,
+                'error': f'Quiz with ID {row[0]} not found'
+            })
+            continue
+        cursor.execute(INSERT_SQL, row)
+        results.append({'index': index, 'id': cursor.lastrowid})
+        stored_signatures.append((cursor.lastrowid, signatures[index]))
+
+    dedup.store(cursor, stored_signatures)
+    quiz_snapshots.store_current(cursor, [rows[result['index']][0] for result in results])
+    return results, errors, stored_signatures
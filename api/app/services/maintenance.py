@@ -0,0 +1,129 @@
+"""SQLite housekeeping jobs and the scheduler that runs them.
+
+Jobs registered here run inside the API process (see ``app.core.scheduler``)
+when MAINTENANCE_ENABLED is set:
+
+- wal_checkpoint: fold the WAL back into trivia.db and truncate it
+- optimize: ``PRAGMA optimize``, which re-analyzes only what needs it
+- analyze: a full ``ANALYZE`` so the planner sees current table sizes
+- incremental_vacuum: return free pages to the filesystem, once
+  ``auto_vacuum`` is INCREMENTAL (see ``--enable-incremental-vacuum``)
+- rollups, answer_stats: full rebuilds that repair any drift in the
+  incrementally maintained aggregates
+- archive: move old results into monthly partitions
+- backup: online snapshot of trivia.db (see ``app.services.backup``)
+
+Run a job by hand with ``python -m app.services.maintenance JOB``.
+"""
+import argparse
+import json
+
+from app.core.config import get_settings
+from app.core.scheduler import Scheduler
+from app.database import get_db_connection
+from app.services import answer_stats, archive, backup, rollups
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# Pages released per incremental_vacuum run, so one run never holds the
+# write lock for long
+VACUUM_PAGES = 2000
+
+
+def wal_checkpoint():
+    conn = get_db_connection()
+    try:
+        busy, log_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        return {'busy': busy, 'log_frames': log_frames, 'checkpointed': checkpointed}
+    finally:
+        conn.close()
+
+
+def optimize():
+    conn = get_db_connection()
+    try:
+        conn.execute("PRAGMA optimize")
+        return None
+    finally:
+        conn.close()
+
+
+def analyze():
+    conn = get_db_connection()
+    try:
+        conn.execute("ANALYZE")
+        conn.commit()
+        return None
+    finally:
+        conn.close()
+
+
+def incremental_vacuum():
+    conn = get_db_connection()
+    try:
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if mode != 2:
+            return {'skipped': 'auto_vacuum is not INCREMENTAL', 'freelist_count': free_before}
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+        conn.commit()
+        free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return {'pages_released': free_before - free_after, 'freelist_count': free_after}
+    finally:
+        conn.close()
+
+
+def enable_incremental_vacuum():
+    """
+    Switch trivia.db to auto_vacuum=INCREMENTAL. This needs a full VACUUM,
+    which rewrites the file and blocks writers, so it is a manual step.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return {'auto_vacuum': conn.execute("PRAGMA auto_vacuum").fetchone()[0]}
+    finally:
+        conn.close()
+
+
+def _build_scheduler() -> Scheduler:
+    settings = get_settings()
+    scheduler = Scheduler(jitter=settings.MAINTENANCE_JITTER)
+    scheduler.register('wal_checkpoint', 5 * MINUTE, wal_checkpoint, lease=5 * MINUTE)
+    scheduler.register('optimize', HOUR, optimize)
+    scheduler.register('analyze', DAY, analyze)
+    scheduler.register('incremental_vacuum', 6 * HOUR, incremental_vacuum)
+    scheduler.register('rollups', DAY, rollups.backfill)
+    scheduler.register('answer_stats', DAY, answer_stats.backfill)
+    scheduler.register(
+        'archive', DAY, archive.archive_old_results, enabled=settings.ARCHIVE_ENABLED
+    )
+    scheduler.register('backup', DAY, backup.create_backup, enabled=settings.BACKUP_ENABLED)
+    return scheduler
+
+
+scheduler = _build_scheduler()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run maintenance jobs")
+    parser.add_argument('job', nargs='?', choices=sorted(scheduler.jobs))
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help="Switch the database to auto_vacuum=INCREMENTAL (runs VACUUM)")
+    args = parser.parse_args()
+
+    if args.enable_incremental_vacuum:
+        print(enable_incremental_vacuum())
+    if args.job:
+        result = scheduler.run_job(args.job, force=True)
+        print(json.dumps(result, indent=2, default=str) if result else
+              f"{args.job} is running on another worker")
+    elif not args.enable_incremental_vacuum:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Server-side state for progressive quiz play.
+
+A play session pins the quiz's question ids at start so questions can be
+served one position at a time, and records each submitted answer so the
+explanation and correct index are only revealed once, after answering.
+Sessions live in SQLite so every worker can serve any request.
+"""
+import json
+import secrets
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+SESSION_TTL = timedelta(hours=24)
+
+PUBLIC_QUESTION_COLUMNS = "id, question_text, choices, category, difficulty, image"
+
+
+def ensure_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS play_sessions (
+            id TEXT PRIMARY KEY,
+            quiz_id INTEGER NOT NULL,
+            question_ids TEXT NOT NULL,
+            answers TEXT NOT NULL DEFAULT '{}',
+            created_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_play_sessions_created_at ON play_sessions (created_at)"
+    )
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def create_session(cursor, quiz_id: int, question_ids: List[int]) -> str:
+    """Start a session for a quiz; expired sessions are purged on the way"""
+    now = datetime.now()
+    cursor.execute(
+        "DELETE FROM play_sessions WHERE created_at < ?", (_timestamp(now - SESSION_TTL),)
+    )
+
+    session_id = secrets.token_urlsafe(16)
+    cursor.execute('''
+        INSERT INTO play_sessions (id, quiz_id, question_ids, answers, created_at)
+        VALUES (?, ?, ?, '{}', ?)
+    ''', (session_id, quiz_id, json.dumps(question_ids), _timestamp(now)))
+    return session_id
+
+
+def get_session(cursor, session_id: str) -> Optional[Dict]:
+    """Load a live session, or None if it does not exist or has expired"""
+    cursor.execute('''
+        SELECT id, quiz_id, question_ids, answers FROM play_sessions
+        WHERE id = ? AND created_at >= ?
+    ''', (session_id, _timestamp(datetime.now() - SESSION_TTL)))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    session = dict(row)
+    session['question_ids'] = json.loads(session['question_ids'])
+    session['answers'] = json.loads(session['answers'])
+    return session
+
+
+def get_public_question(cursor, session: Dict, position: int) -> Optional[Dict]:
+    """Question at a position, without its answer or explanation"""
+    if position < 0 or position >= len(session['question_ids']):
+        return None
+
+    cursor.execute(
+        f"SELECT {PUBLIC_QUESTION_COLUMNS} FROM questions WHERE id = ? AND quiz_id = ?",
+        (session['question_ids'][position], session['quiz_id'])
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    question = dict(row)
+    question['choices'] = json.loads(question['choices'])
+    question['position'] = position
+    question['has_next'] = position + 1 < len(session['question_ids'])
+    return question
+
+
+def record_answer(cursor, session: Dict, question_id: int, selected_answer: int) -> bool:
+    """
+    Store the first answer for a question. Returns False if the question
+    was already answered in this session.
+    """
+    key = str(question_id)
+    cursor.execute('''
+        UPDATE play_sessions
+        SET answers = json_set(answers, '$."' || ? || '"', ?)
+        WHERE id = ? AND json_extract(answers, '$."' || ? || '"') IS NULL
+    ''', (key, selected_answer, session['id'], key))
+    if cursor.rowcount == 0:
+        return False
+
+    session['answers'][key] = selected_answer
+    return True
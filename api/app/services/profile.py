@@ -0,0 +1,90 @@
+"""A user's result history and stats from one indexed pass.
+
+A profile view used to take two user lookups, the joined results query and
+two aggregate scans (``/results`` plus ``/stats``). ``build_profile`` reads
+the user's rows once, newest first, through ``idx_quiz_results_user``
+(user_id, completed_at) in trivia.db and in every archive partition, and
+computes the overall and per-category stats while it walks them. Only the
+requested page of history has its answers decoded.
+"""
+import json
+from typing import Dict
+
+
+def build_profile(cursor, user_id: int, limit: int, offset: int = 0) -> Dict:
+    """
+    Overall stats and per-category stats over all of the user's results,
+    plus ``limit`` results of history from ``offset``. Results whose quiz
+    has been deleted count towards the overall stats only, as in /stats.
+    """
+    cursor.execute('''
+        SELECT
+            qr.id AS result_id,
+            qr.score,
+            qr.answers,
+            qr.completed_at,
+            qr.quiz_id,
+            qr.quiz_version_id,
+            q.name AS quiz_name,
+            q.category,
+            q.difficulty
+        FROM all_quiz_results qr
+        LEFT JOIN quiz q ON qr.quiz_id = q.id
+        WHERE qr.user_id = ?
+        ORDER BY qr.completed_at DESC
+    ''', (user_id,))
+
+    count = 0
+    total = 0.0
+    highest = lowest = None
+    quiz_ids = set()
+    categories: Dict[str, list] = {}
+    history = []
+    listed = 0
+
+    for row in cursor:
+        score = row['score']
+        count += 1
+        total += score
+        if highest is None or score > highest:
+            highest = score
+        if lowest is None or score < lowest:
+            lowest = score
+        quiz_ids.add(row['quiz_id'])
+
+        category = row['category']
+        if category is None:
+            continue
+        stat = categories.get(category)
+        if stat is None:
+            stat = categories[category] = [0, 0.0]
+        stat[0] += 1
+        stat[1] += score
+
+        if offset <= listed < offset + limit:
+            result = dict(row)
+            result['answers'] = json.loads(result['answers'])
+            history.append(result)
+        listed += 1
+
+    return {
+        'overall_stats': {
+            'total_quizzes': count,
+            'average_score': total / count if count else None,
+            'highest_score': highest,
+            'lowest_score': lowest,
+            'unique_quizzes': len(quiz_ids)
+        },
+        'category_stats': [
+            {
+                'category': category,
+                'quizzes_taken': taken,
+                'average_score': score_total / taken
+            }
+            for category, (taken, score_total) in sorted(categories.items())
+        ],
+        'results': history,
+        'total_results': listed,
+        'limit': limit,
+        'offset': offset
+    }
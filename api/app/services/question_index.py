@@ -0,0 +1,150 @@
+"""In-memory index of question ids by (category, difficulty).
+
+Each bucket is an ``array('i')`` of ids, about 4 bytes per question, so the
+whole catalog fits comfortably in every worker. Drawing k random questions
+samples k positions across the matching buckets without touching the
+database, then fetches just those rows by primary key.
+
+The index is loaded at startup and kept current by the routes that insert,
+edit or delete questions. Changes made by other workers are picked up when the
+index is reloaded, at most REFRESH_SECONDS after the previous load.
+"""
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.database import get_db_connection
+
+REFRESH_SECONDS = 300
+
+BucketKey = Tuple[str, str]
+
+
+def _key(category: str, difficulty: str) -> BucketKey:
+    return (category.strip().lower(), difficulty.strip().lower())
+
+
+class QuestionIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[BucketKey, array] = {}
+        self.loaded_at: Optional[float] = None
+
+    def load(self, conn=None):
+        """Rebuild the index from the questions table"""
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        try:
+            buckets: Dict[BucketKey, array] = {}
+            cursor = conn.execute("SELECT id, category, difficulty FROM questions")
+            for question_id, category, difficulty in cursor:
+                buckets.setdefault(_key(category, difficulty), array('i')).append(question_id)
+        finally:
+            if own_conn:
+                conn.close()
+
+        with self._lock:
+            self._buckets = buckets
+            self.loaded_at = time.monotonic()
+
+    def load_columns(self, ids: Sequence[int], categories: Sequence[str], difficulties: Sequence[str]):
+        """Rebuild the index from parallel columns instead of the questions table"""
+        buckets: Dict[BucketKey, array] = {}
+        by_pair: Dict[Tuple[str, str], array] = {}
+        for question_id, category, difficulty in zip(ids, categories, difficulties):
+            bucket = by_pair.get((category, difficulty))
+            if bucket is None:
+                bucket = buckets.setdefault(_key(category, difficulty), array('i'))
+                by_pair[(category, difficulty)] = bucket
+            bucket.append(question_id)
+
+        with self._lock:
+            self._buckets = buckets
+            self.loaded_at = time.monotonic()
+
+    def refresh_if_stale(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > REFRESH_SECONDS:
+            self.load()
+
+    def add(self, question_id: int, category: str, difficulty: str):
+        with self._lock:
+            self._buckets.setdefault(_key(category, difficulty), array('i')).append(question_id)
+
+    def move(self, question_id: int, category: str, difficulty: str):
+        """Rebucket a question whose category or difficulty changed"""
+        self.remove(question_id)
+        self.add(question_id, category, difficulty)
+
+    def remove(self, question_id: int):
+        self.remove_many((question_id,))
+
+    def remove_many(self, question_ids: Iterable[int]):
+        """Drop ids from whichever buckets hold them"""
+        doomed = set(question_ids)
+        if not doomed:
+            return
+        with self._lock:
+            for key, bucket in list(self._buckets.items()):
+                if len(doomed) == 1:
+                    (question_id,) = doomed
+                    try:
+                        position = bucket.index(question_id)
+                    except ValueError:
+                        continue
+                    # Order inside a bucket does not matter, so swap-remove
+                    bucket[position] = bucket[-1]
+                    bucket.pop()
+                else:
+                    kept = array('i', (i for i in bucket if i not in doomed))
+                    if len(kept) == len(bucket):
+                        continue
+                    bucket = kept
+                    self._buckets[key] = bucket
+                if not bucket:
+                    del self._buckets[key]
+
+    def sample(
+        self,
+        count: int,
+        categories: Optional[Iterable[str]] = None,
+        difficulties: Optional[Iterable[str]] = None
+    ) -> List[int]:
+        """
+        Draw up to ``count`` distinct question ids, uniformly across every
+        question matching the filters. Runs in O(count) plus the number of
+        buckets.
+        """
+        wanted_categories = {c.strip().lower() for c in categories} if categories else None
+        wanted_difficulties = {d.strip().lower() for d in difficulties} if difficulties else None
+
+        with self._lock:
+            buckets = [
+                bucket for (category, difficulty), bucket in self._buckets.items()
+                if (wanted_categories is None or category in wanted_categories)
+                and (wanted_difficulties is None or difficulty in wanted_difficulties)
+            ]
+            ends = list(accumulate(len(bucket) for bucket in buckets))
+            total = ends[-1] if ends else 0
+
+            picks = []
+            for position in random.sample(range(total), min(count, total)):
+                index = bisect_right(ends, position)
+                start = ends[index - 1] if index else 0
+                picks.append(buckets[index][position - start])
+            return picks
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'questions': sum(len(bucket) for bucket in self._buckets.values()),
+                'buckets': len(self._buckets),
+                'bytes': sum(bucket.itemsize * len(bucket) for bucket in self._buckets.values())
+            }
+
+
+question_index = QuestionIndex()
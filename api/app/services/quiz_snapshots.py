@@ -0,0 +1,253 @@
+"""Immutable quiz versions.
+
+Quizzes are edited in place, so the questions behind a quiz id change over
+time. The per-quiz catalog version (``quiz_versions``, see
+``app.services.catalog``) moves on every change, so a (quiz, catalog
+version) pair always names one exact question set. Each quiz's payload at
+each of its catalog versions is stored in ``quiz_snapshots`` and that row's
+id becomes the quiz's version id:
+
+- ``GET /api/quizzes/{id}/questions`` returns the current ``version_id``
+- ``GET /api/quizzes/{id}/questions?version=`` serves the stored payload,
+  which never changes, with an immutable Cache-Control
+- ``quiz_results.quiz_version_id`` records the version a result was
+  answered against
+
+The write routes store the snapshot in the transaction that changes the
+quiz (``store_current``), so serving a quiz is a plain read. Changes made
+without them, by bundle loads, other tools, or before snapshots existed,
+get their snapshot the first time the quiz is served or a result is saved;
+that write holds an admission write slot like any other write.
+Snapshots are kept forever; results point at them.
+"""
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.admission import get_admission_controller
+from app.core.retry import write_retry
+from app.database import get_db_connection
+from app.services.catalog import catalog_versions
+
+MAX_CACHED_SNAPSHOTS = 1024
+
+Snapshot = Tuple[int, Dict]
+
+
+def ensure_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quiz_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quiz_id INTEGER NOT NULL,
+            catalog_version INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            UNIQUE (quiz_id, catalog_version)
+        )
+    ''')
+
+
+def build_payload(cursor, quiz_id: int) -> Optional[Dict]:
+    """The quiz with its questions in id order, or None if it does not exist"""
+    cursor.execute("SELECT * FROM quiz WHERE id = ?", (quiz_id,))
+    quiz = cursor.fetchone()
+    if not quiz:
+        return None
+
+    payload = dict(quiz)
+    cursor.execute("SELECT * FROM questions WHERE quiz_id = ? ORDER BY id", (quiz_id,))
+    payload['questions'] = []
+    for row in cursor.fetchall():
+        question = dict(row)
+        question['choices'] = json.loads(question['choices'])
+        payload['questions'].append(question)
+    return payload
+
+
+class NoSnapshot(LookupError):
+    """The quiz exists but its current version has no snapshot yet"""
+
+
+def _current_version(cursor, quiz_id: int) -> int:
+    cursor.execute("SELECT version FROM quiz_versions WHERE quiz_id = ?", (quiz_id,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def read_current(conn, quiz_id: int) -> Optional[Tuple[int, int, str]]:
+    """
+    (version id, catalog version, payload JSON) of the quiz as it is now,
+    or None if it does not exist, in one read transaction. Raises
+    NoSnapshot when the current version has not been stored.
+    """
+    cursor = conn.cursor()
+    conn.execute("BEGIN")
+    try:
+        cursor.execute("SELECT 1 FROM quiz WHERE id = ?", (quiz_id,))
+        if cursor.fetchone() is None:
+            return None
+        catalog_version = _current_version(cursor, quiz_id)
+        cursor.execute(
+            "SELECT id, payload FROM quiz_snapshots WHERE quiz_id = ? AND catalog_version = ?",
+            (quiz_id, catalog_version)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            raise NoSnapshot(quiz_id)
+        return row['id'], catalog_version, row['payload']
+    finally:
+        conn.rollback()
+
+
+def store_current(cursor, quiz_ids: Iterable[int]):
+    """
+    Store the snapshot of each quiz at its current version, if it still
+    exists and has none. Call inside the write transaction that changed
+    the quizzes, after the changes.
+    """
+    created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for quiz_id in set(quiz_ids):
+        payload = build_payload(cursor, quiz_id)
+        if payload is None:
+            continue
+        cursor.execute('''
+            INSERT OR IGNORE INTO quiz_snapshots (quiz_id, catalog_version, payload, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (quiz_id, _current_version(cursor, quiz_id), json.dumps(payload), created_at))
+
+
+def snapshot_current(conn, quiz_id: int) -> Optional[Tuple[int, int, str]]:
+    """
+    (version id, catalog version, payload JSON) of the quiz as it is now,
+    storing the snapshot if this catalog version has none yet. Reads and
+    the insert share one transaction, so the payload matches the version;
+    run it through write_retry, which commits it.
+    """
+    cursor = conn.cursor()
+    conn.execute("BEGIN")
+    # A deleted quiz may still have a snapshot at its last version
+    cursor.execute("SELECT 1 FROM quiz WHERE id = ?", (quiz_id,))
+    if cursor.fetchone() is None:
+        return None
+
+    catalog_version = _current_version(cursor, quiz_id)
+
+    cursor.execute(
+        "SELECT id, payload FROM quiz_snapshots WHERE quiz_id = ? AND catalog_version = ?",
+        (quiz_id, catalog_version)
+    )
+    row = cursor.fetchone()
+    if row:
+        return row['id'], catalog_version, row['payload']
+
+    payload = build_payload(cursor, quiz_id)
+    if payload is None:
+        return None
+    payload_json = json.dumps(payload)
+    cursor.execute('''
+        INSERT INTO quiz_snapshots (quiz_id, catalog_version, payload, created_at)
+        VALUES (?, ?, ?, ?)
+    ''', (quiz_id, catalog_version, payload_json, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    return cursor.lastrowid, catalog_version, payload_json
+
+
+class SnapshotCache:
+    """
+    Per-worker LRU of decoded snapshots by version id, plus the current
+    version id of each quiz keyed on its catalog version. Snapshots never
+    change, so entries are only ever evicted, not invalidated.
+    """
+
+    def __init__(self, max_size: int = MAX_CACHED_SNAPSHOTS):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[int, Snapshot]" = OrderedDict()
+        self._current: Dict[int, Tuple[int, int]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, version_id: int, quiz_id: int, payload: Dict):
+        with self._lock:
+            self._snapshots[version_id] = (quiz_id, payload)
+            self._snapshots.move_to_end(version_id)
+            while len(self._snapshots) > self.max_size:
+                evicted, (evicted_quiz, _) = self._snapshots.popitem(last=False)
+                if self._current.get(evicted_quiz, (None, None))[1] == evicted:
+                    del self._current[evicted_quiz]
+
+    def _cached(self, version_id: int) -> Optional[Snapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(version_id)
+            if snapshot is not None:
+                self._snapshots.move_to_end(version_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return snapshot
+
+    def get(self, version_id: int) -> Optional[Snapshot]:
+        """(quiz id, payload) of a version, or None if there is no such version"""
+        snapshot = self._cached(version_id)
+        if snapshot is not None:
+            return snapshot
+
+        conn = get_db_connection()
+        try:
+            row = conn.execute(
+                "SELECT quiz_id, payload FROM quiz_snapshots WHERE id = ?", (version_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        payload = json.loads(row['payload'])
+        self._store(version_id, row['quiz_id'], payload)
+        return row['quiz_id'], payload
+
+    @staticmethod
+    def _read_current(quiz_id: int) -> Optional[Tuple[int, int, str]]:
+        conn = get_db_connection()
+        try:
+            return read_current(conn, quiz_id)
+        finally:
+            conn.close()
+
+    async def current(self, quiz_id: int) -> Optional[Snapshot]:
+        """(version id, payload) of the quiz now, or None if it does not exist"""
+        catalog_version, _ = catalog_versions.quiz(quiz_id)
+        with self._lock:
+            known = self._current.get(quiz_id)
+        if known is not None and known[0] == catalog_version:
+            snapshot = self._cached(known[1])
+            if snapshot is not None:
+                return known[1], snapshot[1]
+
+        try:
+            stored = await run_in_threadpool(self._read_current, quiz_id)
+        except NoSnapshot:
+            async with get_admission_controller().write_slot():
+                stored = await write_retry.run_async(snapshot_current, quiz_id)
+        if stored is None:
+            return None
+        version_id, catalog_version, payload_json = stored
+        payload = json.loads(payload_json)
+        self._store(version_id, quiz_id, payload)
+        with self._lock:
+            self._current[quiz_id] = (catalog_version, version_id)
+        return version_id, payload
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'snapshots': len(self._snapshots),
+                'quizzes': len(self._current),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+snapshot_cache = SnapshotCache()
@@ -0,0 +1,224 @@
+"""Precomputed "next quiz" recommendations per user.
+
+Candidate lists live in ``user_recommendations`` keyed by user id, so a
+lookup is one primary-key read. A list is recomputed in the background
+after the user saves a result, and lazily on read when it was built from an
+older catalog version (see ``app.services.catalog``).
+
+Candidates are quizzes the user has not taken, scored by:
+
+- preference: share of the user's results in the quiz's category
+- weakness: how far the user's average in that category is below 100
+- difficulty fit: closeness to the next difficulty step for the category,
+  which moves up once the user averages PROMOTE_SCORE at the current one
+
+New users get the easiest quizzes of the most played categories.
+"""
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.core.retry import DatabaseBusy, write_retry
+from app.services import catalog, shards
+from app.services.archive import attach_partitions
+
+DIFFICULTY_LEVELS = ('easy', 'medium', 'hard')
+PROMOTE_SCORE = 80.0
+MAX_RECOMMENDATIONS = 10
+MAX_PER_CATEGORY = 3
+
+PREFERENCE_WEIGHT = 1.0
+WEAKNESS_WEIGHT = 1.0
+DIFFICULTY_WEIGHT = 1.5
+
+
+def ensure_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_recommendations (
+            user_id INTEGER PRIMARY KEY,
+            catalog_version INTEGER NOT NULL,
+            quiz_ids TEXT NOT NULL,
+            computed_at TEXT NOT NULL
+        )
+    ''')
+
+
+def _level(difficulty: str) -> int:
+    try:
+        return DIFFICULTY_LEVELS.index((difficulty or '').strip().lower())
+    except ValueError:
+        return 1
+
+
+def compute(cursor, user_id: int, limit: int = MAX_RECOMMENDATIONS) -> List[int]:
+    """
+    Ranked quiz ids for a user, computed from their results and the catalog.
+    The connection must have the all_quiz_results view attached.
+    """
+    cursor.execute('''
+        SELECT q.category, q.difficulty, COUNT(*) as plays, AVG(qr.score) as average_score
+        FROM all_quiz_results qr
+        JOIN quiz q ON qr.quiz_id = q.id
+        WHERE qr.user_id = ?
+        GROUP BY q.category, q.difficulty
+    ''', (user_id,))
+    history = cursor.fetchall()
+
+    cursor.execute("SELECT DISTINCT quiz_id FROM all_quiz_results WHERE user_id = ?", (user_id,))
+    taken = {row['quiz_id'] for row in cursor.fetchall()}
+
+    cursor.execute("SELECT id, category, difficulty FROM quiz")
+    candidates = [row for row in cursor.fetchall() if row['id'] not in taken]
+
+    if not history:
+        return _cold_start(cursor, candidates, limit)
+
+    total_plays = sum(row['plays'] for row in history)
+    categories: Dict[str, Dict] = {}
+    for row in history:
+        stats = categories.setdefault(row['category'], {'plays': 0, 'score_sum': 0.0, 'top_level': 0})
+        stats['plays'] += row['plays']
+        stats['score_sum'] += row['average_score'] * row['plays']
+        level = _level(row['difficulty'])
+        if level >= stats['top_level']:
+            stats['top_level'] = level
+            stats['top_average'] = row['average_score']
+
+    targets = {}
+    for category, stats in categories.items():
+        stats['average'] = stats['score_sum'] / stats['plays']
+        target = stats['top_level']
+        if stats['top_average'] >= PROMOTE_SCORE:
+            target = min(target + 1, len(DIFFICULTY_LEVELS) - 1)
+        targets[category] = target
+
+    scored = []
+    for quiz in candidates:
+        stats = categories.get(quiz['category'])
+        if stats:
+            preference = stats['plays'] / total_plays
+            weakness = 1 - min(stats['average'], 100.0) / 100
+            target = targets[quiz['category']]
+        else:
+            # Unplayed category: no preference, start it at the bottom
+            preference = 0.0
+            weakness = 0.5
+            target = 0
+        fit = 1 / (1 + abs(_level(quiz['difficulty']) - target))
+        score = (
+            PREFERENCE_WEIGHT * preference
+            + WEAKNESS_WEIGHT * weakness
+            + DIFFICULTY_WEIGHT * fit
+        )
+        scored.append((score, quiz))
+
+    scored.sort(key=lambda item: (-item[0], item[1]['id']))
+    return _diversify([quiz for _, quiz in scored], limit)
+
+
+def _cold_start(cursor, candidates, limit: int) -> List[int]:
+    cursor.execute('''
+        SELECT q.category, COUNT(*) as plays
+        FROM all_quiz_results qr
+        JOIN quiz q ON qr.quiz_id = q.id
+        GROUP BY q.category
+    ''')
+    popularity = {row['category']: row['plays'] for row in cursor.fetchall()}
+    ranked = sorted(
+        candidates,
+        key=lambda quiz: (
+            _level(quiz['difficulty']),
+            -popularity.get(quiz['category'], 0),
+            quiz['id']
+        )
+    )
+    return _diversify(ranked, limit)
+
+
+def _diversify(ranked, limit: int) -> List[int]:
+    picked = []
+    per_category: Dict[str, int] = {}
+    for quiz in ranked:
+        if per_category.get(quiz['category'], 0) >= MAX_PER_CATEGORY:
+            continue
+        per_category[quiz['category']] = per_category.get(quiz['category'], 0) + 1
+        picked.append(quiz['id'])
+        if len(picked) == limit:
+            break
+    return picked
+
+
+def refresh(conn, user_id: int) -> List[int]:
+    """Recompute and store a user's list"""
+    cursor = conn.cursor()
+    version = catalog.get_version(cursor)
+    quiz_ids = compute(cursor, user_id)
+    cursor.execute('''
+        INSERT INTO user_recommendations (user_id, catalog_version, quiz_ids, computed_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            catalog_version = excluded.catalog_version,
+            quiz_ids = excluded.quiz_ids,
+            computed_at = excluded.computed_at
+    ''', (user_id, version, json.dumps(quiz_ids), datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    conn.commit()
+    return quiz_ids
+
+
+def _refresh_attached(conn, user_id: int) -> List[int]:
+    attach_partitions(conn)
+    return refresh(conn, user_id)
+
+
+def refresh_in_background(user_id: int):
+    """
+    BackgroundTasks entry point; runs through write_retry on its own
+    connection to the user's database. A list still busy after the retries is left for the next
+    read, which recomputes it if the catalog has moved on.
+    """
+    try:
+        write_retry.run(_refresh_attached, user_id, connect=shards.user_connector(user_id))
+    except DatabaseBusy:
+        pass
+
+
+def get_recommendations(conn, user_id: int, limit: Optional[int] = None) -> Dict:
+    """
+    Stored recommendations with quiz details, recomputed first if missing or
+    built from an older catalog version.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT catalog_version, quiz_ids, computed_at FROM user_recommendations WHERE user_id = ?",
+        (user_id,)
+    )
+    row = cursor.fetchone()
+    version = catalog.get_version(cursor)
+
+    if row and row['catalog_version'] == version:
+        quiz_ids = json.loads(row['quiz_ids'])
+        computed_at = row['computed_at']
+        refreshed = False
+    else:
+        attach_partitions(conn)
+        quiz_ids = refresh(conn, user_id)
+        computed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        refreshed = True
+
+    if limit is not None:
+        quiz_ids = quiz_ids[:limit]
+
+    quizzes = []
+    if quiz_ids:
+        placeholders = ','.join('?' * len(quiz_ids))
+        cursor.execute(f"SELECT * FROM quiz WHERE id IN ({placeholders})", quiz_ids)
+        by_id = {quiz['id']: dict(quiz) for quiz in cursor.fetchall()}
+        quizzes = [by_id[quiz_id] for quiz_id in quiz_ids if quiz_id in by_id]
+
+    return {
+        'user_id': user_id,
+        'recommendations': quizzes,
+        'catalog_version': version,
+        'computed_at': computed_at,
+        'refreshed': refreshed
+    }
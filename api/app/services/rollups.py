@@ -0,0 +1,231 @@
+"""Daily completion rollups per quiz and per category.
+
+Each saved result adds to one row in ``daily_quiz_rollup`` and one in
+``daily_category_rollup`` in the same transaction, so dashboards read a
+few hundred pre-aggregated rows instead of grouping all of quiz_results.
+Rebuild both tables from scratch with::
+
+    python -m app.services.rollups
+
+With sharded user data (see ``app.services.shards``) every shard keeps the
+rollups of its own results and ``query_daily`` adds them to trivia.db's.
+"""
+import time
+from typing import Dict, List, Optional
+
+from app.services import shards
+from app.services.archive import attach_partitions, get_results_connection
+
+GROUPINGS = {
+    'quiz': ('daily_quiz_rollup', 'quiz_id'),
+    'category': ('daily_category_rollup', 'category'),
+}
+
+# Upper bound for "every result after the scan"; SQLite rowids are 64-bit
+MAX_RESULT_ID = 2 ** 63 - 1
+
+
+def ensure_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_quiz_rollup (
+            day TEXT NOT NULL,
+            quiz_id INTEGER NOT NULL,
+            completions INTEGER NOT NULL DEFAULT 0,
+            score_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, quiz_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_category_rollup (
+            day TEXT NOT NULL,
+            category TEXT NOT NULL,
+            completions INTEGER NOT NULL DEFAULT 0,
+            score_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, category)
+        ) WITHOUT ROWID
+    ''')
+
+
+def record_result(cursor, quiz_id: int, score: float, completed_at: str):
+    """
+    Add one result to both rollups. Call on the cursor that inserted the
+    result, before commit.
+    """
+    day = completed_at[:10]
+    cursor.execute('''
+        INSERT INTO daily_quiz_rollup (day, quiz_id, completions, score_sum)
+        VALUES (?, ?, 1, ?)
+        ON CONFLICT(day, quiz_id) DO UPDATE SET
+            completions = completions + 1,
+            score_sum = score_sum + excluded.score_sum
+    ''', (day, quiz_id, score))
+    cursor.execute('''
+        INSERT INTO daily_category_rollup (day, category, completions, score_sum)
+        SELECT ?, category, 1, ? FROM quiz WHERE id = ?
+        ON CONFLICT(day, category) DO UPDATE SET
+            completions = completions + 1,
+            score_sum = score_sum + excluded.score_sum
+    ''', (day, score, quiz_id))
+
+
+# Per-day sums over a range of result ids; {source} is a results table or view
+QUIZ_SUMS = '''
+    SELECT substr(completed_at, 1, 10), quiz_id, COUNT(*), SUM(score)
+    FROM {source}
+    WHERE id > ? AND id <= ?
+    GROUP BY 1, 2
+'''
+CATEGORY_SUMS = '''
+    SELECT substr(qr.completed_at, 1, 10), q.category, COUNT(*), SUM(qr.score)
+    FROM {source} qr
+    JOIN quiz q ON qr.quiz_id = q.id
+    WHERE qr.id > ? AND qr.id <= ?
+    GROUP BY 1, 2
+'''
+SUMS = {'quiz': QUIZ_SUMS, 'category': CATEGORY_SUMS}
+
+
+def rebuild(conn) -> Dict:
+    """
+    Rebuild both of the connection's rollups from the results in its
+    all_quiz_results view.
+
+    The full scans, up to the highest result id seen at the start, fill
+    temp tables without holding the write lock. The rollups are then
+    swapped in a single write transaction, which also adds the results
+    saved while the scans were running.
+    """
+    started = time.perf_counter()
+
+    try:
+        ensure_schema(conn)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM all_quiz_results")
+        upper_id = cursor.fetchone()[0]
+
+        for name, (table, key_column) in GROUPINGS.items():
+            cursor.execute(f"DROP TABLE IF EXISTS temp.{table}_build")
+            cursor.execute(
+                f"CREATE TEMP TABLE {table}_build (day, {key_column}, completions, score_sum)"
+            )
+            cursor.execute(
+                f"INSERT INTO temp.{table}_build "
+                + SUMS[name].format(source='all_quiz_results'),
+                (0, upper_id)
+            )
+        conn.commit()
+
+        conn.execute("BEGIN IMMEDIATE")
+        rows = {}
+        for name, (table, key_column) in GROUPINGS.items():
+            cursor.execute(f"DELETE FROM main.{table}")
+            cursor.execute(f"INSERT INTO main.{table} SELECT * FROM temp.{table}_build")
+            rows[name] = cursor.rowcount
+
+            # Results saved during the scans are only in quiz_results
+            cursor.execute(f'''
+                INSERT INTO main.{table} (day, {key_column}, completions, score_sum)
+                {SUMS[name].format(source='main.quiz_results')}
+                ON CONFLICT(day, {key_column}) DO UPDATE SET
+                    completions = completions + excluded.completions,
+                    score_sum = score_sum + excluded.score_sum
+            ''', (upper_id, MAX_RESULT_ID))
+        cursor.execute(
+            "SELECT COUNT(*) FROM main.quiz_results WHERE id > ?", (upper_id,)
+        )
+        late_results = cursor.fetchone()[0]
+        conn.commit()
+
+        return {
+            'upper_result_id': upper_id,
+            'late_results': late_results,
+            'quiz_rows': rows['quiz'],
+            'category_rows': rows['category'],
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        for table, _ in GROUPINGS.values():
+            conn.execute(f"DROP TABLE IF EXISTS temp.{table}_build")
+
+
+def backfill(conn=None) -> Dict:
+    """
+    Rebuild both rollups from all results, archived ones included: in
+    trivia.db (or ``conn``), then in each user data shard
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_results_connection()
+    try:
+        attach_partitions(conn)
+        summary = rebuild(conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+    if own_conn and shards.enabled():
+        summary['shards'] = [rebuild(shard) for shard in shards.each_shard()]
+    return summary
+
+
+def query_daily(
+    cursor,
+    group_by: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    key: Optional[str] = None
+) -> List[Dict]:
+    """
+    Daily completions and average score, one row per day and group.
+
+    ``start`` and ``end`` are inclusive YYYY-MM-DD days; ``key`` restricts
+    the result to one quiz id or category.
+    """
+    table, key_column = GROUPINGS[group_by]
+    conditions = []
+    params: List = []
+    if start:
+        conditions.append("day >= ?")
+        params.append(start)
+    if end:
+        conditions.append("day <= ?")
+        params.append(end)
+    if key is not None:
+        conditions.append(f"{key_column} = ?")
+        params.append(key)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    query = f'''
+        SELECT day, {key_column}, completions, score_sum / completions as average_score
+        FROM {table}
+        {where}
+        ORDER BY day, {key_column}
+    '''
+    cursor.execute(query, params)
+    series = [dict(row) for row in cursor.fetchall()]
+    if not shards.enabled():
+        return series
+
+    # Add up the shards' rows for the same day and group
+    merged = {(row['day'], row[key_column]): row for row in series}
+    for shard in shards.each_shard():
+        for row in shard.execute(query, params).fetchall():
+            total = merged.get((row['day'], row[key_column]))
+            if total is None:
+                merged[(row['day'], row[key_column])] = dict(row)
+                continue
+            completions = total['completions'] + row['completions']
+            total['average_score'] = (
+                total['average_score'] * total['completions']
+                + row['average_score'] * row['completions']
+            ) / completions
+            total['completions'] = completions
+    return [merged[key] for key in sorted(merged)]
+
+
+if __name__ == '__main__':
+    print("Rebuilding daily rollups...")
+    print(backfill())
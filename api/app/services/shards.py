@@ -0,0 +1,539 @@
+"""Optional hash sharding of per-user data across several SQLite files.
+
+SQLite allows one writer per database file, so while every result is saved
+into trivia.db, result saves queue behind each other however many workers
+serve the API. With ``USER_SHARDS`` set to N > 0 the per-user tables live in
+N shard files under ``SHARD_DIR`` instead, each with its own write lock:
+
+- ``users``, ``quiz_results`` and ``user_recommendations``
+- ``user_emails``, the email to user id index
+- ``question_choice_stats`` and the daily rollups, counting the results
+  stored in that shard; readers add them up over trivia.db and every shard
+
+The catalog (quizzes, questions, catalog versions, dedup signatures, play
+sessions, the archive registry) stays in trivia.db. Shard connections
+attach it as ``catalog``; a shard's own tables shadow the trivia.db tables
+of the same name, so the existing queries run unchanged on either.
+
+Routing goes through BUCKETS fixed buckets, so resharding moves whole
+buckets. A user id's bucket is ``id % BUCKETS`` and an email's a CRC32 of
+the email; bucket b lives in shard ``b % N``. A user's rows are placed by
+the id's bucket and their ``user_emails`` entry by the email's. New user
+ids are drawn from the email's bucket (``counter * BUCKETS + bucket``), so
+for them both land in one shard and signup is a single-shard transaction.
+Result ids are ``counter * BUCKETS + shard index`` with a per-shard counter
+that never falls behind the clock in milliseconds, so they increase within
+a shard and follow save time across shards, as the backfills and the
+export's ``after_id`` expect. Counters start above every id issued before.
+
+Results saved before sharding that were archived stay in the archive
+partitions and are still counted by trivia.db's aggregates; trivia.db also
+keeps its ``users`` table for them. Archiving does not move shard results,
+so startup refuses ``ARCHIVE_ENABLED`` together with ``USER_SHARDS`` and
+the archive mover refuses to run while shards are configured.
+
+The layout in use is recorded in trivia.db and startup refuses to run
+with a different ``USER_SHARDS``. Resharding is offline (stop the API)::
+
+    python -m app.services.shards --reshard 4   # from trivia.db or any other count
+    python -m app.services.shards --reshard 0   # back into trivia.db
+    python -m app.services.shards --info
+"""
+import argparse
+import os
+import sqlite3
+import time
+import zlib
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.core.config import get_settings
+from app import database
+from app.database import get_db_connection
+from app.services.archive import (
+    RESULT_COLUMNS, VIEW_NAME, add_version_column, attach_partitions, get_results_connection
+)
+
+DB_PATH = 'trivia.db'
+CATALOG_SCHEMA = 'catalog'
+BUCKETS = 1024
+
+# Tables that move with a user: the column holding the user id, and the columns copied
+USER_TABLES = {
+    'users': ('id', ('id', 'email', 'created_at')),
+    'quiz_results': ('user_id', RESULT_COLUMNS),
+    'user_recommendations': ('user_id', ('user_id', 'catalog_version', 'quiz_ids', 'computed_at')),
+}
+# Tables whose ids come from id_sequences counters
+SEQUENCED_TABLES = ('users', 'quiz_results')
+
+
+def ensure_schema(conn):
+    """Layout record in trivia.db"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_shard_layout (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            shards INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+
+
+def ensure_shard_schema(conn):
+    """Tables of one shard file"""
+    from app.services import answer_stats, recommendations, rollups, user_directory
+
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            email TEXT,
+            created_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quiz_results (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            quiz_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            answers TEXT NOT NULL,
+            completed_at TEXT NOT NULL,
+            quiz_version_id INTEGER
+        )
+    ''')
+    add_version_column(conn)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_quiz_results_user ON quiz_results (user_id, completed_at)"
+    )
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_emails (
+            email TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS id_sequences (
+            name TEXT NOT NULL,
+            slot INTEGER NOT NULL,
+            last INTEGER NOT NULL,
+            PRIMARY KEY (name, slot)
+        ) WITHOUT ROWID
+    ''')
+    answer_stats.ensure_schema(conn)
+    recommendations.ensure_schema(conn)
+    rollups.ensure_schema(conn)
+    user_directory.ensure_schema(conn)
+
+
+def shard_count() -> int:
+    return get_settings().USER_SHARDS
+
+
+def enabled() -> bool:
+    return shard_count() > 0
+
+
+def email_bucket(email: str) -> int:
+    return zlib.crc32(email.encode()) % BUCKETS
+
+
+def user_bucket(user_id: int) -> int:
+    return user_id % BUCKETS
+
+
+def shard_of(bucket: int, shards: Optional[int] = None) -> int:
+    return bucket % (shards or shard_count())
+
+
+def shard_path(index: int, shards: Optional[int] = None) -> str:
+    """Files are named after the layout too, so a reshard never writes over a live shard"""
+    shards = shards or shard_count()
+    return os.path.join(get_settings().SHARD_DIR, f"users_{shards}_{index}.db")
+
+
+def _open(path: str, check_same_thread=True):
+    conn = sqlite3.connect(
+        path, timeout=get_settings().DB_BUSY_TIMEOUT, check_same_thread=check_same_thread
+    )
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _own_results_view(conn):
+    conn.execute(f"DROP VIEW IF EXISTS temp.{VIEW_NAME}")
+    conn.execute(
+        f"CREATE TEMP VIEW {VIEW_NAME} AS SELECT {', '.join(RESULT_COLUMNS)} FROM main.quiz_results"
+    )
+
+
+def connect(index: int, check_same_thread=True):
+    """
+    Connection to shard ``index`` with trivia.db attached as ``catalog``.
+    Its all_quiz_results view covers the shard's own results only.
+    """
+    conn = _open(shard_path(index), check_same_thread)
+    try:
+        conn.execute(f"ATTACH DATABASE ? AS {CATALOG_SCHEMA}", (DB_PATH,))
+        _own_results_view(conn)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def each_shard(check_same_thread=True) -> Iterator:
+    """Yield a connection to every shard in turn, closing each after use"""
+    for index in range(shard_count()):
+        conn = connect(index, check_same_thread)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def user_connector(user_id: int) -> Callable:
+    """Connection factory for write transactions on a user's data (see ``write_retry``)"""
+    if not enabled():
+        return get_db_connection
+    index = shard_of(user_bucket(user_id))
+    return lambda: connect(index)
+
+
+def email_connector(email: str) -> Callable:
+    """Connection factory for the database holding an email's user id"""
+    if not enabled():
+        return get_db_connection
+    index = shard_of(email_bucket(email))
+    return lambda: connect(index)
+
+
+def user_connection(user_id: int, check_same_thread=True):
+    """
+    Connection to the database holding a user's data, with the archive
+    partitions attached, so all_quiz_results has their full history.
+    """
+    if not enabled():
+        return get_results_connection(check_same_thread=check_same_thread)
+    conn = connect(shard_of(user_bucket(user_id)), check_same_thread)
+    try:
+        attach_partitions(conn)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def _next_id(cursor, table: str, slot: int, minimum: int) -> int:
+    cursor.execute('''
+        INSERT INTO id_sequences (name, slot, last) VALUES (?, ?, MAX(1, ?))
+        ON CONFLICT(name, slot) DO UPDATE SET last = MAX(last + 1, excluded.last)
+        RETURNING last
+    ''', (table, slot, minimum))
+    return cursor.fetchone()[0] * BUCKETS + slot
+
+
+def next_user_id(cursor, email: str) -> Optional[int]:
+    """
+    Id for a new user, or None when sharding is off and SQLite assigns it.
+    Call inside the transaction that inserts the user, on the email's shard.
+    """
+    if not enabled():
+        return None
+    return _next_id(cursor, 'users', email_bucket(email), 0)
+
+
+def next_result_id(cursor, user_id: int) -> Optional[int]:
+    """Id for a new result, or None when sharding is off; on the user's shard"""
+    if not enabled():
+        return None
+    return _next_id(
+        cursor, 'quiz_results', shard_of(user_bucket(user_id)), int(time.time() * 1000)
+    )
+
+
+def stored_layout(cursor) -> int:
+    cursor.execute("SELECT shards FROM user_shard_layout WHERE id = 1")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _set_layout(cursor, shards: int):
+    cursor.execute('''
+        INSERT INTO user_shard_layout (id, shards, updated_at) VALUES (1, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET shards = excluded.shards, updated_at = excluded.updated_at
+    ''', (shards, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+
+def _has_user_data(cursor) -> bool:
+    cursor.execute('''
+        SELECT EXISTS (SELECT 1 FROM users)
+            OR EXISTS (SELECT 1 FROM quiz_results)
+            OR EXISTS (SELECT 1 FROM result_partitions)
+    ''')
+    return bool(cursor.fetchone()[0])
+
+
+def prepare(conn):
+    """
+    Startup check, called from init_db after the trivia.db schema exists.
+    USER_SHARDS must match the recorded layout; an install without any
+    user data yet is switched to it directly, since nothing has to move.
+    """
+    ensure_schema(conn)
+    cursor = conn.cursor()
+    wanted = shard_count()
+    current = stored_layout(cursor)
+    if wanted != current:
+        if current == 0 and not _has_user_data(cursor):
+            _set_layout(cursor, wanted)
+            conn.commit()
+        else:
+            raise RuntimeError(
+                f"USER_SHARDS is {wanted} but user data is laid out for {current} shards; "
+                f"stop the API and run python -m app.services.shards --reshard {wanted}"
+            )
+    if wanted and get_settings().ARCHIVE_ENABLED:
+        raise RuntimeError(
+            f"ARCHIVE_ENABLED is set, but archiving only moves results stored in trivia.db and "
+            f"with USER_SHARDS={wanted} they are in the shard files; unset ARCHIVE_ENABLED"
+        )
+
+    if wanted:
+        os.makedirs(get_settings().SHARD_DIR, exist_ok=True)
+        for index in range(wanted):
+            shard = _open(shard_path(index, wanted))
+            try:
+                ensure_shard_schema(shard)
+                shard.commit()
+            finally:
+                shard.close()
+
+
+def _has_table(conn, schema: str, table: str) -> bool:
+    return conn.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def _sequence_floors(conn, sources: List[str]) -> Dict[str, int]:
+    """
+    Per table, the counter value above which new ids clear every id
+    issued so far: in the sources, in the archive partitions and by
+    earlier counters.
+    """
+    floors = dict.fromkeys(SEQUENCED_TABLES, 0)
+    for source in sources:
+        conn.execute("ATTACH DATABASE ? AS source", (source,))
+        try:
+            counters = _has_table(conn, 'source', 'id_sequences')
+            for table in SEQUENCED_TABLES:
+                highest = conn.execute(
+                    f"SELECT COALESCE(MAX(id), 0) FROM source.{table}"
+                ).fetchone()[0]
+                floors[table] = max(floors[table], highest // BUCKETS)
+                if counters:
+                    floors[table] = max(floors[table], conn.execute(
+                        "SELECT COALESCE(MAX(last), 0) FROM source.id_sequences WHERE name = ?",
+                        (table,)
+                    ).fetchone()[0])
+        finally:
+            conn.execute("DETACH DATABASE source")
+
+    catalog = get_db_connection()
+    try:
+        attach_partitions(catalog)
+        for row in catalog.execute("PRAGMA database_list").fetchall():
+            if row[1].startswith('part_'):
+                highest = catalog.execute(
+                    f"SELECT COALESCE(MAX(id), 0) FROM {row[1]}.quiz_results"
+                ).fetchone()[0]
+                floors['quiz_results'] = max(floors['quiz_results'], highest // BUCKETS)
+    finally:
+        catalog.close()
+
+    return floors
+
+
+def _copy_user_tables(conn, source: str, where: str, params, replace: bool):
+    verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+    conn.execute("ATTACH DATABASE ? AS source", (source,))
+    try:
+        add_version_column(conn, 'source')
+        for table, (key, columns) in USER_TABLES.items():
+            names = ', '.join(columns)
+            conn.execute(
+                f"{verb} INTO main.{table} ({names}) "
+                f"SELECT {names} FROM source.{table} WHERE {where.format(key=key)}",
+                params
+            )
+        conn.commit()
+    finally:
+        conn.execute("DETACH DATABASE source")
+
+
+def _fill_shard(index: int, target: int, sources: List[str], floors: Dict[str, int]) -> Dict:
+    from app.services import answer_stats, rollups
+
+    path = shard_path(index, target)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    conn = _open(path)
+    try:
+        ensure_shard_schema(conn)
+        conn.commit()
+        conn.create_function('email_bucket', 1, email_bucket, deterministic=True)
+
+        for source in sources:
+            _copy_user_tables(
+                conn, source, f"{{key}} % {BUCKETS} % ? = ?", (target, index), replace=False
+            )
+            conn.execute("ATTACH DATABASE ? AS source", (source,))
+            try:
+                conn.execute('''
+                    INSERT OR IGNORE INTO main.user_emails (email, user_id)
+                    SELECT email, id FROM source.users
+                    WHERE email IS NOT NULL AND email_bucket(email) % ? = ?
+                ''', (target, index))
+                conn.commit()
+            finally:
+                conn.execute("DETACH DATABASE source")
+
+        conn.executemany(
+            "INSERT INTO id_sequences (name, slot, last) VALUES (?, ?, ?)",
+            [('users', bucket, floors['users']) for bucket in range(index, BUCKETS, target)]
+            + [('quiz_results', index, floors['quiz_results'])]
+        )
+        conn.commit()
+
+        conn.execute(f"ATTACH DATABASE ? AS {CATALOG_SCHEMA}", (DB_PATH,))
+        _own_results_view(conn)
+        rollups.rebuild(conn)
+        answer_stats.rebuild(conn)
+
+        return {
+            table: conn.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()[0]
+            for table in USER_TABLES
+        }
+    finally:
+        conn.close()
+
+
+def _remove_layout(shards: int):
+    for index in range(shards):
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(shard_path(index, shards) + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def reshard(target: int) -> Dict:
+    """
+    Move all per-user data to a layout of ``target`` shards, 0 meaning back
+    into trivia.db. Run it with the API stopped.
+
+    The new files are filled first, under names of their own, and the
+    switch is one commit in trivia.db recording the new layout (and, when
+    leaving trivia.db, deleting its copies of the moved rows). An
+    interrupted run leaves the old layout in use and can simply be rerun.
+    Aggregates are rebuilt for every database that gained or lost results.
+    """
+    from app.services import answer_stats, rollups
+
+    if target < 0 or target > BUCKETS:
+        raise ValueError(f"Shard count must be between 0 and {BUCKETS}")
+    started = time.perf_counter()
+
+    conn = get_db_connection()
+    try:
+        # The API may never have started on this database; init_db itself
+        # would refuse to run with USER_SHARDS not yet matching the layout
+        database.ensure_schema(conn)
+        cursor = conn.cursor()
+        current = stored_layout(cursor)
+        if target == current:
+            return {'shards': current, 'changed': False}
+
+        sources = [shard_path(index, current) for index in range(current)] if current else [DB_PATH]
+        floors = _sequence_floors(conn, sources)
+
+        shards = []
+        if target:
+            os.makedirs(get_settings().SHARD_DIR, exist_ok=True)
+            shards = [_fill_shard(index, target, sources, floors) for index in range(target)]
+        else:
+            # Rows are keyed by their ids, so copying again after an
+            # interruption is harmless
+            for source in sources:
+                _copy_user_tables(conn, source, "1", (), replace=True)
+
+        conn.execute("BEGIN IMMEDIATE")
+        if current == 0:
+            # trivia.db keeps its users for joins against archived results
+            cursor.execute("DELETE FROM quiz_results")
+            cursor.execute("DELETE FROM user_recommendations")
+        _set_layout(cursor, target)
+        conn.commit()
+
+        attach_partitions(conn)
+        rollups.rebuild(conn)
+        answer_stats.rebuild(conn)
+    finally:
+        conn.close()
+
+    if current:
+        _remove_layout(current)
+
+    return {
+        'shards': target,
+        'previous_shards': current,
+        'changed': True,
+        'rows_per_shard': shards,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def info() -> Dict:
+    conn = get_db_connection()
+    try:
+        ensure_schema(conn)
+        current = stored_layout(conn.cursor())
+    finally:
+        conn.close()
+
+    layout = {'shards': current, 'configured': shard_count(), 'files': []}
+    for index in range(current):
+        shard = _open(shard_path(index, current))
+        try:
+            layout['files'].append({
+                'path': shard_path(index, current),
+                **{
+                    table: shard.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in USER_TABLES
+                }
+            })
+        finally:
+            shard.close()
+    return layout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hash-sharded user data")
+    parser.add_argument('--reshard', type=int, metavar='N',
+                        help="move user data to N shards (0: back into trivia.db); stop the API first")
+    parser.add_argument('--info', action='store_true', help="show the layout and row counts")
+    args = parser.parse_args()
+
+    if args.reshard is not None:
+        print(reshard(args.reshard))
+    elif args.info:
+        print(info())
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""Email to user id resolution shared by all user routes.
+
+Lookups go through an in-process LRU cache in front of the unique index on
+users.email, or with sharded user data (see ``app.services.shards``) the
+``user_emails`` index in the email's shard. Only existing users are
+cached, and since users are never deleted or re-keyed a cached id can not
+go stale.
+
+A database written before the unique index existed may hold several users
+with the same email. Startup then stops with the offending emails instead
+of failing on the index; merge them with the API stopped::
+
+    python -m app.services.user_directory --merge-duplicates
+"""
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.database import get_db_connection
+from app.services import archive, recommendations, shards
+
+# Duplicate emails named in the startup error
+REPORTED_DUPLICATES = 5
+
+
+class UserIdCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, email: str) -> Optional[int]:
+        with self._lock:
+            user_id = self._entries.get(email)
+            if user_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(email)
+            self.hits += 1
+            return user_id
+
+    def put(self, email: str, user_id: int):
+        with self._lock:
+            self._entries[email] = user_id
+            self._entries.move_to_end(email)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+user_id_cache = UserIdCache(get_settings().USER_CACHE_SIZE)
+
+
+def duplicate_emails(cursor) -> List[Tuple[str, List[int]]]:
+    """(email, user ids in ascending order) for every email held by more than one user"""
+    cursor.execute('''
+        SELECT email, GROUP_CONCAT(id) FROM (SELECT email, id FROM users ORDER BY id)
+        GROUP BY email
+        HAVING COUNT(*) > 1
+        ORDER BY email
+    ''')
+    return [(row[0], [int(user_id) for user_id in row[1].split(',')]) for row in cursor.fetchall()]
+
+
+def ensure_schema(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_users_email'"
+    ).fetchone()
+    if exists:
+        return
+
+    duplicates = duplicate_emails(conn.cursor())
+    if duplicates:
+        named = ', '.join(
+            f"{email} (ids {', '.join(map(str, ids))})"
+            for email, ids in duplicates[:REPORTED_DUPLICATES]
+        )
+        more = len(duplicates) - REPORTED_DUPLICATES
+        raise RuntimeError(
+            f"{len(duplicates)} emails belong to more than one user, so the unique index on "
+            f"users.email can not be created: {named}{f' and {more} more' if more > 0 else ''}; "
+            "stop the API and run python -m app.services.user_directory --merge-duplicates"
+        )
+    conn.execute("CREATE UNIQUE INDEX idx_users_email ON users (email)")
+
+
+def merge_duplicates(conn) -> Dict:
+    """
+    Fold every group of users sharing an email into its lowest id, then
+    create the unique index, in one transaction on trivia.db. The group's
+    quiz results, archived ones included, move to that user, the other
+    users rows are deleted and the group's stored recommendations dropped
+    so they are recomputed from the merged history.
+    """
+    archive.ensure_schema(conn)
+    recommendations.ensure_schema(conn)
+    conn.commit()
+    archive.attach_partitions(conn)
+    schemas = [row[1] for row in conn.execute("PRAGMA database_list") if row[1] != 'temp']
+    cursor = conn.cursor()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        duplicates = duplicate_emails(cursor)
+        removed = 0
+        moved = 0
+        for _, (kept, *others) in duplicates:
+            placeholders = ', '.join('?' * len(others))
+            for schema in schemas:
+                cursor.execute(
+                    f"UPDATE {schema}.quiz_results SET user_id = ? WHERE user_id IN ({placeholders})",
+                    (kept, *others)
+                )
+                moved += cursor.rowcount
+            cursor.execute(
+                f"DELETE FROM user_recommendations WHERE user_id IN (?, {placeholders})",
+                (kept, *others)
+            )
+            cursor.execute(f"DELETE FROM users WHERE id IN ({placeholders})", others)
+            removed += len(others)
+        ensure_schema(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {'emails': len(duplicates), 'users_removed': removed, 'results_moved': moved}
+
+
+def resolve_user_id(cursor, email: str) -> Optional[int]:
+    """
+    User id for an email, or None if no such user exists. With sharded
+    user data the cursor must be on the email's shard.
+    """
+    user_id = user_id_cache.get(email)
+    if user_id is not None:
+        return user_id
+
+    if shards.enabled():
+        cursor.execute("SELECT user_id AS id FROM user_emails WHERE email = ?", (email,))
+    else:
+        cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
+    user = cursor.fetchone()
+    if not user:
+        return None
+
+    user_id_cache.put(email, user['id'])
+    return user['id']
+
+
+def find_user_id(email: str) -> Optional[int]:
+    """``resolve_user_id`` on a connection of its own, opened only on a cache miss"""
+    user_id = user_id_cache.get(email)
+    if user_id is not None:
+        return user_id
+
+    conn = shards.email_connector(email)()
+    try:
+        return resolve_user_id(conn.cursor(), email)
+    finally:
+        conn.close()
+
+
+def create_user(conn, email: str) -> Tuple[int, bool]:
+    """
+    Create a user unless one exists. Returns (user_id, created). ``conn``
+    is on the email's database (``shards.email_connector``).
+
+    The insert is a single INSERT ... ON CONFLICT, so concurrent signups
+    for the same email can not both create a row; with sharded user data
+    the email index entry is that insert, and the new user id is drawn
+    from the email's bucket so the users row goes to the same shard. It is
+    committed before the new id is cached.
+    """
+    user_id = user_id_cache.get(email)
+    if user_id is not None:
+        return user_id, False
+
+    cursor = conn.cursor()
+    created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if shards.enabled():
+        cursor.execute('''
+            INSERT INTO user_emails (email, user_id)
+            VALUES (?, ?)
+            ON CONFLICT(email) DO NOTHING
+            RETURNING user_id AS id
+        ''', (email, shards.next_user_id(cursor, email)))
+        inserted = cursor.fetchone()
+        if inserted:
+            cursor.execute(
+                "INSERT INTO users (id, email, created_at) VALUES (?, ?, ?)",
+                (inserted['id'], email, created_at)
+            )
+    else:
+        cursor.execute('''
+            INSERT INTO users (email, created_at)
+            VALUES (?, ?)
+            ON CONFLICT(email) DO NOTHING
+            RETURNING id
+        ''', (email, created_at))
+        inserted = cursor.fetchone()
+    conn.commit()
+
+    if inserted:
+        user_id_cache.put(email, inserted['id'])
+        return inserted['id'], True
+
+    return resolve_user_id(cursor, email), False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="User directory maintenance")
+    parser.add_argument('--merge-duplicates', action='store_true',
+                        help="merge users sharing an email into the lowest id; stop the API first")
+    args = parser.parse_args()
+
+    if args.merge_duplicates:
+        conn = get_db_connection()
+        try:
+            print(merge_duplicates(conn))
+        finally:
+            conn.close()
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Time catalog bundle export, load and question index preload.
+
+Builds a scratch database with --questions synthetic questions, exports it
+to a bundle, loads the bundle into a second, empty database and then fills
+the question index both from the bundle and from the questions table.
+
+    python benchmarks/catalog_bundle.py --questions 1000000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+from app.database import init_db  # noqa: E402
+from app.services import bundle  # noqa: E402
+from app.services.question_index import question_index  # noqa: E402
+
+QUESTIONS_PER_QUIZ = 10
+CATEGORIES = ['vegetables', 'fruits', 'herbs', 'grains', 'legumes', 'nuts', 'fungi', 'roots']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+
+
+def create_tables(path):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE quiz (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            image TEXT NOT NULL,
+            category TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quiz_id INTEGER NOT NULL,
+            question_text TEXT NOT NULL,
+            choices TEXT NOT NULL,
+            correct_answer_index INTEGER NOT NULL,
+            explanation TEXT NOT NULL,
+            category TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            image TEXT NOT NULL
+        );
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY,
+            email TEXT,
+            created_at TEXT
+        );
+        CREATE TABLE quiz_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            quiz_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            answers TEXT NOT NULL,
+            completed_at TEXT NOT NULL
+        );
+    ''')
+    conn.close()
+
+
+def fill(questions):
+    quizzes = (questions + QUESTIONS_PER_QUIZ - 1) // QUESTIONS_PER_QUIZ
+    conn = sqlite3.connect('trivia.db')
+    conn.executemany(
+        "INSERT INTO quiz (id, name, description, image, category, difficulty, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            (i, f"Quiz {i}", f"Description of quiz number {i}",
+             f"https://example.com/images/{i}.jpg", CATEGORIES[i % len(CATEGORIES)],
+             DIFFICULTIES[i % len(DIFFICULTIES)], '2025-03-20 12:00:00')
+            for i in range(1, quizzes + 1)
+        )
+    )
+    conn.executemany(
+        "INSERT INTO questions (id, quiz_id, question_text, choices, correct_answer_index, "
+        "explanation, category, difficulty, image) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (i, (i - 1) // QUESTIONS_PER_QUIZ + 1,
+             f"Which vegetable is number {i} in the garden?",
+             f'["Carrot {i}", "Leek {i}", "Kale {i}", "Okra {i}"]', i % 4,
+             f"Number {i} is always the {('carrot', 'leek', 'kale', 'okra')[i % 4]}.",
+             CATEGORIES[i % len(CATEGORIES)], DIFFICULTIES[i % len(DIFFICULTIES)], '')
+            for i in range(1, questions + 1)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(label, fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    print(f"{label:<28}{(time.perf_counter() - started):>8.2f} s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, 'source')
+        target = os.path.join(workdir, 'target')
+        path = os.path.join(workdir, 'catalog.vqcb')
+        for directory in (source, target):
+            os.makedirs(directory)
+            create_tables(os.path.join(directory, 'trivia.db'))
+
+        # get_db_connection opens trivia.db in the working directory
+        os.chdir(source)
+        init_db()
+        print(f"Building database with {args.questions} questions...")
+        fill(args.questions)
+        # Without signatures: hashing a million questions would dominate the timing
+        timed('export', bundle.export_bundle, path, signatures=False)
+        db_bytes = os.path.getsize('trivia.db')
+        print(f"{'trivia.db':<28}{db_bytes / 1e6:>8.1f} MB")
+        print(f"{'bundle':<28}{os.path.getsize(path) / 1e6:>8.1f} MB")
+
+        os.chdir(target)
+        init_db()
+        timed('load into empty database', bundle.load_bundle, path)
+        result = timed('preload from bundle (mmap)', bundle.preload_question_index, path)
+        if not result['loaded']:
+            sys.exit(f"Preload was skipped: {result['reason']}")
+        timed('load from questions table', question_index.load)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Latency of a light route while a large question import runs.
+
+Posts one --questions body to POST /api/questions/bulk with near-duplicate
+screening on, while a probe thread requests GET /api/categories every
+--interval seconds, first with COMPUTE_WORKERS=0 (MinHash signatures in the
+threadpool, competing with the event loop for the GIL) and then with
+--workers pool processes. Each mode runs in its own process against a fresh
+scratch database. On a single core the pool only wins the GIL back, not CPU.
+
+    python benchmarks/compute_latency.py --questions 5000 --workers 2
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+
+WORDS = (
+    'carrot leek kale okra beet turnip radish fennel celery pepper squash onion garlic '
+    'spinach lettuce cabbage pumpkin potato tomato cucumber parsnip chard endive '
+    'which where grown first season soil root leaf seed harvest market famous'
+).split()
+
+
+def build_body(count):
+    """Distinct question texts, so screening finds few near-duplicates"""
+    rng = random.Random(count)
+    return json.dumps([
+        {
+            'quiz_id': 1,
+            'question_text': ' '.join(rng.choice(WORDS) for _ in range(12)) + '?',
+            'choices': ['Carrot', 'Leek', 'Kale', 'Okra'],
+            'correct_answer_index': i % 4,
+            'explanation': 'Carrots were planted this season.',
+            'category': 'Vegetables',
+            'difficulty': 'easy',
+            'image': f"https://example.com/beds/{i}.jpg"
+        }
+        for i in range(count)
+    ]).encode()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(questions, interval):
+    sys.path.insert(0, API_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    from question_ingest import create_tables
+
+    from fastapi.testclient import TestClient
+    import run
+    from app.core.compute import compute_pool
+
+    create_tables('trivia.db')
+    body = build_body(questions)
+    probes = []
+    done = threading.Event()
+
+    with TestClient(run.app) as client:
+        client.get('/api/categories').raise_for_status()
+
+        def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                client.get('/api/categories')
+                probes.append((time.perf_counter() - started) * 1000)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=probe)
+        thread.start()
+        time.sleep(0.2)
+        started = time.perf_counter()
+        response = client.post(
+            '/api/questions/bulk', content=body, headers={'content-type': 'application/json'}
+        )
+        elapsed = time.perf_counter() - started
+        time.sleep(0.2)
+        done.set()
+        thread.join()
+        response.raise_for_status()
+
+    print(json.dumps({'import_s': elapsed, 'probes': probes, 'compute': compute_pool.snapshot()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--interval', type=float, default=0.01)
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.questions, args.interval)
+        return
+
+    print(f"{args.questions} questions; probe GET /api/categories every {args.interval * 1000:.0f} ms")
+    print(f"{'mode':<14}{'import s':>10}{'probes':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, workers in (('inline', 0), (f'pool x{args.workers}', args.workers)):
+        with tempfile.TemporaryDirectory() as workdir:
+            env = {
+                **os.environ,
+                'COMPUTE_WORKERS': str(workers),
+                'ADMISSION_ENABLED': 'false',
+                'MAINTENANCE_ENABLED': 'false',
+            }
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--measure',
+                 '--questions', str(args.questions), '--interval', str(args.interval)],
+                cwd=workdir, env=env, capture_output=True, text=True, check=True
+            ).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        probes = report['probes']
+        print(f"{label:<14}{report['import_s']:>10.2f}{len(probes):>8}"
+              f"{percentile(probes, 0.5):>10.1f}{percentile(probes, 0.99):>10.1f}"
+              f"{max(probes, default=0):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
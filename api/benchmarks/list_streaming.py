@@ -0,0 +1,156 @@
+"""Compare buffered and streamed GET /api/quizzes.
+
+Builds a scratch database with --rows quizzes, then serves the request in a
+fresh subprocess per mode so each peak RSS is measured in isolation. The
+ASGI app is driven directly, which keeps HTTP client overhead out of the
+time-to-first-byte numbers.
+
+    python benchmarks/list_streaming.py --rows 200000
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'buffered': '',
+    'stream-json': 'stream=json',
+    'stream-ndjson': 'stream=ndjson',
+}
+
+
+def build_database(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE quiz (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            image TEXT NOT NULL,
+            category TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quiz_id INTEGER NOT NULL,
+            question_text TEXT NOT NULL,
+            choices TEXT NOT NULL,
+            correct_answer_index INTEGER NOT NULL,
+            explanation TEXT NOT NULL,
+            category TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            image TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY,
+            email TEXT,
+            created_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE quiz_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            quiz_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            answers TEXT NOT NULL,
+            completed_at TEXT NOT NULL
+        )
+    ''')
+    conn.executemany(
+        "INSERT INTO quiz (name, description, image, category, difficulty, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (f"Quiz {i}", f"Description of quiz number {i} " * 3,
+             f"https://example.com/images/{i}.jpg", f"category-{i % 12}",
+             ('easy', 'medium', 'hard')[i % 3], '2025-03-20')
+            for i in range(rows)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+async def measure(query_string):
+    import run
+
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0', 'spec_version': '2.4'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': '/api/quizzes',
+        'raw_path': b'/api/quizzes',
+        'query_string': query_string.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'bench')],
+        'client': ('127.0.0.1', 1234),
+        'server': ('bench', 80),
+    }
+    stats = {'ttfb_ms': None, 'bytes': 0}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.body' and message.get('body'):
+            if stats['ttfb_ms'] is None:
+                stats['ttfb_ms'] = (time.perf_counter() - started) * 1000
+            stats['bytes'] += len(message['body'])
+
+    async with run.app.router.lifespan_context(run.app):
+        started = time.perf_counter()
+        await run.app(scope, receive, send)
+        stats['total_ms'] = (time.perf_counter() - started) * 1000
+
+    # ru_maxrss is reported in KiB on Linux
+    stats['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return stats
+
+
+def run_worker(mode):
+    sys.path.insert(0, API_DIR)
+    print(json.dumps(asyncio.run(measure(MODES[mode]))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"Building database with {args.rows} quizzes...")
+        build_database(os.path.join(workdir, 'trivia.db'), args.rows)
+
+        print(f"{'mode':<15}{'ttfb ms':>10}{'total ms':>10}{'MB sent':>10}{'peak RSS MB':>13}")
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker', mode],
+                cwd=workdir, capture_output=True, text=True, check=True
+            ).stdout
+            stats = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<15}{stats['ttfb_ms']:>10.1f}{stats['total_ms']:>10.1f}"
+                  f"{stats['bytes'] / 1e6:>10.1f}{stats['peak_rss_mb']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Compare model validation with the bulk path for question uploads.
+
+Times, for one JSON body of --questions questions:
+
+- model: what POST /api/questions does before touching the database,
+  json.loads plus a QuestionCreate per question and a json.dumps of every
+  choices list
+- bulk: ingest.validate_batch, one TypeAdapter pass over the raw bytes
+  producing insert-ready tuples
+
+then both routes end to end against a scratch database. The end-to-end
+numbers include MinHash signatures for near-duplicate screening, which cost
+the same on both routes.
+
+    python benchmarks/question_ingest.py --questions 50000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import List
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from app.models.schemas import QuestionCreate  # noqa: E402
+from app.services import ingest  # noqa: E402
+
+QUIZZES = 50
+
+
+def build_body(count):
+    return json.dumps([
+        {
+            'quiz_id': i % QUIZZES + 1,
+            'question_text': f"Which of these vegetables was planted in bed {i}?",
+            'choices': [f"Carrot {i}", "Leek", "Kale", "Okra"],
+            'correct_answer_index': i % 4,
+            'explanation': f"Bed {i} was planted with carrots this season.",
+            'category': 'Vegetables',
+            'difficulty': ('easy', 'medium', 'hard')[i % 3],
+            'image': f"https://example.com/beds/{i}.jpg"
+        }
+        for i in range(count)
+    ]).encode()
+
+
+def model_path(body):
+    questions = TypeAdapter(List[QuestionCreate]).validate_python(json.loads(body))
+    return [json.dumps(question.choices) for question in questions]
+
+
+def best_of(fn, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def create_tables(path):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE quiz (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            image TEXT NOT NULL,
+            category TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quiz_id INTEGER NOT NULL,
+            question_text TEXT NOT NULL,
+            choices TEXT NOT NULL,
+            correct_answer_index INTEGER NOT NULL,
+            explanation TEXT NOT NULL,
+            category TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            image TEXT NOT NULL
+        );
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY,
+            email TEXT,
+            created_at TEXT
+        );
+        CREATE TABLE quiz_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            quiz_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            answers TEXT NOT NULL,
+            completed_at TEXT NOT NULL
+        );
+    ''')
+    conn.executemany(
+        "INSERT INTO quiz (name, description, image, category, difficulty, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"Quiz {i}", "", "", 'Vegetables', 'easy', '2025-03-20') for i in range(QUIZZES)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def end_to_end(body):
+    from app.core.config import get_settings
+    settings = get_settings()
+    settings.ADMISSION_ENABLED = False
+    settings.MAINTENANCE_ENABLED = False
+
+    from fastapi.testclient import TestClient
+    import run
+
+    timings = {}
+    with TestClient(run.app) as client:
+        for label, path in (('model', '/api/questions'), ('bulk', '/api/questions/bulk')):
+            started = time.perf_counter()
+            response = client.post(
+                path, params={'duplicates': 'allow'}, content=body,
+                headers={'content-type': 'application/json'}
+            )
+            timings[label] = time.perf_counter() - started
+            response.raise_for_status()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=50000)
+    args = parser.parse_args()
+
+    body = build_body(args.questions)
+    print(f"{args.questions} questions, {len(body) / 1e6:.1f} MB body")
+    model = best_of(model_path, body)
+    bulk = best_of(ingest.validate_batch, body)
+    print(f"{'validation + encoding':<24}{'model s':>10}{'bulk s':>10}{'speedup':>10}")
+    print(f"{'':<24}{model:>10.3f}{bulk:>10.3f}{model / bulk:>9.1f}x")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        create_tables('trivia.db')
+        timings = end_to_end(body)
+    print(f"{'end to end':<24}{timings['model']:>10.3f}{timings['bulk']:>10.3f}"
+          f"{timings['model'] / timings['bulk']:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""Stress the write routes from several processes at once.
+
+Builds a scratch database, then starts --processes worker processes against
+it, as separate uvicorn workers would be. Each serves the app in-process and
+runs --threads client threads that repeat, --ops times each:
+
+    POST /api/users                 a new user
+    POST /api/users/{email}/results a result for that user
+    POST /api/questions             a new question
+
+A low --busy-timeout makes SQLite give up waiting for the write lock early,
+so the write_retry policy does most of the work and some writes run out of
+attempts. Afterwards every acknowledged user and question must be in the
+database and every one answered with a 503 must not be, and the result
+count must match. The script exits non-zero on a lost or half-applied
+write, or on any failure other than a 503. --shards N runs with user data
+split over N shard files (see app.services.shards) to compare throughput.
+
+    python benchmarks/stress_writes.py --processes 4 --threads 8 --ops 50
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = ('users', 'results', 'questions')
+
+
+def build_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE quiz (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            image TEXT NOT NULL,
+            category TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quiz_id INTEGER NOT NULL,
+            question_text TEXT NOT NULL,
+            choices TEXT NOT NULL,
+            correct_answer_index INTEGER NOT NULL,
+            explanation TEXT NOT NULL,
+            category TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            image TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY,
+            email TEXT,
+            created_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE quiz_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            quiz_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            answers TEXT NOT NULL,
+            completed_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute(
+        "INSERT INTO quiz (name, description, image, category, difficulty, created_at) "
+        "VALUES ('Stress quiz', 'Target of the stress run', 'https://example.com/q.jpg', "
+        "'stress', 'easy', '2025-03-20')"
+    )
+    conn.commit()
+    conn.close()
+
+
+def client_thread(client, worker, thread, ops):
+    timings = {route: [] for route in ROUTES}
+    acknowledged = {route: [] for route in ROUTES}
+    rejected = {route: [] for route in ROUTES}
+    failures = []
+
+    def post(route, key, url, body):
+        started = time.perf_counter()
+        response = client.post(url, json=body)
+        timings[route].append((time.perf_counter() - started) * 1000)
+        if response.status_code == 200:
+            acknowledged[route].append(key)
+            return True
+        if response.status_code == 503:
+            rejected[route].append(key)
+        else:
+            failures.append({'route': route, 'status': response.status_code, 'body': response.text[:200]})
+        return False
+
+    for op in range(ops):
+        email = f"w{worker}-t{thread}-{op}@stress.test"
+        if not post('users', email, '/api/users', {'email': email}):
+            continue
+
+        post('results', email, f'/api/users/{email}/results', {
+            'quiz_id': 1, 'score': op % 11 * 10, 'answers': {'1': op % 4}
+        })
+
+        text = f"Stress question {worker}-{thread}-{op}: which number is {op}?"
+        post('questions', text, '/api/questions?duplicates=allow', [{
+            'quiz_id': 1,
+            'question_text': text,
+            'choices': [str(op), str(op + 1), str(op + 2), str(op + 3)],
+            'correct_answer_index': 0,
+            'explanation': f"It is {op}",
+            'category': 'stress',
+            'difficulty': 'easy',
+            'image': 'https://example.com/q.jpg'
+        }])
+
+    return timings, acknowledged, rejected, failures
+
+
+def run_worker(worker, threads, ops):
+    sys.path.insert(0, API_DIR)
+    from fastapi.testclient import TestClient
+
+    import run
+    from app.core.retry import write_retry
+
+    timings = {route: [] for route in ROUTES}
+    acknowledged = {route: [] for route in ROUTES}
+    rejected = {route: [] for route in ROUTES}
+    failures = []
+    with TestClient(run.app, raise_server_exceptions=False) as client:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = [
+                pool.submit(client_thread, client, worker, thread, ops)
+                for thread in range(threads)
+            ]
+            for future in futures:
+                thread_timings, thread_acknowledged, thread_rejected, thread_failures = future.result()
+                for route in ROUTES:
+                    timings[route].extend(thread_timings[route])
+                    acknowledged[route].extend(thread_acknowledged[route])
+                    rejected[route].extend(thread_rejected[route])
+                failures.extend(thread_failures)
+
+    print(json.dumps({
+        'timings': timings,
+        'acknowledged': acknowledged,
+        'rejected': rejected,
+        'failures': failures,
+        'retry': write_retry.snapshot()
+    }))
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def check_writes(workdir, acknowledged, rejected):
+    """Acknowledged writes that are missing and rejected ones that were applied"""
+    stored = {'users': set(), 'questions': set()}
+    result_count = 0
+    for path in [os.path.join(workdir, 'trivia.db')] + glob.glob(os.path.join(workdir, 'shards', '*.db')):
+        conn = sqlite3.connect(path)
+        try:
+            stored['users'].update(row[0] for row in conn.execute("SELECT email FROM users"))
+            result_count += conn.execute("SELECT COUNT(*) FROM quiz_results").fetchone()[0]
+            if path.endswith('trivia.db'):
+                stored['questions'].update(
+                    row[0] for row in conn.execute("SELECT question_text FROM questions")
+                )
+        finally:
+            conn.close()
+    lost = sum(
+        key not in stored[route] for route in stored for key in acknowledged[route]
+    ) + max(0, len(acknowledged['results']) - result_count)
+    applied = sum(
+        key in stored[route] for route in stored for key in rejected[route]
+    ) + max(0, result_count - len(acknowledged['results']))
+    return lost, applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=50)
+    parser.add_argument('--busy-timeout', type=float, default=0.05,
+                        help="DB_BUSY_TIMEOUT for the workers, in seconds")
+    parser.add_argument('--shards', type=int, default=0, help="USER_SHARDS for the workers")
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(args.worker, args.threads, args.ops)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        build_database(os.path.join(workdir, 'trivia.db'))
+        env = {
+            **os.environ,
+            'DB_BUSY_TIMEOUT': str(args.busy_timeout),
+            'ADMISSION_ENABLED': 'false',
+            'MAINTENANCE_ENABLED': 'false',
+            'USER_SHARDS': str(args.shards),
+        }
+
+        # One worker first so the schema and indexes exist before the rest race to start
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', '-1', '--ops', '0'],
+            cwd=workdir, env=env, capture_output=True, check=True
+        )
+
+        print(f"{args.processes} processes x {args.threads} threads x {args.ops} ops, "
+              f"DB_BUSY_TIMEOUT={args.busy_timeout}s, USER_SHARDS={args.shards}")
+        started = time.perf_counter()
+        workers = [
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--worker', str(worker),
+                 '--threads', str(args.threads), '--ops', str(args.ops)],
+                cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+            )
+            for worker in range(args.processes)
+        ]
+        reports = []
+        for process in workers:
+            stdout, stderr = process.communicate()
+            if process.returncode != 0:
+                sys.exit(f"worker failed:\n{stderr}")
+            reports.append(json.loads(stdout.strip().splitlines()[-1]))
+        elapsed = time.perf_counter() - started
+
+        timings = {route: [] for route in ROUTES}
+        acknowledged = {route: [] for route in ROUTES}
+        rejected = {route: [] for route in ROUTES}
+        failures = []
+        retry = {'transactions': 0, 'retried_transactions': 0, 'retries': 0, 'exhausted': 0}
+        for report in reports:
+            for route in ROUTES:
+                timings[route].extend(report['timings'][route])
+                acknowledged[route].extend(report['acknowledged'][route])
+                rejected[route].extend(report['rejected'][route])
+            failures.extend(report['failures'])
+            for key in retry:
+                retry[key] += report['retry'][key]
+
+        requests = sum(len(values) for values in timings.values())
+        print(f"{requests} requests in {elapsed:.1f}s ({requests / elapsed:.0f}/s)")
+        print(f"{'route':<12}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for route in ROUTES:
+            values = timings[route]
+            print(f"{route:<12}{len(values):>8}{percentile(values, 0.5):>10.1f}"
+                  f"{percentile(values, 0.99):>10.1f}{max(values, default=0):>10.1f}")
+        print(f"transactions {retry['transactions']}, retried {retry['retried_transactions']}, "
+              f"retries {retry['retries']}, exhausted {retry['exhausted']}")
+
+        lost, applied = check_writes(workdir, acknowledged, rejected)
+        shed = sum(len(values) for values in rejected.values())
+        print(f"503s {shed}, other failures {len(failures)}, "
+              f"lost writes {lost}, rejected but applied {applied}")
+        for failure in failures[:5]:
+            print(f"  {failure['route']}: {failure['status']} {failure['body']}")
+        if failures or lost or applied:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
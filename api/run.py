@@ -1,18 +1,54 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.admission import AdmissionMiddleware
+from app.core.compute import compute_pool
 from app.core.config import get_settings, Settings
-from app.database import database
-from app.routes import questions, quizzes, categories, users
+from app.core.health import loop_monitor
+from app.database import database, init_db
+from app.services import bundle
+from app.services.dedup import dedup_index, signature_backfill
+from app.services.maintenance import scheduler
+from app.services.question_index import question_index
+from app.routes import questions, quizzes, categories, users, admin, play, stats, health, bootstrap
 import uvicorn
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    settings = get_settings()
+    # A bundle at the current catalog version skips the questions scan
+    if not (settings.CATALOG_BUNDLE and bundle.preload_question_index(settings.CATALOG_BUNDLE)['loaded']):
+        question_index.load()
+    dedup_index.load()
+    await database.connect()
+    compute_pool.start()
+    signature_backfill.start()
+    loop_monitor.start()
+    if settings.MAINTENANCE_ENABLED:
+        scheduler.start()
+
+    yield
+
+    await scheduler.stop()
+    await loop_monitor.stop()
+    await signature_backfill.stop()
+    await compute_pool.stop()
+    await database.disconnect()
+
 app = FastAPI(
     title="Quiz API",
     description="A FastAPI-based Quiz application with async database operations",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# Shed load before it reaches the database; added first so CORS wraps
+# the 429/503 responses too
+app.add_middleware(AdmissionMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -22,15 +58,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Startup and shutdown events
-@app.on_event("startup")
-async def startup():
-    await database.connect()
-
-@app.on_event("shutdown")
-async def shutdown():
-    await database.disconnect()
-
 # Include all routers
 app.include_router(
     questions.router,
@@ -49,6 +76,11 @@ app.include_router(
     prefix="/api",
     tags=["users"]
 )
+app.include_router(play.router)
+app.include_router(stats.router)
+app.include_router(admin.router)
+app.include_router(health.router)
+app.include_router(bootstrap.router)
 
 @app.get("/", tags=["root"])
 async def root(settings: Settings = Depends(get_settings)):
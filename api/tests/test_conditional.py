@@ -0,0 +1,48 @@
+from email.utils import formatdate
+
+import pytest
+
+from app.core.conditional import _etag_matches, _not_modified_since, make_etag
+
+ETAG = make_etag(7, 'quizzes')
+
+
+@pytest.mark.parametrize('header', [
+    ETAG,
+    f'W/{ETAG}',
+    f'"other", {ETAG}',
+    f'"other",W/{ETAG} ',
+    '*',
+    ' * ',
+])
+def test_etag_matches(header):
+    assert _etag_matches(header, ETAG)
+
+
+@pytest.mark.parametrize('header', [
+    '',
+    '"other"',
+    ETAG.strip('"'),
+    make_etag(8, 'quizzes'),
+    '"other", W/"7-quiz"',
+    '"*"',
+])
+def test_etag_does_not_match(header):
+    assert not _etag_matches(header, ETAG)
+
+
+UPDATED_AT = 1742400000
+
+
+@pytest.mark.parametrize('since, expected', [
+    (UPDATED_AT, True),
+    (UPDATED_AT + 3600, True),
+    (UPDATED_AT - 1, False),
+])
+def test_not_modified_since(since, expected):
+    assert _not_modified_since(formatdate(since, usegmt=True), UPDATED_AT) is expected
+
+
+@pytest.mark.parametrize('header', ['', 'yesterday', 'Thu, 32 Mar 2025 99:00:00 GMT'])
+def test_unparseable_date_is_modified(header):
+    assert not _not_modified_since(header, UPDATED_AT)
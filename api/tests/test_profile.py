@@ -0,0 +1,39 @@
+import json
+import sqlite3
+
+from app.models.schemas import UserProfileResponse
+from app.services.profile import build_profile
+
+
+def _database():
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('''
+        CREATE TABLE quiz (
+            id INTEGER PRIMARY KEY, name TEXT, category TEXT, difficulty TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE all_quiz_results (
+            id INTEGER PRIMARY KEY, user_id INTEGER, quiz_id INTEGER, score REAL,
+            answers TEXT, completed_at TEXT, quiz_version_id INTEGER
+        )
+    ''')
+    conn.execute("INSERT INTO quiz VALUES (1, 'Roots', 'vegetables', 'easy')")
+    conn.executemany(
+        "INSERT INTO all_quiz_results VALUES (?, 7, 1, ?, ?, ?, NULL)",
+        [
+            (1, 40.0, json.dumps([0, 0, 0, 0, 0]), '2025-03-01 10:00:00'),
+            (2, 80.0, json.dumps({'11': 2, '12': 0}), '2025-03-02 10:00:00'),
+        ]
+    )
+    return conn
+
+
+def test_profile_accepts_legacy_list_answers():
+    profile = build_profile(_database().cursor(), 7, limit=10)
+    response = UserProfileResponse(email='grower@example.com', **profile)
+
+    assert [result.answers for result in response.results] == [{'11': 2, '12': 0}, [0, 0, 0, 0, 0]]
+    assert response.overall_stats.total_quizzes == 2
+    assert response.category_stats[0].average_score == 60.0
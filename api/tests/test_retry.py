@@ -0,0 +1,55 @@
+import sqlite3
+
+import pytest
+
+from app.core.retry import is_busy
+
+SQLITE_BUSY_SNAPSHOT = 517
+SQLITE_LOCKED_SHAREDCACHE = 262
+SQLITE_READONLY = 8
+
+
+def _error(cls, message, code=None):
+    error = cls(message)
+    if code is not None:
+        error.sqlite_errorcode = code
+    return error
+
+
+def test_real_lock_timeout_is_busy(tmp_path):
+    path = tmp_path / 'busy.db'
+    holder = sqlite3.connect(path, isolation_level=None)
+    waiter = sqlite3.connect(path, timeout=0)
+    try:
+        holder.execute("CREATE TABLE t (x)")
+        holder.execute("BEGIN IMMEDIATE")
+        with pytest.raises(sqlite3.OperationalError) as caught:
+            waiter.execute("INSERT INTO t VALUES (1)")
+        assert is_busy(caught.value)
+    finally:
+        holder.close()
+        waiter.close()
+
+
+@pytest.mark.parametrize('code', [sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED, SQLITE_BUSY_SNAPSHOT,
+                                  SQLITE_LOCKED_SHAREDCACHE])
+def test_busy_codes(code):
+    assert is_busy(_error(sqlite3.OperationalError, 'anything', code))
+
+
+def test_code_wins_over_message():
+    assert not is_busy(_error(sqlite3.OperationalError, 'database is locked', SQLITE_READONLY))
+
+
+@pytest.mark.parametrize('message', ['database is locked', 'database table is locked: quiz'])
+def test_busy_message_without_code(message):
+    assert is_busy(_error(sqlite3.OperationalError, message))
+
+
+@pytest.mark.parametrize('error', [
+    _error(sqlite3.OperationalError, 'no such table: quiz'),
+    _error(sqlite3.IntegrityError, 'database is locked', sqlite3.SQLITE_BUSY),
+    RuntimeError('database is locked'),
+])
+def test_not_busy(error):
+    assert not is_busy(error)
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from app.core import security
+from app.core.config import get_settings
+
+# The fixture below stands in for the key; keep the real lookup for its own test
+get_session_secret = security.get_session_secret
+
+
+@pytest.fixture(autouse=True)
+def secret(monkeypatch):
+    monkeypatch.setattr(security, 'get_session_secret', lambda: b'k' * security.MIN_SECRET_BYTES)
+
+
+def test_token_round_trip():
+    assert security.verify_user_token(security.issue_user_token(42)) == 42
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    token = security.issue_user_token(42)
+    max_age = get_settings().SESSION_TOKEN_TTL_DAYS * 86400
+    now = time.time()
+
+    monkeypatch.setattr(time, 'time', lambda: now + max_age - 60)
+    assert security.verify_user_token(token) == 42
+    monkeypatch.setattr(time, 'time', lambda: now + max_age + 60)
+    assert security.verify_user_token(token) is None
+
+
+def test_tampered_token_is_rejected():
+    payload, signature = security.issue_user_token(42).split('.')
+    forged = security._b64encode(f"{security.TOKEN_VERSION}:43:{int(time.time())}".encode())
+
+    assert security.verify_user_token(f"{forged}.{signature}") is None
+    assert security.verify_user_token(f"{payload}.{signature[:-2]}") is None
+    assert security.verify_user_token(f"{payload}.{signature}.{signature}") is None
+
+
+def test_token_signed_with_another_secret_is_rejected(monkeypatch):
+    token = security.issue_user_token(42)
+    monkeypatch.setattr(security, 'get_session_secret', lambda: b'o' * security.MIN_SECRET_BYTES)
+
+    assert security.verify_user_token(token) is None
+
+
+@pytest.mark.parametrize('payload', [
+    'a', '!!!!', security._b64encode(b'\xff\xfe'), security._b64encode(b'v1:x:1')
+])
+def test_undecodable_payload_is_rejected(payload):
+    # Correctly signed, so only the decoding can reject it
+    assert security.verify_user_token(f"{payload}.{security._sign(payload)}") is None
+
+
+@pytest.mark.parametrize('token', ['', 'no-dot', 'é.é', '..'])
+def test_malformed_token_is_rejected(token):
+    assert security.verify_user_token(token) is None
+
+
+def test_other_token_version_is_rejected():
+    payload = security._b64encode(f"v0:42:{int(time.time())}".encode())
+    assert security.verify_user_token(f"{payload}.{security._sign(payload)}") is None
+
+
+def test_short_session_secret_is_refused(monkeypatch):
+    monkeypatch.setattr(security, 'get_settings', lambda: get_settings().model_copy(
+        update={'SESSION_SECRET': 'short'}
+    ))
+    get_session_secret.cache_clear()
+    try:
+        with pytest.raises(RuntimeError, match='at least'):
+            get_session_secret()
+    finally:
+        get_session_secret.cache_clear()
@@ -0,0 +1,80 @@
+import sqlite3
+import time
+
+import pytest
+
+from app.services import shards
+
+SHARDS = 4
+
+
+@pytest.fixture
+def cursor(monkeypatch):
+    monkeypatch.setattr(shards, 'shard_count', lambda: SHARDS)
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''
+        CREATE TABLE id_sequences (
+            name TEXT NOT NULL, slot INTEGER NOT NULL, last INTEGER NOT NULL,
+            PRIMARY KEY (name, slot)
+        ) WITHOUT ROWID
+    ''')
+    yield conn.cursor()
+    conn.close()
+
+
+def test_ids_are_not_drawn_without_shards(monkeypatch):
+    monkeypatch.setattr(shards, 'shard_count', lambda: 0)
+    assert shards.next_user_id(None, 'grower@example.com') is None
+    assert shards.next_result_id(None, 7) is None
+
+
+def test_user_ids_stay_in_the_email_bucket(cursor):
+    for email in ('grower@example.com', 'chef@example.com'):
+        bucket = shards.email_bucket(email)
+        ids = [shards.next_user_id(cursor, email) for _ in range(3)]
+
+        assert ids == [bucket + shards.BUCKETS, bucket + 2 * shards.BUCKETS, bucket + 3 * shards.BUCKETS]
+        assert {shards.user_bucket(user_id) for user_id in ids} == {bucket}
+        assert {shards.shard_of(shards.user_bucket(user_id)) for user_id in ids} == {
+            shards.shard_of(bucket)
+        }
+
+
+def test_counters_start_above_ids_issued_before(cursor):
+    cursor.execute("INSERT INTO id_sequences VALUES ('users', 5, 40)")
+    assert shards._next_id(cursor, 'users', 5, 0) == 41 * shards.BUCKETS + 5
+    assert shards._next_id(cursor, 'users', 6, 100) == 100 * shards.BUCKETS + 6
+
+
+def test_result_ids_follow_the_clock_across_shards(cursor, monkeypatch):
+    now = [1742400000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    user_a, user_b = 1, 2
+    assert shards.shard_of(shards.user_bucket(user_a)) != shards.shard_of(shards.user_bucket(user_b))
+
+    # Within one millisecond the order across shards is the shard index's
+    first = shards.next_result_id(cursor, user_a)
+    now[0] += 0.5
+    second = shards.next_result_id(cursor, user_b)
+    now[0] += 0.5
+    third = shards.next_result_id(cursor, user_a)
+
+    assert first < second < third
+    assert first // shards.BUCKETS == int(1742400000.0 * 1000)
+    assert [result_id % shards.BUCKETS for result_id in (first, second, third)] == [
+        shards.shard_of(shards.user_bucket(user_a)),
+        shards.shard_of(shards.user_bucket(user_b)),
+        shards.shard_of(shards.user_bucket(user_a)),
+    ]
+
+
+def test_result_ids_increase_when_the_clock_stalls_or_steps_back(cursor, monkeypatch):
+    now = [1742400000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+
+    ids = [shards.next_result_id(cursor, 1) for _ in range(3)]
+    now[0] -= 60
+    ids.append(shards.next_result_id(cursor, 1))
+
+    assert ids == sorted(set(ids))
+    assert ids[-1] - ids[0] == 3 * shards.BUCKETS
@@ -1,3 +1,6 @@
+import { cache } from 'react';
+import { Bootstrap } from './types';
+
 const API_URL = process.env.NEXT_PUBLIC_API_URL ||
   (process.env.NODE_ENV === 'production'
     ? 'https://veggie-quiz.onrender.com'
@@ -6,4 +9,21 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL ||
 export const fetchData = async () => {
     const response = await fetch(`${API_URL}/your-endpoint`);
     return response.json();
-}
\ No newline at end of file
+}
+
+// Header and home page data in one request, shared by every server
+// component in a render
+export const getBootstrap = cache(async (): Promise<Bootstrap> => {
+  const response = await fetch(`${API_URL}/api/bootstrap`, {
+    cache: 'no-store',
+    headers: {
+      'Accept': 'application/json'
+    }
+  });
+
+  if (!response.ok) {
+    throw new Error('Failed to fetch bootstrap data');
+  }
+
+  return response.json();
+});
\ No newline at end of file
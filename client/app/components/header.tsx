@@ -1,25 +1,10 @@
 import HeaderClient from './HeaderClient';
 import { Category } from '../types';
-
-const API_URL = process.env.NEXT_PUBLIC_API_URL ||
-  (process.env.NODE_ENV === 'production'
-    ? 'https://veggie-quiz.onrender.com'
-    : 'http://localhost:9000');
-async function getCategories(): Promise<string[]> {
-  const response = await fetch(`${API_URL}/api/categories`, {
-    cache: 'no-store'
-  });
-
-  if (!response.ok) {
-    throw new Error('Failed to fetch categories');
-  }
-
-  return response.json();
-}
+import { getBootstrap } from '../api';
 
 export default async function Header() {
-  const categoryNames = await getCategories();
-  const categories: Category[] = categoryNames.map(name => ({
+  const { categories: summaries } = await getBootstrap();
+  const categories: Category[] = summaries.map(({ name }) => ({
     name,
     image: `/images/${name}.jpg`
   }));
@@ -1,40 +1,9 @@
 import Link from 'next/link';
 
-interface Quiz {
-  id: number;
-  name: string;
-  description: string;
-  image: string;
-  category: string;
-  difficulty: string;
-  created_at: string;
-}
-
-interface CategorySamples {
-  [category: string]: Quiz[];
-}
-const API_URL = process.env.NEXT_PUBLIC_API_URL ||
-  (process.env.NODE_ENV === 'production'
-    ? 'https://veggie-quiz.onrender.com'
-    : 'http://localhost:9000');
-async function getCategorySamples() {
-  const response = await fetch(`${API_URL}/api/quizzes/category-samples`, {
-    cache: 'no-store',
-    headers: {
-      'Accept': 'application/json'
-    }
-  });
-
-  if (!response.ok) {
-    throw new Error('Failed to fetch category samples');
-  }
-
-  const data = await response.json();
-  return data.samples as CategorySamples;
-}
+import { getBootstrap } from './api';
 
 export default async function CategoriesPage() {
-  const categorySamples = await getCategorySamples();
+  const { samples: categorySamples } = await getBootstrap();
 
   return (
     <main className="container mx-auto px-4">
@@ -17,14 +17,15 @@ interface OverallStats {
   unique_quizzes: number;
 }
 
-interface UserStats {
+interface UserProfile {
   category_stats: CategoryStat[];
   email: string;
   overall_stats: OverallStats;
+  total_results: number;
 }
 
 export default function ProfileClient() {
-  const [stats, setStats] = useState<UserStats | null>(null);
+  const [stats, setStats] = useState<UserProfile | null>(null);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const router = useRouter();
@@ -39,8 +40,9 @@ export default function ProfileClient() {
       }
 
       try {
+        // Stats and history from one scan; this page only shows the stats
         const response = await fetch(
-          `http://localhost:9000/api/users/${encodeURIComponent(email)}/stats`
+          `http://localhost:9000/api/users/${encodeURIComponent(email)}/profile?limit=1`
         );
 
         if (!response.ok) {
@@ -17,6 +17,7 @@ interface Quiz {
   id: number;
   name: string;
   questions: Question[];
+  version_id?: number;
   quiz: {
     name: string;
     category: string;
@@ -53,7 +54,9 @@ export default function QuizClient({ quiz, quizId }: QuizClientProps) {
       if (!isLastQuestion) {
         setCurrentQuestionIndex(currentQuestionIndex + 1);
       } else {
-        router.push(`/quiz/${quizId}/results?answers=${newAnswers.join(',')}`);
+        // Pin the results page to the question set that was answered
+        const version = quiz.version_id ? `&version=${quiz.version_id}` : '';
+        router.push(`/quiz/${quizId}/results?answers=${newAnswers.join(',')}${version}`);
       }
     }, 500);
   };
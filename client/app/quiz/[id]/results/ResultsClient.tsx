@@ -19,6 +19,7 @@ interface Quiz {
   category: string;
   questions: Question[];
   description: string;
+  version_id?: number;
   quiz: {
     name: string;
     category: string;
@@ -39,6 +40,7 @@ interface QuizResult {
   quiz_id: number;
   score: number;
   answers: { [key: number]: number };
+  quiz_version_id?: number;
 }
 
 export default function ResultsClient({
@@ -70,6 +72,7 @@ export default function ResultsClient({
         quiz_id: quiz.id,
         score,
         answers: formattedAnswers,
+        quiz_version_id: quiz.version_id,
       };
 
       const response = await fetch(`http://localhost:9000/api/users/${encodeURIComponent(email)}/results`, {
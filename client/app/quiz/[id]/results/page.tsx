@@ -4,9 +4,11 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL ||
   (process.env.NODE_ENV === 'production'
     ? 'https://veggie-quiz.onrender.com'
     : 'http://localhost:9000');
-async function getQuizData(id: string) {
-  const response = await fetch(`${API_URL}/api/quizzes/${id}/questions`, {
-    cache: 'no-store',
+async function getQuizData(id: string, version?: string) {
+  // A quiz version never changes, so it can come from the cache
+  const query = version ? `?version=${encodeURIComponent(version)}` : '';
+  const response = await fetch(`${API_URL}/api/quizzes/${id}/questions${query}`, {
+    cache: version ? 'force-cache' : 'no-store',
     headers: {
       'Accept': 'application/json'
     }
@@ -23,12 +25,12 @@ export default async function ResultsPage({
   searchParams,
 }: {
   params: Promise<{ id: string }>;
-  searchParams: Promise<{ answers: string }>;
+  searchParams: Promise<{ answers: string; version?: string }>;
 }) {
   try {
     const resolvedParams = await params;
     const resolvedSearchParams = await searchParams;
-    const quiz = await getQuizData(resolvedParams.id);
+    const quiz = await getQuizData(resolvedParams.id, resolvedSearchParams.version);
     const userAnswers = resolvedSearchParams.answers?.split(',').map(Number) || [];
 
     return <ResultsClient
@@ -1,4 +1,27 @@
 export interface Category {
   name: string;
   image: string;
+}
+
+export interface Quiz {
+  id: number;
+  name: string;
+  description: string;
+  image: string;
+  category: string;
+  difficulty: string;
+  created_at: string;
+}
+
+export interface CategorySummary {
+  name: string;
+  quiz_count: number;
+  question_count: number;
+}
+
+export interface Bootstrap {
+  catalog_version: number;
+  categories: CategorySummary[];
+  samples: { [category: string]: Quiz[] };
+  quizzes_per_category: number;
 }
\ No newline at end of file